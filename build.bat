@@ -5,17 +5,25 @@ echo 📦 Building eseguibile...
 
 call venv\Scripts\activate.bat
 
-pyinstaller --onefile ^
+REM --onedir: niente estrazione in una cartella temporanea a ogni avvio (--onefile)
+REM I moduli importati al primo uso (src/lazy.py) vanno dichiarati come hidden-import
+pyinstaller --onedir ^
     --name="GestionaleImmobiliare" ^
+    --paths src ^
     --add-data "data;data" ^
     --add-data "schema.sql;." ^
     --hidden-import="streamlit" ^
+    --hidden-import="excel_io" ^
+    --hidden-import="analytics" ^
+    --hidden-import="cashflow" ^
+    --hidden-import="records" ^
+    --hidden-import="images" ^
     --hidden-import="pandas" ^
     --hidden-import="openpyxl" ^
     --hidden-import="PIL" ^
     --collect-all streamlit ^
     src/main.py
 
-echo ✅ Eseguibile creato in: dist\GestionaleImmobiliare.exe
+echo ✅ Eseguibile creato in: dist\GestionaleImmobiliare\GestionaleImmobiliare.exe
 echo 📂 Copia la cartella 'data' nella stessa directory dell'eseguibile
 pause
\ No newline at end of file
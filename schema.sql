@@ -11,14 +11,218 @@ CREATE TABLE IF NOT EXISTS proprieta (
     contratto_inizio DATE,  -- ISO 8601: YYYY-MM-DD
     contratto_fine DATE,
     mensilita_pagata BOOLEAN DEFAULT 0,  -- 0=Non pagato, 1=Pagato
-    immagine_path TEXT,  -- Path relativo a ./data/images/
+    immagine_path TEXT,  -- Path relativo al bucket 'piantine'
+    immagine_url TEXT,
+    miniatura_path TEXT,  -- WebP ridotta per elenchi, stesso bucket
+    miniatura_url TEXT,
+    immagine_sha256 TEXT,  -- hash del file originale (salta i doppioni negli upload massivi)
+    contratto_path TEXT,  -- Path relativo al bucket 'contratti'
+    contratto_url TEXT,
+    contratto_sha256 TEXT,
+    -- Dati catastali
+    foglio REAL,
+    particella REAL,
+    subalterno REAL,
+    zona_cens TEXT,
+    categoria TEXT,
+    classe TEXT,
+    quota TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     CHECK(contratto_fine IS NULL OR contratto_fine >= contratto_inizio)
 );
 
 -- Indici per performance
-CREATE INDEX idx_nome ON proprieta(nome);
-CREATE INDEX idx_contratto_fine ON proprieta(contratto_fine);
-CREATE INDEX idx_mensilita ON proprieta(mensilita_pagata);
+CREATE INDEX IF NOT EXISTS idx_nome ON proprieta(nome);
+CREATE INDEX IF NOT EXISTS idx_contratto_fine ON proprieta(contratto_fine);
+CREATE INDEX IF NOT EXISTS idx_mensilita ON proprieta(mensilita_pagata);
+CREATE INDEX IF NOT EXISTS idx_updated_at ON proprieta(updated_at);
 
+CREATE TRIGGER IF NOT EXISTS update_timestamp
+AFTER UPDATE ON proprieta
+FOR EACH ROW
+WHEN OLD.updated_at = NEW.updated_at
+BEGIN
+    UPDATE proprieta
+    SET updated_at = CURRENT_TIMESTAMP
+    WHERE id = OLD.id;
+END;
+
+-- Totali di portafoglio mantenuti dai trigger: /stats e dashboard li leggono in O(1)
+CREATE TABLE IF NOT EXISTS proprieta_totali (
+    id INTEGER PRIMARY KEY CHECK(id = 1),
+    totale_immobili INTEGER NOT NULL,
+    affitti_attivi INTEGER NOT NULL,
+    non_pagati INTEGER NOT NULL,
+    entrate_mensili REAL NOT NULL,
+    valore_patrimonio REAL NOT NULL
+);
+
+INSERT OR IGNORE INTO proprieta_totali
+SELECT 1,
+       COUNT(*),
+       COUNT(affittato_a),
+       COALESCE(SUM(affittato_a IS NOT NULL AND NOT COALESCE(mensilita_pagata, 0)), 0),
+       COALESCE(SUM(CASE WHEN affittato_a IS NOT NULL THEN COALESCE(affitto_mensile, 0) ELSE 0 END), 0),
+       COALESCE(SUM(mq_commerciali * valore_mq), 0)
+FROM proprieta;
+
+CREATE TRIGGER IF NOT EXISTS totali_insert
+AFTER INSERT ON proprieta
+FOR EACH ROW
+BEGIN
+    UPDATE proprieta_totali SET
+        totale_immobili = totale_immobili + 1,
+        affitti_attivi = affitti_attivi + (NEW.affittato_a IS NOT NULL),
+        non_pagati = non_pagati + (NEW.affittato_a IS NOT NULL AND NOT COALESCE(NEW.mensilita_pagata, 0)),
+        entrate_mensili = entrate_mensili + CASE WHEN NEW.affittato_a IS NOT NULL THEN COALESCE(NEW.affitto_mensile, 0) ELSE 0 END,
+        valore_patrimonio = valore_patrimonio + NEW.mq_commerciali * NEW.valore_mq
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS totali_delete
+AFTER DELETE ON proprieta
+FOR EACH ROW
+BEGIN
+    UPDATE proprieta_totali SET
+        totale_immobili = totale_immobili - 1,
+        affitti_attivi = affitti_attivi - (OLD.affittato_a IS NOT NULL),
+        non_pagati = non_pagati - (OLD.affittato_a IS NOT NULL AND NOT COALESCE(OLD.mensilita_pagata, 0)),
+        entrate_mensili = entrate_mensili - CASE WHEN OLD.affittato_a IS NOT NULL THEN COALESCE(OLD.affitto_mensile, 0) ELSE 0 END,
+        valore_patrimonio = valore_patrimonio - OLD.mq_commerciali * OLD.valore_mq
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS totali_update
+AFTER UPDATE OF affittato_a, affitto_mensile, mensilita_pagata, mq_commerciali, valore_mq ON proprieta
+FOR EACH ROW
+BEGIN
+    UPDATE proprieta_totali SET
+        affitti_attivi = affitti_attivi - (OLD.affittato_a IS NOT NULL) + (NEW.affittato_a IS NOT NULL),
+        non_pagati = non_pagati
+            - (OLD.affittato_a IS NOT NULL AND NOT COALESCE(OLD.mensilita_pagata, 0))
+            + (NEW.affittato_a IS NOT NULL AND NOT COALESCE(NEW.mensilita_pagata, 0)),
+        entrate_mensili = entrate_mensili
+            - CASE WHEN OLD.affittato_a IS NOT NULL THEN COALESCE(OLD.affitto_mensile, 0) ELSE 0 END
+            + CASE WHEN NEW.affittato_a IS NOT NULL THEN COALESCE(NEW.affitto_mensile, 0) ELSE 0 END,
+        valore_patrimonio = valore_patrimonio - OLD.mq_commerciali * OLD.valore_mq + NEW.mq_commerciali * NEW.valore_mq
+    WHERE id = 1;
+END;
+
+-- Ricerca full-text su nome, indirizzo e dati catastali (accenti ignorati, prefissi indicizzati)
+CREATE VIRTUAL TABLE IF NOT EXISTS proprieta_fts USING fts5(
+    nome, indirizzo, foglio, particella, subalterno, zona_cens, categoria, classe,
+    content='proprieta', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS proprieta_fts_insert
+AFTER INSERT ON proprieta
+BEGIN
+    INSERT INTO proprieta_fts(rowid, nome, indirizzo, foglio, particella, subalterno, zona_cens, categoria, classe)
+    VALUES (NEW.id, NEW.nome, NEW.indirizzo, NEW.foglio, NEW.particella, NEW.subalterno, NEW.zona_cens, NEW.categoria, NEW.classe);
+END;
+
+CREATE TRIGGER IF NOT EXISTS proprieta_fts_delete
+AFTER DELETE ON proprieta
+BEGIN
+    INSERT INTO proprieta_fts(proprieta_fts, rowid, nome, indirizzo, foglio, particella, subalterno, zona_cens, categoria, classe)
+    VALUES ('delete', OLD.id, OLD.nome, OLD.indirizzo, OLD.foglio, OLD.particella, OLD.subalterno, OLD.zona_cens, OLD.categoria, OLD.classe);
+END;
+
+CREATE TRIGGER IF NOT EXISTS proprieta_fts_update
+AFTER UPDATE OF nome, indirizzo, foglio, particella, subalterno, zona_cens, categoria, classe ON proprieta
+BEGIN
+    INSERT INTO proprieta_fts(proprieta_fts, rowid, nome, indirizzo, foglio, particella, subalterno, zona_cens, categoria, classe)
+    VALUES ('delete', OLD.id, OLD.nome, OLD.indirizzo, OLD.foglio, OLD.particella, OLD.subalterno, OLD.zona_cens, OLD.categoria, OLD.classe);
+    INSERT INTO proprieta_fts(rowid, nome, indirizzo, foglio, particella, subalterno, zona_cens, categoria, classe)
+    VALUES (NEW.id, NEW.nome, NEW.indirizzo, NEW.foglio, NEW.particella, NEW.subalterno, NEW.zona_cens, NEW.categoria, NEW.classe);
+END;
+
+-- Tombstone delle eliminazioni per la sincronizzazione incrementale (GET /proprieta?updated_since=)
+CREATE TABLE IF NOT EXISTS proprieta_eliminate (
+    id INTEGER PRIMARY KEY,
+    deleted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_eliminate_deleted_at ON proprieta_eliminate(deleted_at);
+
+CREATE TRIGGER IF NOT EXISTS proprieta_tombstone
+AFTER DELETE ON proprieta
+BEGIN
+    INSERT OR REPLACE INTO proprieta_eliminate (id) VALUES (OLD.id);
+END;
+
+-- Registro pagamenti: una riga per versamento (anche parziale) sul mese di competenza
+CREATE TABLE IF NOT EXISTS pagamenti (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    proprieta_id INTEGER NOT NULL REFERENCES proprieta(id) ON DELETE CASCADE,
+    mese TEXT NOT NULL CHECK(mese GLOB '[0-9][0-9][0-9][0-9]-[0-1][0-9]'),  -- competenza YYYY-MM
+    importo REAL NOT NULL CHECK(importo >= 0),
+    pagato_il DATE NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_pagamenti_proprieta_mese ON pagamenti(proprieta_id, mese);
+CREATE INDEX IF NOT EXISTS idx_pagamenti_mese ON pagamenti(mese);
+
+-- mensilita_pagata è la vista del mese corrente sul registro: c'è almeno un
+-- pagamento di competenza del mese. I trigger la tengono allineata nei due versi
+-- (pagamento registrato -> flag; flag scritto dall'app -> pagamento); al cambio
+-- mese `refresh_mensilita` la ricalcola e salva qui il mese di riferimento.
+CREATE TABLE IF NOT EXISTS mensilita_mese (
+    id INTEGER PRIMARY KEY CHECK(id = 1),
+    mese TEXT NOT NULL
+);
+
+-- DB esistenti: i flag già segnati diventano pagamenti del mese corrente (una volta sola)
+INSERT INTO pagamenti (proprieta_id, mese, importo, pagato_il)
+SELECT id, strftime('%Y-%m', 'now', 'localtime'), COALESCE(affitto_mensile, 0), date('now', 'localtime')
+FROM proprieta
+WHERE mensilita_pagata AND affittato_a IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM mensilita_mese);
+
+INSERT OR IGNORE INTO mensilita_mese VALUES (1, strftime('%Y-%m', 'now', 'localtime'));
+
+CREATE TRIGGER IF NOT EXISTS pagamenti_flag_insert
+AFTER INSERT ON pagamenti
+FOR EACH ROW
+WHEN NEW.mese = (SELECT mese FROM mensilita_mese WHERE id = 1)
+BEGIN
+    UPDATE proprieta SET mensilita_pagata = 1
+    WHERE id = NEW.proprieta_id AND mensilita_pagata IS NOT 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS pagamenti_flag_delete
+AFTER DELETE ON pagamenti
+FOR EACH ROW
+WHEN OLD.mese = (SELECT mese FROM mensilita_mese WHERE id = 1)
+BEGIN
+    UPDATE proprieta SET mensilita_pagata = 0
+    WHERE id = OLD.proprieta_id AND mensilita_pagata IS NOT 0
+      AND NOT EXISTS (SELECT 1 FROM pagamenti WHERE proprieta_id = OLD.proprieta_id AND mese = OLD.mese);
+END;
+
+CREATE TRIGGER IF NOT EXISTS mensilita_to_pagamenti_insert
+AFTER INSERT ON proprieta
+FOR EACH ROW
+WHEN NEW.mensilita_pagata AND NEW.affittato_a IS NOT NULL
+BEGIN
+    INSERT INTO pagamenti (proprieta_id, mese, importo, pagato_il)
+    VALUES (NEW.id, (SELECT mese FROM mensilita_mese WHERE id = 1), COALESCE(NEW.affitto_mensile, 0), date('now', 'localtime'));
+END;
+
+CREATE TRIGGER IF NOT EXISTS mensilita_to_pagamenti_update
+AFTER UPDATE OF mensilita_pagata ON proprieta
+FOR EACH ROW
+WHEN NEW.affittato_a IS NOT NULL AND COALESCE(NEW.mensilita_pagata, 0) != COALESCE(OLD.mensilita_pagata, 0)
+BEGIN
+    -- Segnata pagata a mano: versamento del canone intero, se il mese non ne ha già
+    INSERT INTO pagamenti (proprieta_id, mese, importo, pagato_il)
+    SELECT NEW.id, m.mese, COALESCE(NEW.affitto_mensile, 0), date('now', 'localtime')
+    FROM mensilita_mese m
+    WHERE m.id = 1 AND NEW.mensilita_pagata
+      AND NOT EXISTS (SELECT 1 FROM pagamenti WHERE proprieta_id = NEW.id AND mese = m.mese);
+    -- Tolta a mano: i versamenti del mese vengono annullati
+    DELETE FROM pagamenti
+    WHERE NOT NEW.mensilita_pagata AND proprieta_id = NEW.id
+      AND mese = (SELECT mese FROM mensilita_mese WHERE id = 1);
+END;
@@ -0,0 +1,268 @@
+-- schema_supabase.sql
+-- Funzioni e indici lato Supabase (Postgres). Da eseguire nello SQL editor del progetto.
+
+-- Totali di portafoglio in un'unica query aggregata (usata da /stats e dalla dashboard)
+CREATE OR REPLACE FUNCTION proprieta_stats(giorni integer DEFAULT 60)
+RETURNS json
+LANGUAGE sql STABLE
+AS $$
+    SELECT json_build_object(
+        'totale_immobili',   COUNT(*),
+        'affitti_attivi',    COUNT(*) FILTER (WHERE affittato_a IS NOT NULL),
+        'non_pagati',        COUNT(*) FILTER (WHERE affittato_a IS NOT NULL AND NOT COALESCE(mensilita_pagata, false)),
+        'in_scadenza',       COUNT(*) FILTER (WHERE contratto_fine < current_date + giorni),
+        'entrate_mensili',   COALESCE(SUM(affitto_mensile) FILTER (WHERE affittato_a IS NOT NULL), 0),
+        'valore_patrimonio', COALESCE(SUM(mq_commerciali * valore_mq), 0)
+    )
+    FROM proprieta;
+$$;
+
+-- Ricerca full-text su nome, indirizzo e dati catastali: tsvector senza accenti con indice GIN
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+CREATE OR REPLACE FUNCTION immutable_unaccent(text)
+RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$;
+
+CREATE OR REPLACE FUNCTION proprieta_search_doc(p proprieta)
+RETURNS tsvector
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$
+    SELECT to_tsvector('simple', immutable_unaccent(concat_ws(' ',
+        p.nome, p.indirizzo, p.foglio::text, p.particella::text, p.subalterno::text,
+        p.zona_cens, p.categoria, p.classe)))
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_proprieta_search ON proprieta USING gin (proprieta_search_doc(proprieta));
+
+-- Ogni parola della ricerca è un prefisso ("via gar" trova "Via Garibaldi"), risultati per rilevanza
+CREATE OR REPLACE FUNCTION search_proprieta(q text)
+RETURNS SETOF proprieta
+LANGUAGE sql STABLE
+AS $$
+    WITH query AS (
+        SELECT to_tsquery('simple', string_agg(quote_literal(t) || ':*', ' & ')) AS tsq
+        FROM regexp_split_to_table(immutable_unaccent(lower(q)), '[^[:alnum:]]+') AS t
+        WHERE t <> ''
+    )
+    SELECT p.*
+    FROM proprieta p, query
+    WHERE proprieta_search_doc(p) @@ query.tsq
+    ORDER BY ts_rank(proprieta_search_doc(p), query.tsq) DESC, p.nome;
+$$;
+
+-- Miniature WebP delle piantine (generate dall'app al caricamento)
+ALTER TABLE proprieta ADD COLUMN IF NOT EXISTS miniatura_path text;
+ALTER TABLE proprieta ADD COLUMN IF NOT EXISTS miniatura_url text;
+
+-- Hash dei file originali: l'upload massivo salta gli allegati già presenti
+ALTER TABLE proprieta ADD COLUMN IF NOT EXISTS immagine_sha256 text;
+ALTER TABLE proprieta ADD COLUMN IF NOT EXISTS contratto_sha256 text;
+
+-- Aggiornamento massivo in un solo UPDATE: jsonb_populate_record parte dalla riga
+-- esistente, quindi ogni elemento modifica solo le chiavi che contiene
+CREATE OR REPLACE FUNCTION update_proprieta_bulk(rows jsonb)
+RETURNS SETOF proprieta
+LANGUAGE sql
+AS $$
+    UPDATE proprieta p
+    SET (nome, indirizzo, mq_effettivi, mq_commerciali, valore_mq,
+         affittato_a, affitto_mensile, contratto_inizio, contratto_fine, mensilita_pagata,
+         immagine_path, immagine_url, miniatura_path, miniatura_url, immagine_sha256,
+         contratto_path, contratto_url, contratto_sha256,
+         foglio, particella, subalterno, zona_cens, categoria, classe, quota, updated_at)
+      = (SELECT r.nome, r.indirizzo, r.mq_effettivi, r.mq_commerciali, r.valore_mq,
+                r.affittato_a, r.affitto_mensile, r.contratto_inizio, r.contratto_fine, r.mensilita_pagata,
+                r.immagine_path, r.immagine_url, r.miniatura_path, r.miniatura_url, r.immagine_sha256,
+                r.contratto_path, r.contratto_url, r.contratto_sha256,
+                r.foglio, r.particella, r.subalterno, r.zona_cens, r.categoria, r.classe, r.quota, now()
+         FROM jsonb_populate_record(p, e.elem) r)
+    FROM jsonb_array_elements(rows) AS e(elem)
+    WHERE p.id = (e.elem->>'id')::bigint
+    RETURNING p.*;
+$$;
+
+-- Sincronizzazione incrementale: updated_at mantenuto dal database, tombstone delle eliminazioni
+CREATE OR REPLACE FUNCTION proprieta_set_updated_at()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS proprieta_updated_at ON proprieta;
+CREATE TRIGGER proprieta_updated_at
+BEFORE UPDATE ON proprieta
+FOR EACH ROW EXECUTE FUNCTION proprieta_set_updated_at();
+
+CREATE INDEX IF NOT EXISTS idx_proprieta_updated_at ON proprieta (updated_at);
+
+CREATE TABLE IF NOT EXISTS proprieta_eliminate (
+    id bigint PRIMARY KEY,
+    deleted_at timestamptz NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_eliminate_deleted_at ON proprieta_eliminate (deleted_at);
+
+CREATE OR REPLACE FUNCTION proprieta_tombstone()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO proprieta_eliminate (id) VALUES (OLD.id)
+    ON CONFLICT (id) DO UPDATE SET deleted_at = now();
+    RETURN OLD;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS proprieta_tombstone ON proprieta;
+CREATE TRIGGER proprieta_tombstone
+AFTER DELETE ON proprieta
+FOR EACH ROW EXECUTE FUNCTION proprieta_tombstone();
+
+-- Registro pagamenti: una riga per versamento (anche parziale) sul mese di competenza
+CREATE TABLE IF NOT EXISTS pagamenti (
+    id bigserial PRIMARY KEY,
+    proprieta_id bigint NOT NULL REFERENCES proprieta(id) ON DELETE CASCADE,
+    mese text NOT NULL CHECK (mese ~ '^\d{4}-(0[1-9]|1[0-2])$'),  -- competenza YYYY-MM
+    importo numeric(12, 2) NOT NULL CHECK (importo >= 0),
+    pagato_il date NOT NULL DEFAULT current_date,
+    created_at timestamptz NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_pagamenti_proprieta_mese ON pagamenti (proprieta_id, mese);
+CREATE INDEX IF NOT EXISTS idx_pagamenti_mese ON pagamenti (mese);
+
+-- mensilita_pagata = il mese di riferimento ha almeno un versamento (stessi trigger di schema.sql)
+CREATE TABLE IF NOT EXISTS mensilita_mese (
+    id integer PRIMARY KEY CHECK (id = 1),
+    mese text NOT NULL
+);
+
+INSERT INTO pagamenti (proprieta_id, mese, importo, pagato_il)
+SELECT id, to_char(current_date, 'YYYY-MM'), coalesce(affitto_mensile, 0), current_date
+FROM proprieta
+WHERE mensilita_pagata AND affittato_a IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM mensilita_mese);
+
+INSERT INTO mensilita_mese VALUES (1, to_char(current_date, 'YYYY-MM')) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION pagamenti_flag()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    rif text := (SELECT mese FROM mensilita_mese WHERE id = 1);
+BEGIN
+    IF TG_OP = 'INSERT' AND NEW.mese = rif THEN
+        UPDATE proprieta SET mensilita_pagata = true
+        WHERE id = NEW.proprieta_id AND mensilita_pagata IS DISTINCT FROM true;
+    ELSIF TG_OP = 'DELETE' AND OLD.mese = rif THEN
+        UPDATE proprieta SET mensilita_pagata = false
+        WHERE id = OLD.proprieta_id AND mensilita_pagata IS DISTINCT FROM false
+          AND NOT EXISTS (SELECT 1 FROM pagamenti WHERE proprieta_id = OLD.proprieta_id AND mese = rif);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS pagamenti_flag ON pagamenti;
+CREATE TRIGGER pagamenti_flag
+AFTER INSERT OR DELETE ON pagamenti
+FOR EACH ROW EXECUTE FUNCTION pagamenti_flag();
+
+CREATE OR REPLACE FUNCTION mensilita_to_pagamenti()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    rif text := (SELECT mese FROM mensilita_mese WHERE id = 1);
+BEGIN
+    IF NEW.affittato_a IS NULL
+       OR coalesce(NEW.mensilita_pagata, false) = coalesce(CASE WHEN TG_OP = 'UPDATE' THEN OLD.mensilita_pagata END, false) THEN
+        RETURN NULL;
+    END IF;
+    IF NEW.mensilita_pagata THEN
+        -- Segnata pagata a mano: versamento del canone intero, se il mese non ne ha già
+        INSERT INTO pagamenti (proprieta_id, mese, importo)
+        SELECT NEW.id, rif, coalesce(NEW.affitto_mensile, 0)
+        WHERE NOT EXISTS (SELECT 1 FROM pagamenti WHERE proprieta_id = NEW.id AND mese = rif);
+    ELSE
+        -- Tolta a mano: i versamenti del mese vengono annullati
+        DELETE FROM pagamenti WHERE proprieta_id = NEW.id AND mese = rif;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS mensilita_to_pagamenti ON proprieta;
+CREATE TRIGGER mensilita_to_pagamenti
+AFTER INSERT OR UPDATE OF mensilita_pagata ON proprieta
+FOR EACH ROW EXECUTE FUNCTION mensilita_to_pagamenti();
+
+-- Cambio mese: mensilita_pagata ricalcolata dal registro (idempotente, ritorna le righe cambiate)
+CREATE OR REPLACE FUNCTION refresh_mensilita(mese_nuovo text)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    cambiate integer := 0;
+BEGIN
+    UPDATE mensilita_mese SET mese = mese_nuovo WHERE id = 1 AND mese <> mese_nuovo;
+    IF NOT FOUND THEN
+        RETURN 0;
+    END IF;
+    UPDATE proprieta p
+    SET mensilita_pagata = EXISTS (SELECT 1 FROM pagamenti g WHERE g.proprieta_id = p.id AND g.mese = mese_nuovo)
+    WHERE p.affittato_a IS NOT NULL
+      AND p.mensilita_pagata IS DISTINCT FROM
+          EXISTS (SELECT 1 FROM pagamenti g WHERE g.proprieta_id = p.id AND g.mese = mese_nuovo);
+    GET DIAGNOSTICS cambiate = ROW_COUNT;
+    RETURN cambiate;
+END;
+$$;
+
+-- Mesi dovuti con residuo non coperto dai versamenti e giorni di ritardo (come _INSOLUTI in db_sqlite.py)
+CREATE OR REPLACE FUNCTION pagamenti_insoluti(oggi date, dal text, limite text, giorno integer)
+RETURNS TABLE (id bigint, affittato_a text, mese text, residuo numeric, giorni integer)
+LANGUAGE sql STABLE
+AS $$
+    WITH affitti AS (
+        SELECT p.id, p.affittato_a, p.affitto_mensile,
+               greatest(coalesce(left(p.contratto_inizio::text, 7), limite), dal) AS primo,
+               least(coalesce(left(p.contratto_fine::text, 7), limite), limite) AS ultimo
+        FROM proprieta p
+        WHERE p.affittato_a IS NOT NULL AND p.affitto_mensile > 0
+    ),
+    dovuti AS (
+        SELECT a.id, a.affittato_a, to_char(m, 'YYYY-MM') AS mese,
+               a.affitto_mensile - coalesce((SELECT sum(g.importo) FROM pagamenti g
+                                             WHERE g.proprieta_id = a.id AND g.mese = to_char(m, 'YYYY-MM')), 0) AS residuo,
+               oggi - (m::date + (giorno - 1)) AS giorni
+        FROM affitti a
+        CROSS JOIN LATERAL generate_series(to_date(a.primo, 'YYYY-MM'), to_date(a.ultimo, 'YYYY-MM'), interval '1 month') AS m
+    )
+    SELECT * FROM dovuti WHERE residuo > 0.005;
+$$;
+
+CREATE OR REPLACE FUNCTION pagamenti_morosita(oggi date, dal text, limite text, giorno integer)
+RETURNS TABLE (inquilino text, immobili bigint, mensilita bigint, importo numeric, dal_mese text, giorni integer)
+LANGUAGE sql STABLE
+AS $$
+    SELECT affittato_a, count(DISTINCT id), count(*), round(sum(residuo), 2), min(mese), max(giorni)
+    FROM pagamenti_insoluti(oggi, dal, limite, giorno)
+    GROUP BY affittato_a
+    ORDER BY 4 DESC, 1;
+$$;
+
+CREATE OR REPLACE FUNCTION pagamenti_aging(oggi date, dal text, limite text, giorno integer)
+RETURNS TABLE (fascia text, importo numeric, mensilita bigint)
+LANGUAGE sql STABLE
+AS $$
+    SELECT CASE WHEN giorni <= 30 THEN '0_30' WHEN giorni <= 60 THEN '30_60' ELSE '60_oltre' END,
+           sum(residuo), count(*)
+    FROM pagamenti_insoluti(oggi, dal, limite, giorno)
+    GROUP BY 1;
+$$;
@@ -0,0 +1,191 @@
+# src/allegati.py
+"""
+Caricamento massivo di piantine e contratti.
+
+I file si abbinano alle proprietà per `nome`: o una cartella per immobile
+(`<radice>/<nome>/<file>`) o un file con il nome dell'immobile
+(`<radice>/<nome>.pdf`). Gli upload girano in parallelo su un pool di thread
+limitato, i file con lo stesso hash di quello già collegato vengono saltati e
+tutte le righe si aggiornano con una sola scrittura massiva.
+"""
+import hashlib
+import re
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List, Optional, Union
+try:
+    from . import settings
+    from .db import db, images, IMG_HASH_COL, CONTRACT_HASH_COL
+except ImportError:
+    import settings
+    from db import db, images, IMG_HASH_COL, CONTRACT_HASH_COL
+
+CARICATO = "caricato"
+SALTATO = "saltato"
+ERRORE = "errore"
+IGNORATO = "ignorato"
+
+
+@dataclass
+class Allegato:
+    nome: str                    # nome dell'immobile a cui abbinare il file
+    filename: str
+    source: Union[Path, BinaryIO, bytes]  # file su disco o aperto (letti dal worker) o contenuto in memoria
+
+    def read(self) -> bytes:
+        if isinstance(self.source, Path):
+            return self.source.read_bytes()
+        if isinstance(self.source, bytes):
+            return self.source
+        self.source.seek(0)
+        return self.source.read()
+
+
+def match_key(nome: str) -> str:
+    """Chiave di abbinamento: senza accenti, maiuscole e punteggiatura."""
+    nome = unicodedata.normalize("NFKD", nome)
+    nome = "".join(c for c in nome if not unicodedata.combining(c))
+    return " ".join(re.split(r"[\W_]+", nome.casefold())).strip()
+
+
+def nome_da_percorso(filename: str) -> str:
+    """'Villa Rossi/piantina.jpg' -> 'Villa Rossi'; 'Villa Rossi.pdf' -> 'Villa Rossi'."""
+    path = Path(filename.replace("\\", "/"))
+    return path.parent.name if path.parent.name else path.stem
+
+
+def tipo_allegato(filename: str) -> Optional[str]:
+    ext = Path(filename).suffix.lower()
+    if ext in settings.SUPPORTED_IMAGE_FORMATS:
+        return "piantina"
+    if ext == ".pdf":
+        return "contratto"
+    return None
+
+
+def scan_folder(root: Union[str, Path]) -> List[Allegato]:
+    """File della cartella di onboarding, in ordine di nome (i file nascosti sono esclusi)."""
+    allegati: List[Allegato] = []
+    for entry in sorted(Path(root).iterdir()):
+        if entry.name.startswith("."):
+            continue
+        if entry.is_dir():
+            for f in sorted(entry.iterdir()):
+                if f.is_file() and not f.name.startswith("."):
+                    allegati.append(Allegato(entry.name, f.name, f))
+        elif entry.is_file():
+            allegati.append(Allegato(entry.stem, entry.name, entry))
+    return allegati
+
+
+def _upload(prop: Dict[str, Any], tipo: str, allegato: Allegato, make_public_url: bool) -> Dict[str, Any]:
+    """Eseguito nel pool: legge, confronta l'hash e carica. Ritorna l'esito del file."""
+    data = allegato.read()
+    digest = hashlib.sha256(data).hexdigest()
+    hash_col = IMG_HASH_COL if tipo == "piantina" else CONTRACT_HASH_COL
+    if prop.get(hash_col) == digest:
+        return {"esito": SALTATO, "messaggio": "già caricato", "bytes": len(data)}
+
+    if tipo == "piantina":
+        image = images.process_piantina(data, allegato.filename)
+        payload = db.store_piantina(prop["id"], image, make_public_url=make_public_url)
+    else:
+        payload = db.store_contratto(prop["id"], data, allegato.filename, make_public_url=make_public_url)
+    return {"esito": CARICATO, "messaggio": None, "bytes": len(data), "payload": payload}
+
+
+def bulk_upload(
+    allegati: List[Allegato],
+    *,
+    max_workers: Optional[int] = None,
+    make_public_url: bool = True,
+) -> Dict[str, Any]:
+    """
+    Carica gli allegati e collega le proprietà con un solo aggiornamento massivo.
+
+    Per ogni immobile si usa il primo file di ciascun tipo (immagine -> piantina,
+    PDF -> contratto); gli altri risultano 'ignorato'. Ritorna il dettaglio per
+    file ('caricato', 'saltato', 'errore', 'ignorato'), i totali e il throughput.
+    """
+    start = time.perf_counter()
+    proprieta = {match_key(p["nome"]): p for p in db.get_all_proprieta()}
+
+    risultati: List[Dict[str, Any]] = []
+    jobs = []
+    occupati = set()
+    for allegato in allegati:
+        res = {"file": allegato.filename, "nome": allegato.nome, "tipo": tipo_allegato(allegato.filename),
+               "proprieta_id": None, "esito": IGNORATO, "messaggio": None, "bytes": 0}
+        risultati.append(res)
+        prop = proprieta.get(match_key(allegato.nome))
+        if res["tipo"] is None:
+            res["messaggio"] = "formato non supportato"
+        elif prop is None:
+            res["messaggio"] = "nessun immobile con questo nome"
+        elif (prop["id"], res["tipo"]) in occupati:
+            res["proprieta_id"] = prop["id"]
+            res["messaggio"] = f"{res['tipo']} già presente nel caricamento"
+        else:
+            res["proprieta_id"] = prop["id"]
+            occupati.add((prop["id"], res["tipo"]))
+            jobs.append((res, prop, allegato))
+
+    payloads: Dict[int, Dict[str, Any]] = {}
+    file_per_prop: Dict[int, List[Dict[str, Any]]] = {}
+    with ThreadPoolExecutor(max_workers=max_workers or settings.UPLOAD_WORKERS) as pool:
+        futures = [
+            (res, pool.submit(_upload, prop, res["tipo"], allegato, make_public_url))
+            for res, prop, allegato in jobs
+        ]
+        for res, future in futures:
+            try:
+                out = future.result()
+            except Exception as e:
+                res.update(esito=ERRORE, messaggio=str(e))
+                continue
+            payload = out.pop("payload", None)
+            res.update(out)
+            if payload:
+                payloads.setdefault(res["proprieta_id"], {}).update(payload)
+                file_per_prop.setdefault(res["proprieta_id"], []).append(res)
+
+    if payloads:
+        rows = [{"id": prop_id, **payload} for prop_id, payload in payloads.items()]
+        _, errors = db.update_proprieta_bulk(rows)
+        for i, msg in errors.items():
+            for res in file_per_prop[rows[i]["id"]]:
+                res.update(esito=ERRORE, messaggio=msg)
+
+    secondi = time.perf_counter() - start
+    caricati = [r for r in risultati if r["esito"] == CARICATO]
+    mb = sum(r["bytes"] for r in caricati) / (1024 * 1024)
+    return {
+        "files": risultati,
+        "caricati": len(caricati),
+        "saltati": sum(r["esito"] == SALTATO for r in risultati),
+        "errori": sum(r["esito"] == ERRORE for r in risultati),
+        "ignorati": sum(r["esito"] == IGNORATO for r in risultati),
+        "secondi": round(secondi, 3),
+        "file_al_secondo": round(len(caricati) / secondi, 2) if secondi else 0.0,
+        "mb_al_secondo": round(mb / secondi, 2) if secondi else 0.0,
+    }
+
+
+def upload_folder(root: Union[str, Path], **kwargs) -> Dict[str, Any]:
+    return bulk_upload(scan_folder(root), **kwargs)
+
+
+if __name__ == "__main__":
+    import sys
+
+    report = upload_folder(sys.argv[1])
+    for r in report["files"]:
+        print(f"{r['esito']:<9} {r['nome']}/{r['file']}" + (f"  ({r['messaggio']})" if r["messaggio"] else ""))
+    print(
+        f"{report['caricati']} caricati, {report['saltati']} saltati, {report['errori']} errori, "
+        f"{report['ignorati']} ignorati in {report['secondi']}s "
+        f"({report['file_al_secondo']} file/s, {report['mb_al_secondo']} MB/s)"
+    )
@@ -0,0 +1,180 @@
+# src/analytics.py
+"""
+Analisi di portafoglio a colonne (pandas/NumPy).
+
+Il portafoglio viene letto una volta dal backend con le sole colonne che
+servono (`COLUMNS`), portato in un DataFrame e analizzato con operazioni
+vettoriali: rendimento lordo per immobile e aggregato, distribuzione del
+valore al m², tasso di sfitto e concentrazione del valore, anche per
+categoria, zona censuaria e classe catastale. `DatabaseManager.get_analytics`
+tiene il risultato in cache fino alla prossima scrittura.
+"""
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ["id", "nome", "mq_commerciali", "valore_mq", "affittato_a", "affitto_mensile",
+           "categoria", "zona_cens", "classe"]
+GRUPPI = ("categoria", "zona_cens", "classe")
+NON_INDICATO = "n/d"  # gruppo delle righe senza dato catastale
+PERCENTILI = {"p10": 0.10, "p25": 0.25, "mediana": 0.50, "p75": 0.75, "p90": 0.90}
+TOP_RENDIMENTI = 10
+
+
+def frame(rows: Union[List[Dict[str, Any]], pd.DataFrame]) -> pd.DataFrame:
+    """
+    Righe del backend (o un DataFrame, es. `ProprietaBatch.to_frame()`) ->
+    DataFrame con le colonne derivate: valore (mq commerciali × €/m²),
+    affittato, canone_annuo e rendimento_lordo (canone annuo / valore, NaN se
+    sfitto o senza valore).
+    """
+    if isinstance(rows, pd.DataFrame):
+        df = pd.DataFrame({c: rows[c] for c in COLUMNS}, copy=False)  # l'originale non cambia
+    else:
+        df = pd.DataFrame.from_records(rows, columns=COLUMNS)
+    for col in ("mq_commerciali", "valore_mq", "affitto_mensile"):
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0)
+    for col in GRUPPI:
+        df[col] = _categorie(df[col])
+
+    df["valore"] = df["mq_commerciali"] * df["valore_mq"]
+    df["affittato"] = df["affittato_a"].notna() & (df["affittato_a"] != "")
+    df["canone_annuo"] = np.where(df["affittato"], df["affitto_mensile"] * 12, 0.0)
+    df["valore_affittato"] = np.where(df["affittato"], df["valore"], 0.0)
+    df["rendimento_lordo"] = np.where(
+        df["affittato"] & (df["valore"] > 0), df["canone_annuo"] / df["valore"].where(df["valore"] > 0), np.nan
+    )
+    return df
+
+
+def _categorie(values: pd.Series) -> pd.Categorical:
+    """
+    Colonna catastale -> categorica. I dati arrivano come testo o numero a
+    seconda del backend: si normalizzano i soli valori distinti, non le righe.
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    labels = np.array([str(u).strip() or NON_INDICATO for u in uniques] + [NON_INDICATO], dtype=object)
+    return pd.Categorical(labels[codes])  # codice -1 (mancante) -> ultima etichetta
+
+
+def _round(value: Any, digits: int = 2) -> Optional[float]:
+    if value is None or pd.isna(value):
+        return None
+    return round(float(value), digits)
+
+
+def _ratio(num: float, den: float) -> Optional[float]:
+    return num / den if den else None
+
+
+def _distribuzione(values: pd.Series, digits: int = 2) -> Dict[str, Optional[float]]:
+    """Media e percentili dei valori positivi (le righe senza dato non contano)."""
+    values = values[values > 0].to_numpy()
+    if not len(values):
+        return {"media": None, "min": None, **{k: None for k in PERCENTILI}, "max": None}
+    q = np.quantile(values, list(PERCENTILI.values()))
+    return {
+        "media": _round(values.mean(), digits),
+        "min": _round(values.min(), digits),
+        **{k: _round(v, digits) for k, v in zip(PERCENTILI, q)},
+        "max": _round(values.max(), digits),
+    }
+
+
+def _concentrazione(valori: pd.Series) -> Dict[str, Optional[float]]:
+    """
+    Quanto il valore è concentrato in pochi immobili: quota dei 10 più
+    preziosi e del 10% più prezioso, indice di Herfindahl (1/n = uniforme, 1 = uno solo).
+    """
+    totale = float(valori.sum())
+    if totale <= 0:
+        return {"quota_top10": None, "quota_top10pct": None, "herfindahl": None}
+    ordinati = np.sort(valori.to_numpy())[::-1]
+    quote = ordinati / totale
+    decile = max(1, int(np.ceil(len(ordinati) * 0.10)))
+    return {
+        "quota_top10": _round(quote[:10].sum(), 4),
+        "quota_top10pct": _round(quote[:decile].sum(), 4),
+        "herfindahl": _round(np.square(quote).sum(), 6),
+    }
+
+
+def riepilogo(df: pd.DataFrame) -> Dict[str, Any]:
+    """Totali di portafoglio."""
+    immobili = len(df)
+    affittati = int(df["affittato"].sum())
+    valore = float(df["valore"].sum())
+    canone = float(df["canone_annuo"].sum())
+    return {
+        "immobili": immobili,
+        "affittati": affittati,
+        "tasso_sfitto": _round(_ratio(immobili - affittati, immobili), 4),
+        "valore": _round(valore),
+        "canone_annuo": _round(canone),
+        # Sul valore degli immobili affittati e, sotto, sull'intero patrimonio
+        "rendimento_lordo": _round(_ratio(canone, float(df["valore_affittato"].sum())), 4),
+        "rendimento_portafoglio": _round(_ratio(canone, valore), 4),
+        "valore_mq": _distribuzione(df["valore_mq"]),
+        "rendimento_distribuzione": _distribuzione(df["rendimento_lordo"].dropna(), 4),
+        "concentrazione": _concentrazione(df["valore"]),
+    }
+
+
+def per_gruppo(df: pd.DataFrame, col: str) -> List[Dict[str, Any]]:
+    """Una riga per valore di `col`, dal gruppo di valore più alto."""
+    if df.empty:
+        return []
+    # Un passaggio cython per le somme, uno per media e mediana del €/m²
+    gruppi = df.groupby(col, observed=True, sort=False)
+    g = gruppi[["affittato", "valore", "valore_affittato", "canone_annuo"]].sum()
+    g["immobili"] = gruppi.size()
+    valore_mq = df["valore_mq"].where(df["valore_mq"] > 0).groupby(df[col], observed=True, sort=False)
+    g["valore_mq_medio"] = valore_mq.mean()
+    g["valore_mq_mediano"] = valore_mq.median()
+    g = g.rename(columns={"affittato": "affittati"})
+    totale = g["valore"].sum()
+    g["tasso_sfitto"] = (g["immobili"] - g["affittati"]) / g["immobili"]
+    g["quota_valore"] = g["valore"] / totale if totale else np.nan
+    g["rendimento_lordo"] = g["canone_annuo"] / g["valore_affittato"].where(g["valore_affittato"] > 0)
+    g = g.sort_values(["valore", "immobili"], ascending=False)
+
+    return [
+        {
+            col: key,
+            "immobili": int(r.immobili),
+            "affittati": int(r.affittati),
+            "tasso_sfitto": _round(r.tasso_sfitto, 4),
+            "valore": _round(r.valore),
+            "quota_valore": _round(r.quota_valore, 4),
+            "canone_annuo": _round(r.canone_annuo),
+            "rendimento_lordo": _round(r.rendimento_lordo, 4),
+            "valore_mq_medio": _round(r.valore_mq_medio),
+            "valore_mq_mediano": _round(r.valore_mq_mediano),
+        }
+        for key, r in zip(g.index, g.itertuples(index=False))
+    ]
+
+
+def rendimenti(df: pd.DataFrame, n: int = TOP_RENDIMENTI) -> Dict[str, List[Dict[str, Any]]]:
+    """Gli `n` immobili affittati con rendimento lordo più alto e più basso."""
+    rese = df.loc[df["rendimento_lordo"].notna(), ["id", "nome", "categoria", "rendimento_lordo"]]
+
+    def righe(part: pd.DataFrame) -> List[Dict[str, Any]]:
+        return [{"id": int(i), "nome": nome, "categoria": cat, "rendimento_lordo": _round(r, 4)}
+                for i, nome, cat, r in part.itertuples(index=False)]
+
+    return {
+        "migliori": righe(rese.nlargest(n, "rendimento_lordo")),
+        "peggiori": righe(rese.nsmallest(n, "rendimento_lordo")),
+    }
+
+
+def analizza(rows: Union[List[Dict[str, Any]], pd.DataFrame]) -> Dict[str, Any]:
+    """Report completo: {"totale": ..., "gruppi": {colonna: [...]}, "rendimenti": ...}."""
+    df = frame(rows)
+    return {
+        "totale": riepilogo(df),
+        "gruppi": {col: per_gruppo(df, col) for col in GRUPPI},
+        "rendimenti": rendimenti(df),
+    }
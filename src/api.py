@@ -1,15 +1,38 @@
 # src/api.py
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, UploadFile, File
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel, Field
-from typing import Optional, List
-from datetime import date
+from typing import Any, Dict, Optional, List, Union
+from datetime import date, datetime
+from contextlib import asynccontextmanager
+from pathlib import Path
+import hashlib
+import time
+from . import settings
+from . import metrics, lazy
 from .db import db
+from .db_async import AsyncDatabaseManager
+from .query import ORDINAMENTI
+from .allegati import Allegato, bulk_upload, nome_da_percorso
+
+# Endpoint async: il round trip verso il backend non occupa un thread del pool
+adb = AsyncDatabaseManager(db)
+# pandas e openpyxl si caricano al primo export, non all'avvio
+excel_io = lazy.modulo("excel_io", __package__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db.start_sync()
+    yield
+    await adb.aclose()
 
 app = FastAPI(
     title="Gestionale Immobiliare API",
     version="1.0.0",
-    description="API REST per sincronizzazione dati immobiliari"
+    description="API REST per sincronizzazione dati immobiliari",
+    lifespan=lifespan,
 )
 
 # CORS per chiamate da Streamlit
@@ -19,8 +42,44 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+@app.middleware("http")
+async def etag_middleware(request: Request, call_next):
+    """
+    ETag forte (hash del corpo JSON) sulle GET: con If-None-Match uguale la
+    risposta è un 304 senza corpo, quindi chi fa polling scarica solo se qualcosa è cambiato.
+    """
+    response = await call_next(request)
+    if (request.method != "GET" or response.status_code != 200
+            or response.headers.get("content-type") != "application/json"):
+        return response
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    headers = {k: v for k, v in response.headers.items() if k != "content-length"}
+    headers["ETag"] = etag
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        headers.pop("content-type", None)
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, status_code=200, headers=headers)
+
+# Compressione delle risposte grandi; aggiunta dopo l'ETag (più esterna), così l'hash è sul JSON in chiaro
+app.add_middleware(GZipMiddleware, minimum_size=settings.GZIP_MIN_BYTES)
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """Latenza e byte inviati (dopo gzip) per route: il più esterno, misura anche ETag e compressione."""
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Template della route ("/proprieta/{prop_id}"), non il path: una serie per endpoint
+    route = getattr(request.scope.get("route"), "path", "non trovata")
+    metrics.HTTP_LATENCY.observe(time.perf_counter() - start, request.method, route, str(response.status_code))
+    size = response.headers.get("content-length")
+    if size is not None:
+        metrics.HTTP_SIZE.observe(int(size), request.method, route)
+    return response
+
 # Pydantic Models
 class ProprietaBase(BaseModel):
     nome: str = Field(..., min_length=1, max_length=100)
@@ -45,6 +104,19 @@ class ProprietaUpdate(ProprietaBase):
     mq_commerciali: Optional[float] = None
     valore_mq: Optional[float] = None
 
+class ProprietaPatch(ProprietaUpdate):
+    id: int
+
+class MensilitaRequest(BaseModel):
+    ids: Optional[List[int]] = None  # None = tutti gli affitti attivi
+    pagata: bool = True
+
+class PagamentoCreate(BaseModel):
+    proprieta_id: int
+    mese: str = Field(..., pattern=r"^\d{4}-(0[1-9]|1[0-2])$")  # competenza AAAA-MM
+    importo: float = Field(..., ge=0)
+    pagato_il: Optional[date] = None  # default: oggi
+
 class ProprietaResponse(ProprietaBase):
     id: int
     created_at: str
@@ -53,76 +125,220 @@ class ProprietaResponse(ProprietaBase):
     class Config:
         from_attributes = True
 
+class ModificheResponse(BaseModel):
+    changed: List[ProprietaResponse]
+    deleted: List[int]
+    sync_token: str
+
 # Endpoints
 @app.get("/")
-def root():
+async def root():
     return {"message": "Gestionale Immobiliare API v1.0", "status": "online"}
 
-@app.get("/proprieta", response_model=List[ProprietaResponse])
-def list_proprieta(
-    skip: int = 0,
-    limit: int = 100,
-    affittato: Optional[bool] = None
+@app.get("/proprieta", response_model=Union[List[ProprietaResponse], ModificheResponse])
+async def list_proprieta(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    affittato: Optional[bool] = None,
+    order_by: str = "nome",
+    cursor: Optional[str] = None,
+    q: Optional[str] = Query(None, max_length=200),
+    updated_since: Optional[datetime] = None,
 ):
-    """Lista tutte le proprietà con filtri opzionali"""
-    filters = {}
+    """
+    Lista paginata delle proprietà con filtri opzionali.
+
+    Paginazione a offset (`skip`/`limit`) oppure a cursore: se ci sono altre
+    righe l'header `X-Next-Cursor` contiene il token da passare come `cursor`.
+    Con `q` restituisce i primi `limit` risultati della ricerca full-text,
+    ordinati per rilevanza.
+
+    Con `updated_since` (ISO 8601, UTC se senza fuso) restituisce solo le
+    modifiche: {"changed": [...], "deleted": [id, ...], "sync_token": "..."};
+    il `sync_token` va ripassato come `updated_since` al giro successivo.
+    """
+    if updated_since is not None:
+        return await adb.get_changes(updated_since)
+
+    if order_by not in ORDINAMENTI:
+        raise HTTPException(status_code=400, detail=f"order_by non valido, ammessi: {ORDINAMENTI}")
+    filters = {'order_by': order_by}
     if affittato is not None:
         filters['solo_affitti'] = affittato
-    
-    proprieta = db.get_all_proprieta(filters)
-    return proprieta[skip:skip+limit]
+
+    if q and q.strip():
+        return await adb.search_proprieta(q, filters, limit=limit)
+
+    try:
+        page = await adb.get_proprieta_page(filters, limit=limit, offset=skip, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    return page["items"]
+
+@app.get("/scadenze", response_model=List[ProprietaResponse])
+async def list_scadenze(
+    response: Response,
+    dal: Optional[date] = None,
+    al: Optional[date] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+):
+    """
+    Contratti in scadenza fra `dal` e `al` (inclusi), ordinati per contratto_fine.
+    Default: da oggi ai prossimi SCADENZA_WARNING_GIORNI giorni.
+    """
+    if dal and al and al < dal:
+        raise HTTPException(status_code=400, detail="'al' deve essere successivo a 'dal'")
+    try:
+        page = await adb.get_scadenze(dal, al, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    return page["items"]
+
+def _errori(errors: Dict[int, str]) -> List[Dict[str, Any]]:
+    return [{"indice": i, "errore": msg} for i, msg in sorted(errors.items())]
+
+@app.post("/proprieta/bulk")
+async def create_proprieta_bulk(proprieta: List[ProprietaCreate]):
+    """Crea più proprietà con una scrittura per blocco; le righe rifiutate sono riportate per indice"""
+    ids, errors = await adb.create_proprieta_bulk([p.model_dump(mode="json") for p in proprieta])
+    return {"ids": ids, "creati": sum(i is not None for i in ids), "errori": _errori(errors)}
+
+@app.patch("/proprieta/bulk")
+async def patch_proprieta_bulk(modifiche: List[ProprietaPatch]):
+    """Aggiorna solo i campi inviati di ogni proprietà, con una scrittura per blocco"""
+    rows = [m.model_dump(mode="json", exclude_unset=True) for m in modifiche]
+    updated, errors = await adb.update_proprieta_bulk(rows)
+    return {"aggiornati": updated, "errori": _errori(errors)}
+
+@app.post("/proprieta/mensilita")
+async def set_mensilita(richiesta: MensilitaRequest):
+    """
+    Segna pagata (o da pagare) la mensilità degli affitti in `ids`, oppure di
+    tutti gli affitti attivi se `ids` manca: un unico UPDATE.
+    """
+    changed = await adb.set_mensilita_pagata(richiesta.ids, richiesta.pagata)
+    return {"aggiornati": len(changed), "ids": changed}
+
+@app.post("/pagamenti")
+async def create_pagamenti(pagamenti: List[PagamentoCreate]):
+    """Registra più versamenti (anche parziali o arretrati); le righe rifiutate sono riportate per indice"""
+    ids, errors = await adb.create_pagamenti([p.model_dump(mode="json") for p in pagamenti])
+    return {"registrati": sum(1 for i in ids if i is not None), "ids": ids, "errori": _errori(errors)}
+
+@app.get("/pagamenti/morosita")
+async def get_morosita(al: Optional[date] = None):
+    """Insoluti per inquilino alla data `al` (default oggi), dal più esposto"""
+    return await adb.get_morosita(al)
+
+@app.get("/pagamenti/aging")
+async def get_aging(al: Optional[date] = None):
+    """Insoluti di portafoglio per fascia di ritardo: 0-30, 30-60, oltre 60 giorni"""
+    return await adb.get_aging(al)
+
+@app.get("/proprieta/{proprieta_id}/pagamenti")
+async def get_pagamenti(proprieta_id: int):
+    """Versamenti registrati per la proprietà, dal mese più recente"""
+    return await adb.get_pagamenti(proprieta_id)
 
 @app.get("/proprieta/{proprieta_id}", response_model=ProprietaResponse)
-def get_proprieta(proprieta_id: int):
+async def get_proprieta(proprieta_id: int):
     """Ottieni dettagli proprietà per ID"""
-    prop = db.get_proprieta_by_id(proprieta_id)
+    prop = await adb.get_proprieta_by_id(proprieta_id)
     if not prop:
         raise HTTPException(status_code=404, detail="Proprietà non trovata")
     return prop
 
 @app.post("/proprieta", response_model=ProprietaResponse, status_code=201)
-def create_proprieta(proprieta: ProprietaCreate):
-    """Crea nuova proprietà"""
+async def create_proprieta(proprieta: ProprietaCreate):
+    """Crea nuova proprietà (la riga scritta torna dall'INSERT, senza rilettura)"""
     try:
-        prop_id = db.create_proprieta(proprieta.model_dump())
-        return db.get_proprieta_by_id(prop_id)
+        return await adb.create_proprieta(proprieta.model_dump(mode="json"), returning=True)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.put("/proprieta/{proprieta_id}", response_model=ProprietaResponse)
-def update_proprieta(proprieta_id: int, proprieta: ProprietaUpdate):
-    """Aggiorna proprietà esistente"""
-    if not db.get_proprieta_by_id(proprieta_id):
-        raise HTTPException(status_code=404, detail="Proprietà non trovata")
-    
-    # Rimuovi campi None
-    update_data = {k: v for k, v in proprieta.model_dump().items() if v is not None}
+async def update_proprieta(proprieta_id: int, proprieta: ProprietaUpdate):
+    """Aggiorna proprietà esistente: un solo UPDATE, 404 se non tocca nessuna riga"""
+    # Campi None esclusi; date come stringhe ISO, serializzabili anche dal client PostgREST
+    update_data = proprieta.model_dump(mode="json", exclude_none=True)
     
     try:
-        db.update_proprieta(proprieta_id, update_data)
-        return db.get_proprieta_by_id(proprieta_id)
+        prop = await adb.update_proprieta(proprieta_id, update_data)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    if not prop:
+        raise HTTPException(status_code=404, detail="Proprietà non trovata")
+    return prop
 
 @app.delete("/proprieta/{proprieta_id}", status_code=204)
-def delete_proprieta(proprieta_id: int):
+async def delete_proprieta(proprieta_id: int):
     """Elimina proprietà"""
-    if not db.delete_proprieta(proprieta_id):
+    if not await adb.delete_proprieta(proprieta_id):
         raise HTTPException(status_code=404, detail="Proprietà non trovata")
     return None
 
 @app.get("/stats")
-def get_stats():
-    """Statistiche generali"""
-    proprieta = db.get_all_proprieta()
-    affitti = [p for p in proprieta if p['affittato_a']]
-    
-    return {
-        "totale_immobili": len(proprieta),
-        "affitti_attivi": len(affitti),
-        "entrate_mensili": sum(p['affitto_mensile'] for p in affitti),
-        "valore_patrimonio": sum(p['mq_commerciali'] * p['valore_mq'] for p in proprieta)
-    }
+async def get_stats(giorni_scadenza: Optional[int] = Query(None, ge=0)):
+    """Statistiche generali (aggregate lato backend)"""
+    return await adb.get_stats(giorni_scadenza)
+
+@app.get("/analytics")
+async def get_analytics():
+    """Rendimento lordo, €/m², sfitto e concentrazione del valore, in totale e per categoria, zona e classe"""
+    return await adb.get_analytics()
+
+@app.get("/cashflow")
+async def get_cashflow(
+    mesi: int = Query(12, ge=1, le=60),
+    dal: Optional[date] = None,
+    inquilini: int = Query(50, ge=0),
+):
+    """Canoni attesi mese per mese dai periodi dei contratti: totali per mese, per inquilino (i primi `inquilini`) e per categoria"""
+    return await adb.get_cashflow(mesi, dal, inquilini=inquilini)
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics():
+    """Metriche HTTP e delle chiamate a backend/storage, formato testuale Prometheus"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/export/excel")
+async def export_excel():
+    """Export Excel di tutte le proprietà, generato a pagine e inviato in streaming"""
+    filename = f"export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    return StreamingResponse(
+        excel_io.ExcelIO.iter_export_chunks(),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.get("/cashflow/excel")
+async def export_cashflow(mesi: int = Query(12, ge=1, le=60)):
+    """Piano dei canoni attesi in Excel (totali, inquilini, categorie e contratti), in streaming"""
+    filename = f"cashflow_{datetime.now().strftime('%Y%m%d')}_{mesi}m.xlsx"
+    return StreamingResponse(
+        excel_io.ExcelIO.iter_cashflow_chunks(mesi),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.post("/allegati/bulk")
+def upload_allegati(files: List[UploadFile] = File(...)):
+    """
+    Caricamento massivo di piantine e contratti. Il nome dell'immobile è la
+    cartella del file ('Villa Rossi/piantina.jpg') o, senza cartella, il nome del file.
+    """
+    # I file restano nello spool di UploadFile: ognuno è letto dal worker che lo carica
+    allegati = [
+        Allegato(nome_da_percorso(f.filename or ""), Path(f.filename or "").name, f.file)
+        for f in files
+    ]
+    return bulk_upload(allegati)
 
 # Avvio server
 if __name__ == "__main__":
@@ -0,0 +1,125 @@
+# src/cache.py
+"""Cache LRU con TTL per le letture di DatabaseManager."""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+def _copy(value: Any) -> Any:
+    """Copia di liste/dict annidati (righe JSON): molto più veloce di copy.deepcopy."""
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    return value
+
+
+class QueryCache:
+    """
+    Cache read-through thread-safe: voci con scadenza `ttl` secondi, al massimo
+    `maxsize` voci (le meno usate escono per prime). I valori restituiti sono
+    copie, così chi li modifica non sporca la cache.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Incrementata a ogni invalidazione: un caricamento iniziato prima non viene salvato
+        self._generation = 0
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        hit, value, stamp = self._lookup(key)
+        if hit:
+            return value
+        return self._store(key, loader(), stamp)
+
+    async def aget_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Come `get_or_load`, con un caricamento asincrono (AsyncDatabaseManager)."""
+        hit, value, stamp = self._lookup(key)
+        if hit:
+            return value
+        return self._store(key, await loader(), stamp)
+
+    def _lookup(self, key: Hashable) -> Tuple[bool, Any, Tuple[float, int]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, _copy(entry[1]), (now, self._generation)
+            self.misses += 1
+            return False, None, (now, self._generation)
+
+    def _store(self, key: Hashable, value: Any, stamp: Tuple[float, int]) -> Any:
+        now, generation = stamp
+        with self._lock:
+            if generation == self._generation:
+                self._data[key] = (now + self.ttl, value)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return _copy(value)
+
+    def invalidate(self, keep: Optional[Callable[[Hashable], bool]] = None) -> None:
+        """Svuota la cache; con `keep` conserva le chiavi per cui ritorna True."""
+        with self._lock:
+            self._generation += 1
+            if keep is None:
+                self._data.clear()
+            else:
+                for key in [k for k in self._data if not keep(k)]:
+                    del self._data[key]
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+            }
+
+
+class SignedUrlCache:
+    """
+    URL firmati per (bucket, path), riusati finché restano validi per la durata
+    richiesta meno `margin` secondi (mai meno di `margin`): un URL firmato per
+    un'ora non risponde a chi chiede un link di una settimana.
+    """
+
+    def __init__(self, margin: float = 300.0, maxsize: int = 1024):
+        self.margin = margin
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[tuple[str, str], tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, bucket: str, path: str, expires_seconds: Optional[float] = None) -> Optional[str]:
+        residuo = self.margin if expires_seconds is None else max(self.margin, expires_seconds - self.margin)
+        with self._lock:
+            entry = self._data.get((bucket, path))
+            if entry is not None and entry[0] - residuo > time.monotonic():
+                self._data.move_to_end((bucket, path))
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, bucket: str, path: str, url: str, expires_seconds: float) -> None:
+        with self._lock:
+            self._data[(bucket, path)] = (time.monotonic() + expires_seconds, url)
+            self._data.move_to_end((bucket, path))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, bucket: str, path: str) -> None:
+        with self._lock:
+            self._data.pop((bucket, path), None)
@@ -1,7 +1,44 @@
-from supabase import create_client, Client
-from typing import Optional, List, Dict, Any
+from typing import TYPE_CHECKING, Optional, List, Dict, Any, BinaryIO, Tuple
+import io
+import hashlib
 from dotenv import load_dotenv
-import os, re, uuid, pathlib
+from pathlib import Path
+from datetime import date, datetime, timedelta, timezone
+import os, re, threading, uuid, pathlib
+
+try:
+    from . import settings
+    from .db_sqlite import SQLiteBackend, LocalStorage
+    from .replica import ReplicaBackend, SyncWorker
+    from .query import (
+        parse_order_by, encode_cursor, decode_cursor, scadenza_range, changes_window, changes_result,
+        mese_corrente, morosita_params, morosita_row, aging_result,
+    )
+    from .cache import QueryCache, SignedUrlCache
+    from .metrics import Instrumented
+    from . import lazy
+    from .scadenze import Portafoglio
+except ImportError:
+    import settings
+    from db_sqlite import SQLiteBackend, LocalStorage
+    from replica import ReplicaBackend, SyncWorker
+    from query import (
+        parse_order_by, encode_cursor, decode_cursor, scadenza_range, changes_window, changes_result,
+        mese_corrente, morosita_params, morosita_row, aging_result,
+    )
+    from cache import QueryCache, SignedUrlCache
+    from metrics import Instrumented
+    import lazy
+    from scadenze import Portafoglio
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+# pandas, openpyxl e Pillow solo quando servono (vedi lazy.py)
+analytics = lazy.modulo("analytics", __package__)
+cashflow = lazy.modulo("cashflow", __package__)
+records = lazy.modulo("records", __package__)
+images = lazy.modulo("images", __package__)
 
 load_dotenv()
 
@@ -9,19 +46,33 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 # Server-side: prefer SERVICE_ROLE_KEY (permessi completi con RLS/Storage)
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise RuntimeError("Missing SUPABASE_URL or SUPABASE_KEY in environment")
+_supabase: Optional["Client"] = None
+_supabase_lock = threading.Lock()
+
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+def get_supabase() -> "Client":
+    """Client Supabase condiviso, creato al primo uso: importare db non richiede le variabili d'ambiente."""
+    global _supabase
+    with _supabase_lock:
+        if _supabase is None:
+            if not SUPABASE_URL or not SUPABASE_KEY:
+                raise RuntimeError("Missing SUPABASE_URL or SUPABASE_KEY in environment")
+            from supabase import create_client
+            _supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+        return _supabase
 
 # --- Storage config -----------------------------------------------------------
 PIANTINE_BUCKET = "piantine"
 IMG_URL_COL  = "immagine_url"
 IMG_PATH_COL = "immagine_path"
+THUMB_URL_COL  = "miniatura_url"
+THUMB_PATH_COL = "miniatura_path"
+IMG_HASH_COL   = "immagine_sha256"
 
 CONTRACT_BUCKET   = "contratti"
 CONTRACT_URL_COL  = "contratto_url"
 CONTRACT_PATH_COL = "contratto_path"
+CONTRACT_HASH_COL = "contratto_sha256"
 
 
 # --- Helpers -----------------------------------------------------------------
@@ -58,50 +109,778 @@ def _as_signed_url(res) -> Optional[str]:
         )
     return None
 
+def _json_value(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, date) else value
 
-# --- DB Manager --------------------------------------------------------------
-class DatabaseManager:
-    def __init__(self):
-        self.table = supabase.table("proprieta")
+def _postgrest_value(value: Any) -> str:
+    """Quote a value for PostgREST logic filters (or=(...))."""
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
 
-    # CRUD
-    def create_proprieta(self, data: Dict[str, Any]) -> Optional[int]:
-        if "mensilita_pagata" in data and isinstance(data["mensilita_pagata"], int):
-            data["mensilita_pagata"] = bool(data["mensilita_pagata"])
-        resp = self.table.insert(data).execute()
-        return resp.data[0]["id"] if resp.data else None
 
-    def get_all_proprieta(self, filters: Optional[Dict] = None) -> List[Dict[str, Any]]:
-        q = self.table.select("*")
-        f = filters or {}
+# --- Backends ----------------------------------------------------------------
+class SupabaseQueries:
+    """
+    Costruzione delle query PostgREST su `proprieta`, condivisa dal backend
+    sincrono e da quello async (db_async.py): i builder hanno la stessa API,
+    cambia solo `execute()`.
+    """
 
+    def __init__(self, client):
+        self.client = client
+        self.table = client.table("proprieta")
+
+    @staticmethod
+    def _apply_filters(q, f: Dict[str, Any]):
         if f.get("solo_affitti"):
             q = q.not_.is_("affittato_a", None)
         if f.get("non_pagati"):
             q = q.eq("mensilita_pagata", False).not_.is_("affittato_a", None)
+        dal, al = scadenza_range(f)
+        if dal:
+            q = q.gte("contratto_fine", dal)
+        if al:
+            q = q.lte("contratto_fine", al)
+        return q
 
-        order_key = (f.get("order_by") or "nome").split()[0]
-        order_desc = "DESC" in (f.get("order_by") or "")
-        q = q.order(order_key, desc=order_desc)
+    def _select_query(
+        self,
+        filters: Optional[Dict] = None,
+        *,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        after: Optional[Tuple[Any, int]] = None,
+    ):
+        f = filters or {}
+        q = self._apply_filters(self.table.select("*"), f)
 
-        resp = q.execute()
-        return resp.data or []
+        order_key, order_desc = parse_order_by(f.get("order_by"))
+        if after is not None:
+            q = q.or_(self._keyset_filter(order_key, order_desc, after))
 
-    def get_proprieta_by_id(self, prop_id: int) -> Optional[Dict[str, Any]]:
-        resp = self.table.select("*").eq("id", prop_id).limit(1).execute()
+        # PostgREST: ASC → NULLS LAST, DESC → NULLS FIRST; id rende l'ordine totale
+        q = q.order(order_key, desc=order_desc).order("id", desc=order_desc)
+
+        if limit is not None:
+            q = q.range(offset, offset + limit - 1)
+        elif offset:
+            q = q.offset(offset)
+        return q
+
+    def _columns_query(self, columns: List[str], after_id: int, limit: int):
+        # Keyset su id: PostgREST limita comunque le righe per risposta
+        return self.table.select(",".join(columns)).gt("id", after_id).order("id").limit(limit)
+
+    def _search_query(self, q: str, filters: Optional[Dict], limit: int):
+        # Funzione SQL in schema_supabase.sql (indice GIN su tsvector senza accenti)
+        rq = self._apply_filters(self.client.rpc("search_proprieta", {"q": q}), filters or {})
+        return rq.limit(limit)
+
+    def _stats_query(self, giorni_scadenza: int):
+        # Funzione SQL definita in schema_supabase.sql: un'unica query aggregata lato server
+        return self.client.rpc("proprieta_stats", {"giorni": giorni_scadenza})
+
+    def _changes_query(self, since: datetime):
+        return self.table.select("*").gte("updated_at", since.isoformat()).order("updated_at").order("id")
+
+    def _tombstones_query(self, since: datetime):
+        return self.client.table("proprieta_eliminate").select("id").gte("deleted_at", since.isoformat()).order("id")
+
+    def _pagamenti_query(self, prop_id: int):
+        return (self.client.table("pagamenti").select("*").eq("proprieta_id", prop_id)
+                .order("mese", desc=True).order("id", desc=True))
+
+    def _morosita_query(self, params: Dict[str, Any]):
+        # Funzioni SQL in schema_supabase.sql, stesse query aggregate del backend SQLite
+        return self.client.rpc("pagamenti_morosita", params)
+
+    def _aging_query(self, params: Dict[str, Any]):
+        return self.client.rpc("pagamenti_aging", params)
+
+    @staticmethod
+    def _keyset_filter(order_key: str, order_desc: bool, after: Tuple[Any, int]) -> str:
+        value, last_id = after
+        if order_desc:
+            if value is None:
+                return f"and({order_key}.is.null,id.lt.{last_id}),{order_key}.not.is.null"
+            v = _postgrest_value(value)
+            return f"{order_key}.lt.{v},and({order_key}.eq.{v},id.lt.{last_id})"
+        if value is None:
+            return f"and({order_key}.is.null,id.gt.{last_id})"
+        v = _postgrest_value(value)
+        return f"{order_key}.gt.{v},and({order_key}.eq.{v},id.gt.{last_id}),{order_key}.is.null"
+
+    @staticmethod
+    def _first(resp) -> Optional[Dict[str, Any]]:
         item = resp.data[0] if resp.data else None
         # Ensure a dict (avoid 'str has no attribute get' in the UI)
         return item if isinstance(item, dict) else None
 
-    def update_proprieta(self, prop_id: int, data: Dict[str, Any]) -> bool:
+
+class SupabaseBackend(SupabaseQueries):
+    """Accesso a `proprieta` tramite PostgREST (Supabase)."""
+
+    def init_schema(self) -> None:
+        # Lo schema remoto è gestito dalla dashboard Supabase
+        pass
+
+    def insert(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # Prefer: return=representation (default di postgrest-py): la riga torna nella risposta
+        return self._first(self.table.insert(data).execute())
+
+    def insert_many(self, rows: List[Dict[str, Any]]) -> List[Optional[int]]:
+        # Un solo POST; Postgres lo esegue in una transazione (tutto o niente)
+        resp = self.table.insert(rows).execute()
+        return [r["id"] for r in resp.data or []]
+
+    def select(
+        self,
+        filters: Optional[Dict] = None,
+        *,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        after: Optional[Tuple[Any, int]] = None,
+    ) -> List[Dict[str, Any]]:
+        resp = self._select_query(filters, limit=limit, offset=offset, after=after).execute()
+        return resp.data or []
+
+    def select_columns(self, columns: List[str]) -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        page_size = settings.EXPORT_PAGE_SIZE
+        while True:
+            after_id = rows[-1]["id"] if rows else 0
+            page = self._columns_query(columns, after_id, page_size).execute().data or []
+            rows += page
+            if len(page) < page_size:
+                return rows
+
+    def search(self, q: str, filters: Optional[Dict] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        if not q.strip():
+            return []
+        resp = self._search_query(q, filters, limit).execute()
+        return resp.data or []
+
+    def stats(self, giorni_scadenza: int) -> Dict[str, Any]:
+        resp = self._stats_query(giorni_scadenza).execute()
+        return dict(resp.data or {})
+
+    def changes_since(self, since: datetime) -> Tuple[List[Dict[str, Any]], List[int]]:
+        rows = self._changes_query(since).execute().data or []
+        deleted = self._tombstones_query(since).execute().data or []
+        return rows, [r["id"] for r in deleted]
+
+    def get(self, prop_id: int) -> Optional[Dict[str, Any]]:
+        return self._first(self.table.select("*").eq("id", prop_id).limit(1).execute())
+
+    def update(self, prop_id: int, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not data:
+            return self.get(prop_id)
+        return self._first(self.table.update(data).eq("id", prop_id).execute())
+
+    def delete(self, prop_id: int) -> bool:
+        resp = self.table.delete().eq("id", prop_id).execute()
+        return bool(resp.data)
+
+    def update_many(self, rows: List[Dict[str, Any]]) -> List[int]:
+        # Un solo UPDATE set-based (schema_supabase.sql): ogni riga aggiorna solo le sue chiavi
+        payload = [{k: _json_value(v) for k, v in r.items()} for r in rows]
+        resp = self.client.rpc("update_proprieta_bulk", {"rows": payload}).execute()
+        return [r["id"] for r in resp.data or []]
+
+    def set_mensilita_pagata(self, ids: Optional[List[int]], pagata: bool) -> List[int]:
+        # Un PATCH per blocco di id (uno solo per "tutti"); solo righe che cambiano davvero
+        chunks = [None] if ids is None else [ids[i:i + 500] for i in range(0, len(ids), 500)]
+        changed: List[int] = []
+        for chunk in chunks:
+            q = (self.table.update({"mensilita_pagata": pagata})
+                 .not_.is_("affittato_a", None)
+                 .or_(f"mensilita_pagata.is.null,mensilita_pagata.is.{str(not pagata).lower()}"))
+            if chunk is not None:
+                q = q.in_("id", chunk)
+            changed += [r["id"] for r in q.execute().data or []]
+        return changed
+
+    def insert_pagamenti(self, rows: List[Dict[str, Any]]) -> List[int]:
+        payload = [{k: _json_value(v) for k, v in r.items()} for r in rows]
+        resp = self.client.table("pagamenti").insert(payload).execute()
+        return [r["id"] for r in resp.data or []]
+
+    def pagamenti(self, prop_id: int) -> List[Dict[str, Any]]:
+        return self._pagamenti_query(prop_id).execute().data or []
+
+    def pagamenti_since(self, since: datetime) -> List[Dict[str, Any]]:
+        resp = (self.client.table("pagamenti").select("*").gte("created_at", since.isoformat())
+                .order("created_at").order("id").execute())
+        return resp.data or []
+
+    def morosita(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [morosita_row(r) for r in self._morosita_query(params).execute().data or []]
+
+    def aging(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return self._aging_query(params).execute().data or []
+
+    def refresh_mensilita(self, mese: str) -> int:
+        return self.client.rpc("refresh_mensilita", {"mese_nuovo": mese}).execute().data or 0
+
+    def delete_many(self, ids: List[int]) -> int:
+        deleted = 0
+        # Blocchi per non superare la lunghezza massima dell'URL
+        for start in range(0, len(ids), 500):
+            resp = self.table.delete().in_("id", ids[start:start + 500]).execute()
+            deleted += len(resp.data or [])
+        return deleted
+
+
+class SupabaseStorage:
+    """Supabase Storage con la stessa interfaccia di `LocalStorage`."""
+
+    def __init__(self, client: "Client"):
+        self.client = client
+
+    def upload(self, bucket: str, path: str, fileobj: BinaryIO, content_type: Optional[str] = None) -> None:
+        # upsert (stringa, non bool): un file ricaricato sostituisce quello sullo stesso path,
+        # come in LocalStorage. storage3 accetta bytes o file su disco, non BytesIO.
+        file_options = {"upsert": "true"}
+        if content_type:
+            file_options["content-type"] = content_type
+        self.client.storage.from_(bucket).upload(path, fileobj.read(), file_options=file_options)
+
+    def public_url(self, bucket: str, path: str) -> Optional[str]:
+        res = self.client.storage.from_(bucket).get_public_url(path)
+        # Clean public URL (no trailing '?')
+        return (_as_public_url(res) or "").rstrip("?") or None
+
+    def signed_url(self, bucket: str, path: str, expires_seconds: int) -> Optional[str]:
+        res = self.client.storage.from_(bucket).create_signed_url(path, expires_seconds)
+        return _as_signed_url(res)
+
+    def signed_urls(self, bucket: str, paths: List[str], expires_seconds: int) -> Dict[str, Optional[str]]:
+        # Una sola chiamata Storage per tutti i path
+        res = self.client.storage.from_(bucket).create_signed_urls(paths, expires_seconds)
+        items = res.get("data", res) if isinstance(res, dict) else res
+        urls: Dict[str, Optional[str]] = {path: None for path in paths}
+        for item in items or []:
+            if isinstance(item, dict) and item.get("path") in urls and not item.get("error"):
+                urls[item["path"]] = _as_signed_url(item)
+        return urls
+
+    def remove(self, bucket: str, paths: List[str]) -> None:
+        self.client.storage.from_(bucket).remove(paths)
+
+
+# --- DB Manager --------------------------------------------------------------
+class DatabaseManager:
+    """
+    Facade unica usata da UI, API ed Excel I/O.
+
+    Il backend è scelto da `settings.DB_BACKEND`; passare `db_path` forza il
+    backend SQLite su quel file (utile per test e installazioni locali).
+    Con "replica" si legge e scrive sul file locale e `start_sync()` avvia il
+    thread che lo allinea a Supabase (vedi replica.py); gli allegati vanno
+    comunque sullo Storage remoto.
+
+    Backend e storage sono avvolti in `metrics.Instrumented`: `backend.wrapped`
+    è l'oggetto originale. Sono creati al primo accesso (client Supabase
+    compreso), così l'istanza globale non rallenta l'import di db.
+
+    Con la cache attiva (`settings.CACHE_ENABLED` o `cache=True`) liste, pagine,
+    totali e letture per id passano da una cache LRU con TTL che ogni scrittura
+    invalida; `cache_info()` espone hit e miss.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None, *, cache: Optional[bool] = None):
+        self._db_path = db_path
+        self._backend = None
+        self._storage = None
+        self._sync_worker: Optional[SyncWorker] = None
+        self._connect_lock = threading.Lock()
+
+        use_cache = settings.CACHE_ENABLED if cache is None else cache
+        self.cache: Optional[QueryCache] = (
+            QueryCache(maxsize=settings.CACHE_MAX_ENTRIES, ttl=settings.CACHE_TTL_S) if use_cache else None
+        )
+        self.signed_urls = SignedUrlCache(margin=settings.SIGNED_URL_REFRESH_MARGIN_S)
+        self._mese: Optional[str] = None  # mese di riferimento di mensilita_pagata già verificato
+
+    # --- Backend -------------------------------------------------------------
+    def _connect(self) -> None:
+        """Backend, storage e worker di replica sono creati al primo uso, non all'import."""
+        with self._connect_lock:
+            if self._backend is not None:
+                return
+            if self._db_path is not None or settings.DB_BACKEND == "sqlite":
+                backend = SQLiteBackend(self._db_path or settings.DB_PATH)
+                storage = LocalStorage(settings.DATA_DIR)
+            elif settings.DB_BACKEND == "replica":
+                backend = ReplicaBackend(settings.DB_PATH)
+                storage = SupabaseStorage(get_supabase())
+            else:
+                backend = SupabaseBackend(get_supabase())
+                storage = SupabaseStorage(get_supabase())
+            if isinstance(backend, ReplicaBackend):
+                self._sync_worker = SyncWorker(
+                    backend, Instrumented(SupabaseBackend(get_supabase()), "remote"), on_change=self._invalidate
+                )
+            # Durata, righe ed errori di ogni chiamata finiscono in /metrics (vedi metrics.py)
+            self._storage = Instrumented(storage, "storage")
+            self._backend = Instrumented(backend, "backend")
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._connect()
+        return self._backend
+
+    @property
+    def storage(self):
+        if self._backend is None:
+            self._connect()
+        return self._storage
+
+    @storage.setter
+    def storage(self, storage) -> None:
+        self._connect()
+        self._storage = storage
+
+    @property
+    def sync_worker(self) -> Optional[SyncWorker]:
+        if self._backend is None:
+            self._connect()
+        return self._sync_worker
+
+    # --- Cache ---------------------------------------------------------------
+    @staticmethod
+    def _filters_key(filters: Optional[Dict]) -> tuple:
+        # Filtri spenti (None/False/"") equivalgono a filtri assenti
+        return tuple(sorted(
+            (k, v) for k, v in (filters or {}).items() if v is not None and v is not False and v != ""
+        ))
+
+    def _cached(self, key: tuple, loader, *, cache: bool = True):
+        """`cache=False` per letture in blocco (export, sync, batch): non occupano la cache."""
+        self._ensure_month()
+        if self.cache is None or not cache:
+            return loader()
+        return self.cache.get_or_load(key, loader)
+
+    def _invalidate(self, prop_id: Optional[int] = None) -> None:
+        """Dopo una scrittura: liste, pagine e totali decadono; delle letture per id
+        decade solo `prop_id` (tutte se None)."""
+        if self.cache is None:
+            return
+        if prop_id is None:
+            self.cache.invalidate()
+        else:
+            self.cache.invalidate(keep=lambda k: k[0] == "id" and k[1] != prop_id)
+
+    def cache_info(self) -> Dict[str, Any]:
+        return self.cache.info() if self.cache else {"hits": 0, "misses": 0, "size": 0, "enabled": False}
+
+    def _ensure_month(self) -> None:
+        """Al primo accesso di un nuovo mese mensilita_pagata riparte dal registro pagamenti."""
+        mese = mese_corrente()
+        if mese != self._mese:
+            if self.backend.refresh_mensilita(mese):
+                self._invalidate()
+            self._mese = mese
+
+    # --- Replica locale --------------------------------------------------------
+    def start_sync(self) -> None:
+        """Avvia la sincronizzazione in background (solo con DB_BACKEND="replica")."""
+        if self._db_path is None and settings.DB_BACKEND == "replica":
+            self.sync_worker.start()
+
+    def sync_status(self) -> Optional[Dict[str, Any]]:
+        return self._sync_worker.info() if self._sync_worker is not None else None
+
+    def _init_database(self) -> None:
+        self.backend.init_schema()
+
+    def seed_demo_data(self) -> int:
+        """Inserisce gli immobili demo se il database è vuoto. Ritorna quanti ne ha creati."""
+        if self.get_all_proprieta():
+            return 0
+        for data in DEMO_PROPRIETA:
+            self.create_proprieta(dict(data))
+        return len(DEMO_PROPRIETA)
+
+    @staticmethod
+    def _normalize(data: Dict[str, Any]) -> Dict[str, Any]:
         if "mensilita_pagata" in data and isinstance(data["mensilita_pagata"], int):
             data["mensilita_pagata"] = bool(data["mensilita_pagata"])
-        resp = self.table.update(data).eq("id", prop_id).execute()
-        return bool(resp.data)
+        return data
+
+    # CRUD
+    def create_proprieta(self, data: Dict[str, Any], *, returning: bool = False):
+        """
+        Inserisce una proprietà e ritorna il suo id, oppure con `returning=True`
+        la riga scritta (id, default e timestamp compresi) senza rileggerla.
+        """
+        row = self.backend.insert(self._normalize(data))
+        prop_id = row["id"] if row else None
+        self._invalidate(prop_id)
+        return row if returning else prop_id
+
+    def create_proprieta_bulk(
+        self,
+        rows: List[Dict[str, Any]],
+        *,
+        batch_size: Optional[int] = None,
+    ) -> Tuple[List[Optional[int]], Dict[int, str]]:
+        """
+        Inserisce `rows` a blocchi di `batch_size` con un'unica scrittura per blocco.
+
+        Ritorna (ids, errori): `ids[i]` è None per le righe rifiutate, `errori`
+        mappa l'indice della riga al messaggio. Se un blocco fallisce viene
+        ritentato riga per riga, così una riga non valida non blocca le altre.
+        """
+        batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+        ids: List[Optional[int]] = [None] * len(rows)
+        errors: Dict[int, str] = {}
+        try:
+            for start in range(0, len(rows), batch_size):
+                batch = [self._normalize(dict(r)) for r in rows[start:start + batch_size]]
+                try:
+                    ids[start:start + len(batch)] = self.backend.insert_many(batch)
+                except Exception:
+                    for i, data in enumerate(batch, start):
+                        try:
+                            ids[i] = self.backend.insert(data)["id"]
+                        except Exception as e:
+                            errors[i] = str(e)
+        finally:
+            self._invalidate()
+        return ids, errors
+
+    def get_all_proprieta(
+        self,
+        filters: Optional[Dict] = None,
+        *,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> List[Dict[str, Any]]:
+        """Proprietà filtrate e ordinate; `limit`/`offset` sono applicati dal backend."""
+        return self._cached(
+            ("list", self._filters_key(filters), limit, offset),
+            lambda: self.backend.select(filters, limit=limit, offset=offset),
+        )
+
+    def get_proprieta_page(
+        self,
+        filters: Optional[Dict] = None,
+        *,
+        limit: int = 100,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+        cache: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Una pagina di proprietà: {"items": [...], "next_cursor": str | None}.
+
+        Con `cursor` la pagina riparte dopo l'ultima riga vista (keyset su
+        (order_key, id)) e `offset` viene ignorato; senza cursore si usa l'offset.
+        Chi scorre tutte le pagine (export) passa `cache=False`.
+        """
+        f, key, select_kwargs = self._page_query(filters, limit, offset, cursor)
+        rows = self._cached(key, lambda: self.backend.select(f, **select_kwargs), cache=cache)
+        return self._page_result(f, rows, limit)
+
+    def _page_query(self, filters, limit: int, offset: int, cursor: Optional[str]):
+        """(filtri, chiave di cache, argomenti di select) per una pagina; +1 riga per sapere se ce n'è un'altra."""
+        f = filters or {}
+        after = decode_cursor(cursor, f.get("order_by")) if cursor else None
+        offset = 0 if after else offset
+        key = ("page", self._filters_key(f), limit, offset, after)
+        return f, key, {"limit": limit + 1, "offset": offset, "after": after}
+
+    @staticmethod
+    def _page_result(f: Dict[str, Any], rows: List[Dict[str, Any]], limit: int) -> Dict[str, Any]:
+        items = rows[:limit]
+        next_cursor = encode_cursor(f.get("order_by"), items[-1]) if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    def search_proprieta(
+        self,
+        q: str,
+        filters: Optional[Dict] = None,
+        *,
+        limit: int = 50,
+    ) -> List[Dict[str, Any]]:
+        """
+        Ricerca indicizzata su nome, indirizzo e dati catastali, ordinata per
+        rilevanza. Ogni parola vale come prefisso e gli accenti sono ignorati
+        ("citta gar" trova "Via della Città, Garibaldi").
+        """
+        return self._cached(
+            ("search", q.strip().lower(), self._filters_key(filters), limit),
+            lambda: self.backend.search(q, filters, limit),
+        )
+
+    def get_scadenze(
+        self,
+        dal: Optional[date] = None,
+        al: Optional[date] = None,
+        *,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Contratti con contratto_fine fra `dal` e `al` (inclusi), in ordine di
+        scadenza. Default: da oggi ai prossimi SCADENZA_WARNING_GIORNI giorni.
+        Stesso formato di `get_proprieta_page`.
+        """
+        return self.get_proprieta_page(self._scadenze_filters(dal, al), limit=limit, cursor=cursor)
+
+    @staticmethod
+    def _scadenze_filters(dal: Optional[date], al: Optional[date]) -> Dict[str, Any]:
+        dal = dal or date.today()
+        al = al or dal + timedelta(days=settings.SCADENZA_WARNING_GIORNI - 1)
+        return {"order_by": "contratto_fine ASC", "scadenza_dal": dal, "scadenza_al": al}
+
+    def get_portafoglio(self, filters: Optional[Dict] = None, q: str = "", *, limit: int = 100) -> Portafoglio:
+        """
+        Proprietà filtrate (o cercate con `q`, al massimo `limit`) con date già
+        convertite, stato e indice delle scadenze (vedi scadenze.py). Resta in
+        cache come le letture da cui nasce: l'oggetto è condiviso, in sola lettura.
+        """
+        oggi = date.today()
+        q = q.strip()
+
+        def load() -> Portafoglio:
+            rows = self.search_proprieta(q, filters, limit=limit) if q else self.get_all_proprieta(filters)
+            return Portafoglio(rows, oggi, settings.SCADENZA_WARNING_GIORNI)
+
+        key = ("portafoglio", q.lower(), self._filters_key(filters), limit if q else None, oggi)
+        return self._cached(key, load)
+
+    def get_proprieta_batch(self, filters: Optional[Dict] = None) -> "records.ProprietaBatch":
+        """
+        Proprietà filtrate a colonne (vedi records.py): una frazione della
+        memoria della lista di dict e `to_frame()` senza copie per pandas.
+        Lettura in blocco: sempre dal backend, senza passare dalla cache.
+        """
+        return self._cached(
+            ("batch", self._filters_key(filters)),
+            lambda: records.ProprietaBatch.from_rows(self.backend.select(filters)),
+            cache=False,
+        )
+
+    def get_proprieta_records(self, filters: Optional[Dict] = None) -> List["records.Proprieta"]:
+        """Proprietà filtrate come record `Proprieta` tipizzati (con `__slots__`)."""
+        return self.get_proprieta_batch(filters).records()
+
+    def get_proprieta_by_id(self, prop_id: int) -> Optional[Dict[str, Any]]:
+        return self._cached(("id", prop_id), lambda: self.backend.get(prop_id))
+
+    def get_changes(self, since: datetime) -> Dict[str, Any]:
+        """
+        Sincronizzazione incrementale: {"changed": righe con updated_at >= since,
+        "deleted": id eliminati da allora, "sync_token": da ripassare come `since`}.
+        `since` senza fuso orario è inteso UTC. Il confronto è >=: a cavallo del
+        token una riga può tornare due volte, ma non va mai persa.
+        """
+        since, token = changes_window(since, settings.SYNC_CLOCK_MARGIN_S)
+        changed, deleted = self.backend.changes_since(since)
+        return changes_result(since, token, changed, deleted)
+
+    def update_proprieta(self, prop_id: int, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Aggiorna e ritorna la riga scritta in un solo round trip; None se `prop_id` non esiste."""
+        try:
+            return self.backend.update(prop_id, self._normalize(data))
+        finally:
+            self._invalidate(prop_id)
 
     def delete_proprieta(self, prop_id: int) -> bool:
-        resp = self.table.delete().eq("id", prop_id).execute()
-        return bool(resp.data)
+        try:
+            return self.backend.delete(prop_id)
+        finally:
+            self._invalidate(prop_id)
+
+    def update_proprieta_bulk(
+        self,
+        rows: List[Dict[str, Any]],
+        *,
+        batch_size: Optional[int] = None,
+    ) -> Tuple[int, Dict[int, str]]:
+        """
+        Aggiorna righe che contengono ciascuna il proprio 'id', una scrittura per blocco.
+        Ritorna (righe aggiornate, {indice riga: errore}) con lo stesso ripiego
+        riga per riga di `create_proprieta_bulk`; gli id inesistenti sono errori.
+        """
+        batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+        updated = 0
+        errors: Dict[int, str] = {}
+        try:
+            for start in range(0, len(rows), batch_size):
+                batch = [self._normalize(dict(r)) for r in rows[start:start + batch_size]]
+                try:
+                    done = self.backend.update_many(batch)
+                except Exception:
+                    done = []
+                    for i, data in enumerate(batch, start):
+                        try:
+                            done += self.backend.update_many([data])
+                        except Exception as e:
+                            errors[i] = str(e)
+                found = set(done)
+                for i, data in enumerate(batch, start):
+                    if i not in errors and data.get("id") not in found:
+                        errors[i] = "Proprietà non trovata"
+                updated += len(done)
+        finally:
+            self._invalidate()
+        return updated, errors
+
+    def set_mensilita_pagata(self, ids: Optional[List[int]] = None, pagata: bool = True) -> List[int]:
+        """
+        Segna pagata (o da pagare) la mensilità degli affitti attivi: quelli in
+        `ids`, oppure tutti con `ids=None`. Un'unica scrittura set-based; ritorna
+        gli id che hanno cambiato stato. Il flag è la vista del mese corrente sul
+        registro pagamenti: segnarlo registra il canone intero del mese, toglierlo
+        annulla i versamenti del mese (trigger in schema.sql).
+        """
+        if ids is not None and not ids:
+            return []
+        self._ensure_month()
+        try:
+            return self.backend.set_mensilita_pagata(None if ids is None else list(ids), pagata)
+        finally:
+            self._invalidate()
+
+    def delete_proprieta_bulk(self, ids: List[int]) -> int:
+        if not ids:
+            return 0
+        try:
+            return self.backend.delete_many(list(ids))
+        finally:
+            self._invalidate()
+
+    def get_stats(self, giorni_scadenza: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Totali di portafoglio calcolati dal backend, senza scaricare le proprietà.
+
+        Chiavi: totale_immobili, affitti_attivi, non_pagati, in_scadenza
+        (contratto_fine entro `giorni_scadenza`, scaduti inclusi), entrate_mensili,
+        valore_patrimonio.
+        """
+        if giorni_scadenza is None:
+            giorni_scadenza = settings.SCADENZA_WARNING_GIORNI
+        stats = self._cached(("stats", giorni_scadenza), lambda: self.backend.stats(giorni_scadenza))
+        return self._stats_result(stats)
+
+    @staticmethod
+    def _stats_result(stats: Dict[str, Any]) -> Dict[str, Any]:
+        for key in ("totale_immobili", "affitti_attivi", "non_pagati", "in_scadenza"):
+            stats[key] = int(stats.get(key) or 0)
+        for key in ("entrate_mensili", "valore_patrimonio"):
+            stats[key] = round(float(stats.get(key) or 0), 2)
+        return stats
+
+    def get_analytics(self) -> Dict[str, Any]:
+        """
+        Rendimenti, valori al m², sfitto e concentrazione del valore, in totale e
+        per categoria, zona censuaria e classe (vedi analytics.py). Il portafoglio
+        è letto una volta con le sole colonne necessarie; il report resta in
+        cache fino alla prossima scrittura.
+        """
+        return self._cached(("analytics",), lambda: analytics.analizza(self.backend.select_columns(analytics.COLUMNS)))
+
+    def get_proiezione(self, mesi: int = 12, dal: Optional[date] = None) -> "cashflow.Proiezione":
+        """Matrice contratti × mesi dei canoni attesi dal mese di `dal` (default oggi), in cache fino alla prossima scrittura."""
+        dal = dal or date.today()
+        return self._cached(
+            ("proiezione", mese_corrente(dal), mesi),
+            lambda: cashflow.proietta(self.backend.select_columns(cashflow.COLUMNS), dal, mesi),
+        )
+
+    def get_arretrati(self) -> Dict[str, float]:
+        """Insoluti di oggi per inquilino."""
+        return {r["inquilino"]: float(r["importo"] or 0) for r in self.get_morosita()}
+
+    def get_cashflow(self, mesi: int = 12, dal: Optional[date] = None, *, inquilini: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Canoni attesi per i prossimi `mesi` mesi (1-60) dai periodi dei
+        contratti, con lo sfitto dopo ogni scadenza: totali per mese, per
+        inquilino e per categoria, più gli arretrati di oggi (vedi cashflow.py).
+        """
+        return cashflow.report(self.get_proiezione(mesi, dal), self.get_arretrati(), inquilini)
+
+    # --- Registro pagamenti ----------------------------------------------------
+    @staticmethod
+    def _normalize_pagamento(data: Dict[str, Any]) -> Dict[str, Any]:
+        mese = data.get("mese")
+        if isinstance(mese, date):
+            mese = mese.strftime("%Y-%m")
+        if not isinstance(mese, str) or not re.fullmatch(r"\d{4}-(0[1-9]|1[0-2])", mese):
+            raise ValueError(f"Mese di competenza non valido (atteso AAAA-MM): {mese}")
+        importo = float(data.get("importo") or 0)
+        if importo < 0:
+            raise ValueError("L'importo non può essere negativo")
+        return {
+            "proprieta_id": int(data["proprieta_id"]),
+            "mese": mese,
+            "importo": importo,
+            "pagato_il": data.get("pagato_il") or date.today(),
+        }
+
+    def create_pagamenti(
+        self,
+        rows: List[Dict[str, Any]],
+        *,
+        batch_size: Optional[int] = None,
+    ) -> Tuple[List[Optional[int]], Dict[int, str]]:
+        """
+        Registra versamenti {proprieta_id, mese, importo, pagato_il} a blocchi,
+        con lo stesso ritorno e lo stesso ripiego riga per riga di
+        `create_proprieta_bulk`. Un versamento sul mese corrente segna la
+        mensilità pagata.
+        """
+        batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+        ids: List[Optional[int]] = [None] * len(rows)
+        errors: Dict[int, str] = {}
+        valid: List[Tuple[int, Dict[str, Any]]] = []
+        for i, data in enumerate(rows):
+            try:
+                valid.append((i, self._normalize_pagamento(data)))
+            except (KeyError, TypeError, ValueError) as e:
+                errors[i] = f"Campo mancante: {e}" if isinstance(e, KeyError) else str(e)
+        self._ensure_month()
+        try:
+            for start in range(0, len(valid), batch_size):
+                batch = valid[start:start + batch_size]
+                try:
+                    for (i, _), new_id in zip(batch, self.backend.insert_pagamenti([d for _, d in batch])):
+                        ids[i] = new_id
+                except Exception:
+                    for i, data in batch:
+                        try:
+                            ids[i] = self.backend.insert_pagamenti([data])[0]
+                        except Exception as e:
+                            errors[i] = str(e)
+        finally:
+            self._invalidate()
+        return ids, errors
+
+    def get_pagamenti(self, prop_id: int) -> List[Dict[str, Any]]:
+        """Versamenti di una proprietà, dal mese più recente."""
+        return self._cached(("pagamenti", prop_id), lambda: self.backend.pagamenti(prop_id))
+
+    def get_morosita(self, oggi: Optional[date] = None) -> List[Dict[str, Any]]:
+        """
+        Insoluti per inquilino calcolati dal backend con una query aggregata:
+        {inquilino, immobili, mensilita, importo, dal (mese più vecchio), giorni
+        (ritardo massimo)}. Sono dovuti i mesi dall'inizio del contratto (o da
+        `settings.PAGAMENTI_DAL`) all'ultimo con scadenza già passata.
+        """
+        params = morosita_params(oggi or date.today(), settings.PAGAMENTI_DAL, settings.GIORNO_SCADENZA_AFFITTO)
+        return self._cached(("morosita", params["oggi"]), lambda: self.backend.morosita(params))
+
+    def get_aging(self, oggi: Optional[date] = None) -> Dict[str, Any]:
+        """Insoluti di portafoglio per fascia di ritardo (0-30, 30-60, oltre 60 giorni)."""
+        oggi = oggi or date.today()
+        params = morosita_params(oggi, settings.PAGAMENTI_DAL, settings.GIORNO_SCADENZA_AFFITTO)
+        rows = self._cached(("aging", params["oggi"]), lambda: self.backend.aging(params))
+        return aging_result(rows, oggi)
 
     # --- PIANTINE (images) ---------------------------------------------------
     def upload_piantina_and_link(
@@ -113,60 +892,155 @@ class DatabaseManager:
         make_public_url: bool = True,
     ) -> Dict[str, Any]:
         """
-        Upload image to 'piantine/<prop_id>/<filename>' and update DB with URL+path.
+        Validate/re-encode image, upload to 'piantine/<prop_id>/' and update DB with URL+path.
         """
         filename = filename or pathlib.Path(local_file_path).name
-        safe_name = _safe_filename(filename)
-        remote_path = f"{prop_id}/{safe_name}"
-
-        # Upload (avoid options with bools)
         with open(local_file_path, "rb") as f:
-            supabase.storage.from_(PIANTINE_BUCKET).upload(remote_path, f)
+            data = f.read()
+        return self.link_piantina(prop_id, images.process_piantina(data, filename), make_public_url=make_public_url)
 
-        public_url = None
+    def link_piantina(
+        self,
+        prop_id: int,
+        image: "images.PiantinaWebp",
+        *,
+        make_public_url: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Upload an already processed image ('<stem>.webp' + '<stem>_thumb.webp')
+        to 'piantine/<prop_id>/' and store paths and URLs of both.
+        """
+        payload = self.store_piantina(prop_id, image, make_public_url=make_public_url)
+        self.update_proprieta(prop_id, payload)
+        return {
+            "path": payload[IMG_PATH_COL],
+            "public_url": payload[IMG_URL_COL],
+            "thumb_path": payload[THUMB_PATH_COL],
+            "thumb_url": payload[THUMB_URL_COL],
+        }
+
+    def store_piantina(
+        self,
+        prop_id: int,
+        image: "images.PiantinaWebp",
+        *,
+        make_public_url: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Upload only: return the column payload to write on the row, so bulk
+        uploads can link many properties with a single update.
+        """
+        safe_stem = _safe_filename(image.stem)
+        remote_path = f"{prop_id}/{safe_stem}.webp"
+        thumb_path = f"{prop_id}/{safe_stem}_thumb.webp"
+
+        self.storage.upload(PIANTINE_BUCKET, remote_path, io.BytesIO(image.display), content_type="image/webp")
+        self.storage.upload(PIANTINE_BUCKET, thumb_path, io.BytesIO(image.thumb), content_type="image/webp")
+
+        public_url = thumb_url = None
         if make_public_url:
-            res = supabase.storage.from_(PIANTINE_BUCKET).get_public_url(remote_path)
-            public_url = _as_public_url(res)
+            public_url = self.storage.public_url(PIANTINE_BUCKET, remote_path)
+            thumb_url = self.storage.public_url(PIANTINE_BUCKET, thumb_path)
 
-        payload: Dict[str, Any] = {}
-        if IMG_URL_COL:
-            payload[IMG_URL_COL] = public_url or None
-        if IMG_PATH_COL:
-            payload[IMG_PATH_COL] = remote_path
+        return {
+            IMG_URL_COL: public_url or None,
+            IMG_PATH_COL: remote_path,
+            THUMB_URL_COL: thumb_url or None,
+            THUMB_PATH_COL: thumb_path,
+            IMG_HASH_COL: image.sha256,
+        }
 
-        if payload:
-            self.update_proprieta(prop_id, payload)
+    # --- URL firmati ----------------------------------------------------------
+    def get_signed_url(self, bucket: str, path: str, expires_seconds: int = 3600) -> Optional[str]:
+        """URL firmato per bucket+path, riusato finché copre ancora `expires_seconds` (meno il margine)."""
+        url = self.signed_urls.get(bucket, path, expires_seconds)
+        if url is None:
+            url = self.storage.signed_url(bucket, path, expires_seconds)
+            if url:
+                self.signed_urls.put(bucket, path, url, expires_seconds)
+        return url
 
-        return {"path": remote_path, "public_url": public_url}
+    def get_signed_urls(
+        self,
+        bucket: str,
+        paths: List[str],
+        expires_seconds: int = 3600,
+    ) -> Dict[str, Optional[str]]:
+        """
+        URL firmati per molti path: quelli in cache sono riusati, gli altri
+        firmati con una sola chiamata Storage (per liste e gallerie).
+        """
+        urls: Dict[str, Optional[str]] = {}
+        missing: List[str] = []
+        for path in dict.fromkeys(p for p in paths if p):
+            url = self.signed_urls.get(bucket, path, expires_seconds)
+            if url is None:
+                missing.append(path)
+            urls[path] = url
+        if missing:
+            for path, url in self.storage.signed_urls(bucket, missing, expires_seconds).items():
+                urls[path] = url
+                if url:
+                    self.signed_urls.put(bucket, path, url, expires_seconds)
+        return urls
 
-    def get_signed_piantina_url(self, prop_id: int, expires_seconds: int = 3600) -> Optional[str]:
+    def get_signed_piantine_urls(
+        self,
+        proprieta: List[Dict[str, Any]],
+        expires_seconds: int = 3600,
+    ) -> Dict[int, Optional[str]]:
+        """
+        {id proprietà: URL firmato della piantina} per una pagina di proprietà già
+        caricate; usa la miniatura quando c'è, così gli elenchi scaricano pochi KB.
+        """
+        paths = {p["id"]: p.get(THUMB_PATH_COL) or p.get(IMG_PATH_COL) for p in proprieta}
+        urls = self.get_signed_urls(PIANTINE_BUCKET, list(paths.values()), expires_seconds)
+        return {prop_id: urls.get(path) for prop_id, path in paths.items() if path}
+
+    def get_signed_piantina_url(
+        self,
+        prop_id: int,
+        expires_seconds: int = 3600,
+        *,
+        path: Optional[str] = None,
+    ) -> Optional[str]:
         """
         Return signed URL for a private image if path is stored.
+        Pass `path` when the row is already loaded to skip the lookup.
         """
-        rec = self.get_proprieta_by_id(prop_id)
-        if not rec:
-            return None
-        path = rec.get(IMG_PATH_COL) or ""
+        if path is None:
+            rec = self.get_proprieta_by_id(prop_id)
+            if not rec:
+                return None
+            path = rec.get(IMG_PATH_COL) or ""
         if not path:
             return None
 
-        res = supabase.storage.from_(PIANTINE_BUCKET).create_signed_url(path, expires_seconds)
-        return _as_signed_url(res)
+        return self.get_signed_url(PIANTINE_BUCKET, path, expires_seconds)
 
     def remove_piantina(self, prop_id: int) -> bool:
         rec = self.get_proprieta_by_id(prop_id)
         if not rec:
             return False
-        path = rec.get(IMG_PATH_COL)
-        if path:
-            supabase.storage.from_(PIANTINE_BUCKET).remove([path])
+        paths = [p for p in (rec.get(IMG_PATH_COL), rec.get(THUMB_PATH_COL)) if p]
+        if paths:
+            self.storage.remove(PIANTINE_BUCKET, paths)
+            for path in paths:
+                self.signed_urls.discard(PIANTINE_BUCKET, path)
 
         payload = {}
         if IMG_URL_COL:
             payload[IMG_URL_COL] = None
         if IMG_PATH_COL:
             payload[IMG_PATH_COL] = None
-        return self.update_proprieta(prop_id, payload)
+        if THUMB_URL_COL:
+            payload[THUMB_URL_COL] = None
+        if THUMB_PATH_COL:
+            payload[THUMB_PATH_COL] = None
+        if IMG_HASH_COL:
+            # Senza hash il prossimo caricamento dello stesso file non viene saltato come "già caricato"
+            payload[IMG_HASH_COL] = None
+        return self.update_proprieta(prop_id, payload) is not None
 
     # --- CONTRATTI (PDFs) ----------------------------------------------------
     def upload_contratto_and_link(
@@ -178,48 +1052,84 @@ class DatabaseManager:
         make_public_url: bool = True,
     ) -> Dict[str, Any]:
         filename = filename or pathlib.Path(local_file_path).name
+        with open(local_file_path, "rb") as f:
+            data = f.read()
+
+        payload = self.store_contratto(prop_id, data, filename, make_public_url=make_public_url)
+        self.update_proprieta(prop_id, payload)
+        return {"path": payload[CONTRACT_PATH_COL], "public_url": payload[CONTRACT_URL_COL]}
+
+    def store_contratto(
+        self,
+        prop_id: int,
+        data: bytes,
+        filename: str,
+        *,
+        make_public_url: bool = True,
+    ) -> Dict[str, Any]:
+        """Upload only, like `store_piantina`: return the column payload."""
         safe_name = _safe_filename(filename)
         remote_path = f"{prop_id}/{safe_name}"
 
         # Upload with correct content type from the start
-        with open(local_file_path, "rb") as f:
-            supabase.storage.from_(CONTRACT_BUCKET).upload(
-                remote_path,
-                f,
-                file_options={
-                    "contentType": "application/pdf",
-                    "content-type": "application/pdf",
-                }
-            )
-
-        # Save a clean public URL (no trailing '?')
+        self.storage.upload(CONTRACT_BUCKET, remote_path, io.BytesIO(data), content_type="application/pdf")
+
         public_url = None
         if make_public_url:
-            public_url = f"{SUPABASE_URL}/storage/v1/object/public/{CONTRACT_BUCKET}/{remote_path}"
-
-        self.update_proprieta(
-            prop_id,
-            {
-                CONTRACT_PATH_COL: remote_path,
-                CONTRACT_URL_COL: public_url,
-            },
-        )
-        return {"path": remote_path, "public_url": public_url}
+            public_url = self.storage.public_url(CONTRACT_BUCKET, remote_path)
 
+        return {
+            CONTRACT_PATH_COL: remote_path,
+            CONTRACT_URL_COL: public_url,
+            CONTRACT_HASH_COL: hashlib.sha256(data).hexdigest(),
+        }
 
-    def get_signed_contratto_url(self, prop_id: int, expires_seconds: int = 3600) -> Optional[str]:
+
+    def get_signed_contratto_url(
+        self,
+        prop_id: int,
+        expires_seconds: int = 3600,
+        *,
+        path: Optional[str] = None,
+    ) -> Optional[str]:
         """
         Return signed URL for a private contract if path is stored.
+        Pass `path` when the row is already loaded to skip the lookup.
         """
-        rec = self.get_proprieta_by_id(prop_id)
-        if not rec:
-            return None
-        path = rec.get(CONTRACT_PATH_COL)
+        if path is None:
+            rec = self.get_proprieta_by_id(prop_id)
+            if not rec:
+                return None
+            path = rec.get(CONTRACT_PATH_COL)
         if not path:
             return None
 
-        res = supabase.storage.from_(CONTRACT_BUCKET).create_signed_url(path, expires_seconds)
-        return _as_signed_url(res)
+        return self.get_signed_url(CONTRACT_BUCKET, path, expires_seconds)
+
+
+# Dati demo (stessi di tests/generate_demo_excel.py), usati da setup.bat
+DEMO_PROPRIETA: List[Dict[str, Any]] = [
+    {
+        "nome": "Appartamento Centro", "indirizzo": "Via Roma 15, Milano",
+        "mq_effettivi": 85.0, "mq_commerciali": 95.0, "valore_mq": 3500.0,
+        "affittato_a": "Mario Rossi", "affitto_mensile": 1200.0,
+        "contratto_inizio": "2023-01-01", "contratto_fine": "2025-12-31",
+        "mensilita_pagata": True,
+    },
+    {
+        "nome": "Villa Lago Como", "indirizzo": "Via Lungolago 8, Como",
+        "mq_effettivi": 250.0, "mq_commerciali": 280.0, "valore_mq": 5000.0,
+        "affittato_a": "Laura Bianchi", "affitto_mensile": 2500.0,
+        "contratto_inizio": "2024-06-01", "contratto_fine": "2026-05-31",
+        "mensilita_pagata": False,
+    },
+    {
+        "nome": "Monolocale Universitario", "indirizzo": "Via Festa del Perdono 3, Milano",
+        "mq_effettivi": 35.0, "mq_commerciali": 40.0, "valore_mq": 2800.0,
+        "affittato_a": None, "affitto_mensile": 0.0,
+        "mensilita_pagata": False,
+    },
+]
 
 
 # istanza globale
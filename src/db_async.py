@@ -0,0 +1,296 @@
+# src/db_async.py
+"""
+DatabaseManager async per l'API FastAPI.
+
+Con Supabase le query passano da un client PostgREST async con un pool httpx
+condiviso (keep-alive), così una richiesta in attesa del round trip non occupa
+un thread. Il backend SQLite locale resta sincrono e gira nel threadpool.
+Cache e normalizzazione sono quelle dell'istanza sincrona, che rimane la
+facciata per main.py ed excel_io.py.
+"""
+import asyncio
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import anyio
+
+try:
+    from . import settings
+    from .db import DatabaseManager, SupabaseBackend, SupabaseQueries, SUPABASE_URL, SUPABASE_KEY, analytics, cashflow
+    from .query import changes_window, changes_result, mese_corrente, morosita_params, morosita_row, aging_result
+    from .metrics import Instrumented, unwrap
+except ImportError:
+    import settings
+    from db import DatabaseManager, SupabaseBackend, SupabaseQueries, SUPABASE_URL, SUPABASE_KEY, analytics, cashflow
+    from query import changes_window, changes_result, mese_corrente, morosita_params, morosita_row, aging_result
+    from metrics import Instrumented, unwrap
+
+
+def _postgrest_client():
+    # Import qui: postgrest e httpx servono solo con Supabase, non all'avvio
+    import httpx
+    from postgrest import AsyncPostgrestClient
+
+    http = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_S,
+        ),
+        timeout=settings.HTTP_TIMEOUT_S,
+        follow_redirects=True,
+    )
+    headers = {
+        "Accept": "application/json",
+        "Content-Type": "application/json",
+        "apikey": SUPABASE_KEY,
+        "Authorization": f"Bearer {SUPABASE_KEY}",
+    }
+    return AsyncPostgrestClient(f"{SUPABASE_URL}/rest/v1", headers=headers, http_client=http)
+
+
+class AsyncSupabaseBackend(SupabaseQueries):
+    """Stesse query di `SupabaseBackend`, eseguite con `await`."""
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def insert(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return self._first(await self.table.insert(data).execute())
+
+    async def select(
+        self,
+        filters: Optional[Dict] = None,
+        *,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        after: Optional[Tuple[Any, int]] = None,
+    ) -> List[Dict[str, Any]]:
+        resp = await self._select_query(filters, limit=limit, offset=offset, after=after).execute()
+        return resp.data or []
+
+    async def select_columns(self, columns: List[str]) -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        page_size = settings.EXPORT_PAGE_SIZE
+        while True:
+            after_id = rows[-1]["id"] if rows else 0
+            page = (await self._columns_query(columns, after_id, page_size).execute()).data or []
+            rows += page
+            if len(page) < page_size:
+                return rows
+
+    async def search(self, q: str, filters: Optional[Dict] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        if not q.strip():
+            return []
+        resp = await self._search_query(q, filters, limit).execute()
+        return resp.data or []
+
+    async def stats(self, giorni_scadenza: int) -> Dict[str, Any]:
+        resp = await self._stats_query(giorni_scadenza).execute()
+        return dict(resp.data or {})
+
+    async def changes_since(self, since: datetime) -> Tuple[List[Dict[str, Any]], List[int]]:
+        # Le due letture sono indipendenti: in parallelo sullo stesso pool
+        rows_resp, deleted_resp = await asyncio.gather(
+            self._changes_query(since).execute(), self._tombstones_query(since).execute()
+        )
+        return rows_resp.data or [], [r["id"] for r in deleted_resp.data or []]
+
+    async def get(self, prop_id: int) -> Optional[Dict[str, Any]]:
+        return self._first(await self.table.select("*").eq("id", prop_id).limit(1).execute())
+
+    async def update(self, prop_id: int, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not data:
+            return await self.get(prop_id)
+        return self._first(await self.table.update(data).eq("id", prop_id).execute())
+
+    async def delete(self, prop_id: int) -> bool:
+        resp = await self.table.delete().eq("id", prop_id).execute()
+        return bool(resp.data)
+
+    async def pagamenti(self, prop_id: int) -> List[Dict[str, Any]]:
+        return (await self._pagamenti_query(prop_id).execute()).data or []
+
+    async def morosita(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [morosita_row(r) for r in (await self._morosita_query(params).execute()).data or []]
+
+    async def aging(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return (await self._aging_query(params).execute()).data or []
+
+
+class ThreadedBackend:
+    """Backend sincrono (SQLite locale) con le stesse coroutine, eseguito nel threadpool."""
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    def __getattr__(self, name: str):
+        method = getattr(self._backend, name)
+
+        async def call(*args, **kwargs):
+            return await anyio.to_thread.run_sync(lambda: method(*args, **kwargs))
+
+        return call
+
+    async def aclose(self) -> None:
+        # Le connessioni appartengono al backend sincrono condiviso
+        pass
+
+
+class AsyncDatabaseManager:
+    """
+    Letture e scritture di `DatabaseManager` in versione async (stesse chiavi
+    di cache, stessi formati di ritorno). Il client async è creato al primo uso,
+    dentro l'event loop che lo userà, e va chiuso con `aclose()`.
+    """
+
+    def __init__(self, sync: DatabaseManager):
+        self.sync = sync
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            if isinstance(unwrap(self.sync.backend), SupabaseBackend):
+                self._backend = Instrumented(AsyncSupabaseBackend(_postgrest_client()), "backend")
+            else:
+                # Le chiamate sono già misurate dal backend sincrono avvolto
+                self._backend = ThreadedBackend(self.sync.backend)
+        return self._backend
+
+    async def aclose(self) -> None:
+        if self._backend is not None:
+            await self._backend.aclose()
+            self._backend = None
+
+    async def _cached(self, key: tuple, loader):
+        if self.sync._mese != mese_corrente():
+            # Una volta al mese: ricalcolo di mensilita_pagata, nel threadpool
+            await anyio.to_thread.run_sync(self.sync._ensure_month)
+        if self.sync.cache is None:
+            return await loader()
+        return await self.sync.cache.aget_or_load(key, loader)
+
+    # Letture
+    async def get_all_proprieta(
+        self,
+        filters: Optional[Dict] = None,
+        *,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> List[Dict[str, Any]]:
+        return await self._cached(
+            ("list", self.sync._filters_key(filters), limit, offset),
+            lambda: self.backend.select(filters, limit=limit, offset=offset),
+        )
+
+    async def get_proprieta_page(
+        self,
+        filters: Optional[Dict] = None,
+        *,
+        limit: int = 100,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        f, key, select_kwargs = self.sync._page_query(filters, limit, offset, cursor)
+        rows = await self._cached(key, lambda: self.backend.select(f, **select_kwargs))
+        return self.sync._page_result(f, rows, limit)
+
+    async def search_proprieta(
+        self,
+        q: str,
+        filters: Optional[Dict] = None,
+        *,
+        limit: int = 50,
+    ) -> List[Dict[str, Any]]:
+        return await self._cached(
+            ("search", q.strip().lower(), self.sync._filters_key(filters), limit),
+            lambda: self.backend.search(q, filters, limit),
+        )
+
+    async def get_scadenze(
+        self,
+        dal: Optional[date] = None,
+        al: Optional[date] = None,
+        *,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        return await self.get_proprieta_page(self.sync._scadenze_filters(dal, al), limit=limit, cursor=cursor)
+
+    async def get_proprieta_by_id(self, prop_id: int) -> Optional[Dict[str, Any]]:
+        return await self._cached(("id", prop_id), lambda: self.backend.get(prop_id))
+
+    async def get_changes(self, since: datetime) -> Dict[str, Any]:
+        since, token = changes_window(since, settings.SYNC_CLOCK_MARGIN_S)
+        changed, deleted = await self.backend.changes_since(since)
+        return changes_result(since, token, changed, deleted)
+
+    async def get_stats(self, giorni_scadenza: Optional[int] = None) -> Dict[str, Any]:
+        if giorni_scadenza is None:
+            giorni_scadenza = settings.SCADENZA_WARNING_GIORNI
+        stats = await self._cached(("stats", giorni_scadenza), lambda: self.backend.stats(giorni_scadenza))
+        return self.sync._stats_result(stats)
+
+    async def get_analytics(self) -> Dict[str, Any]:
+        async def load():
+            return analytics.analizza(await self.backend.select_columns(analytics.COLUMNS))
+        return await self._cached(("analytics",), load)
+
+    async def get_cashflow(self, mesi: int = 12, dal: Optional[date] = None, *, inquilini: Optional[int] = None) -> Dict[str, Any]:
+        dal = dal or date.today()
+
+        async def load():
+            rows = await self.backend.select_columns(cashflow.COLUMNS)
+            # Matrice contratti × mesi: calcolo CPU fuori dall'event loop
+            return await anyio.to_thread.run_sync(lambda: cashflow.proietta(rows, dal, mesi))
+
+        proiezione = await self._cached(("proiezione", mese_corrente(dal), mesi), load)
+        arretrati = {r["inquilino"]: float(r["importo"] or 0) for r in await self.get_morosita()}
+        return await anyio.to_thread.run_sync(lambda: cashflow.report(proiezione, arretrati, inquilini))
+
+    # Scritture
+    async def create_proprieta(self, data: Dict[str, Any], *, returning: bool = False):
+        row = await self.backend.insert(self.sync._normalize(data))
+        prop_id = row["id"] if row else None
+        self.sync._invalidate(prop_id)
+        return row if returning else prop_id
+
+    async def update_proprieta(self, prop_id: int, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        try:
+            return await self.backend.update(prop_id, self.sync._normalize(data))
+        finally:
+            self.sync._invalidate(prop_id)
+
+    async def delete_proprieta(self, prop_id: int) -> bool:
+        try:
+            return await self.backend.delete(prop_id)
+        finally:
+            self.sync._invalidate(prop_id)
+
+    # Scritture massive: blocchi e ripiego riga per riga della facciata sincrona, nel threadpool
+    async def create_proprieta_bulk(self, rows: List[Dict[str, Any]], **kwargs) -> Tuple[List[Optional[int]], Dict[int, str]]:
+        return await anyio.to_thread.run_sync(lambda: self.sync.create_proprieta_bulk(rows, **kwargs))
+
+    async def update_proprieta_bulk(self, rows: List[Dict[str, Any]], **kwargs) -> Tuple[int, Dict[int, str]]:
+        return await anyio.to_thread.run_sync(lambda: self.sync.update_proprieta_bulk(rows, **kwargs))
+
+    async def set_mensilita_pagata(self, ids: Optional[List[int]] = None, pagata: bool = True) -> List[int]:
+        return await anyio.to_thread.run_sync(lambda: self.sync.set_mensilita_pagata(ids, pagata))
+
+    async def create_pagamenti(self, rows: List[Dict[str, Any]], **kwargs) -> Tuple[List[Optional[int]], Dict[int, str]]:
+        return await anyio.to_thread.run_sync(lambda: self.sync.create_pagamenti(rows, **kwargs))
+
+    # Registro pagamenti
+    async def get_pagamenti(self, prop_id: int) -> List[Dict[str, Any]]:
+        return await self._cached(("pagamenti", prop_id), lambda: self.backend.pagamenti(prop_id))
+
+    async def get_morosita(self, oggi: Optional[date] = None) -> List[Dict[str, Any]]:
+        params = morosita_params(oggi or date.today(), settings.PAGAMENTI_DAL, settings.GIORNO_SCADENZA_AFFITTO)
+        return await self._cached(("morosita", params["oggi"]), lambda: self.backend.morosita(params))
+
+    async def get_aging(self, oggi: Optional[date] = None) -> Dict[str, Any]:
+        oggi = oggi or date.today()
+        params = morosita_params(oggi, settings.PAGAMENTI_DAL, settings.GIORNO_SCADENZA_AFFITTO)
+        rows = await self._cached(("aging", params["oggi"]), lambda: self.backend.aging(params))
+        return aging_result(rows, oggi)
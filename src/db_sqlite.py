@@ -0,0 +1,528 @@
+# src/db_sqlite.py
+"""Backend SQLite locale (WAL + pool di connessioni) per installazioni single-office."""
+import queue
+import re
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+try:
+    from . import settings
+    from .query import parse_order_by, scadenza_range
+except ImportError:
+    import settings
+    from query import parse_order_by, scadenza_range
+
+TABLE = "proprieta"
+BOOL_COLUMNS = ("mensilita_pagata",)
+
+
+def _adapt(value: Any) -> Any:
+    """Converte i valori Python in tipi nativi SQLite (date ISO, bool 0/1)."""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    item = dict(row)
+    for col in BOOL_COLUMNS:
+        if col in item and item[col] is not None:
+            item[col] = bool(item[col])
+    return item
+
+
+class SQLiteBackend:
+    """
+    Accesso a `proprieta` su file SQLite.
+
+    Le connessioni sono aperte con `check_same_thread=False` e prestate da un pool
+    a un solo thread alla volta, quindi l'istanza è condivisibile fra i worker di
+    FastAPI. Gli statement hanno testo stabile per ogni combinazione di filtri, così
+    la statement cache di sqlite3 li riusa già preparati.
+    """
+
+    def __init__(self, db_path: Path, pool_size: int = settings.SQLITE_POOL_SIZE):
+        self.db_path = Path(db_path)
+        self.pool_size = max(1, pool_size)
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._initialized = False
+        self._columns: List[str] = []
+        self._held = threading.local()
+
+    # --- Connessioni ---------------------------------------------------------
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            str(self.db_path),
+            timeout=settings.SQLITE_BUSY_TIMEOUT_S,
+            check_same_thread=False,
+            cached_statements=settings.SQLITE_STATEMENT_CACHE,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.pool_size:
+                self._created += 1
+                try:
+                    conn = self._connect()
+                    if not self._initialized:
+                        self._init_schema(conn)
+                        self._initialized = True
+                    return conn
+                except Exception:
+                    self._created -= 1
+                    raise
+        return self._pool.get()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Presta una connessione del pool; commit a fine blocco, rollback su errore.
+        Dentro un blocco già aperto dallo stesso thread riusa quella connessione,
+        così più operazioni possono stare in un'unica transazione.
+        """
+        held = getattr(self._held, "conn", None)
+        if held is not None:
+            yield held
+            return
+        conn = self._acquire()
+        self._held.conn = conn
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._held.conn = None
+            self._pool.put(conn)
+
+    def close(self) -> None:
+        with self._lock:
+            while True:
+                try:
+                    self._pool.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._created = 0
+
+    # --- Schema --------------------------------------------------------------
+    def _init_schema(self, conn: sqlite3.Connection) -> None:
+        """Applica schema.sql e aggiunge le colonne mancanti ai DB creati con versioni precedenti."""
+        script = settings.SCHEMA_PATH.read_text(encoding="utf-8")
+        expected = sqlite3.connect(":memory:")
+        try:
+            expected.executescript(script)
+            wanted = expected.execute(f"PRAGMA table_info({TABLE})").fetchall()
+        finally:
+            expected.close()
+
+        # Le colonne mancanti vanno aggiunte prima dello script, che può creare
+        # indici anche sulle colonne nuove.
+        present = {r["name"] for r in conn.execute(f"PRAGMA table_info({TABLE})")}
+        had_fts = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'proprieta_fts'"
+        ).fetchone()
+        with conn:
+            if present:
+                for _cid, name, col_type, _notnull, default, _pk in wanted:
+                    if name not in present:
+                        ddl = f"ALTER TABLE {TABLE} ADD COLUMN {name} {col_type}"
+                        if default is not None and default.upper().startswith("CURRENT_"):
+                            # ALTER TABLE accetta solo default costanti: riempi le righe esistenti a mano
+                            conn.execute(ddl)
+                            conn.execute(f"UPDATE {TABLE} SET {name} = {default}")
+                            continue
+                        if default is not None:
+                            ddl += f" DEFAULT {default}"
+                        conn.execute(ddl)
+        conn.executescript(script)
+        if present and not had_fts:
+            # Indice full-text appena creato su un DB esistente: va popolato una volta
+            with conn:
+                conn.execute("INSERT INTO proprieta_fts(proprieta_fts) VALUES ('rebuild')")
+        self._columns = [r["name"] for r in conn.execute(f"PRAGMA table_info({TABLE})")]
+
+    def init_schema(self) -> None:
+        with self.connection():
+            pass
+
+    @property
+    def columns(self) -> List[str]:
+        if not self._columns:
+            self.init_schema()
+        return self._columns
+
+    def _check_columns(self, keys) -> None:
+        unknown = [k for k in keys if k not in self.columns]
+        if unknown:
+            raise ValueError(f"Colonne sconosciute per '{TABLE}': {', '.join(unknown)}")
+
+    def _order_clause(self, order_by: Optional[str]) -> str:
+        order_key, order_desc = parse_order_by(order_by)
+        self._check_columns([order_key])
+        # Allinea l'ordinamento dei NULL a PostgREST (ASC → NULLS LAST, DESC → NULLS FIRST)
+        if order_desc:
+            return f"ORDER BY {order_key} DESC NULLS FIRST, id DESC"
+        return f"ORDER BY {order_key} ASC NULLS LAST, id ASC"
+
+    @staticmethod
+    def _keyset_clause(order_by: Optional[str], after: Tuple[Any, int]) -> Tuple[str, List[Any]]:
+        """Condizione "righe successive a `after`" coerente con `_order_clause`."""
+        order_key, order_desc = parse_order_by(order_by)
+        value, last_id = after
+        if order_desc:
+            if value is None:
+                return f"(({order_key} IS NULL AND id < ?) OR {order_key} IS NOT NULL)", [last_id]
+            return f"({order_key} < ? OR ({order_key} = ? AND id < ?))", [value, value, last_id]
+        if value is None:
+            return f"({order_key} IS NULL AND id > ?)", [last_id]
+        return f"({order_key} > ? OR ({order_key} = ? AND id > ?) OR {order_key} IS NULL)", [value, value, last_id]
+
+    @staticmethod
+    def _where_clause(f: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        if f.get("solo_affitti"):
+            clauses.append("affittato_a IS NOT NULL")
+        if f.get("non_pagati"):
+            clauses.append("mensilita_pagata = 0 AND affittato_a IS NOT NULL")
+        # Intervallo su contratto_fine: range scan su idx_contratto_fine
+        dal, al = scadenza_range(f)
+        if dal:
+            clauses.append("contratto_fine >= ?")
+            params.append(dal)
+        if al:
+            clauses.append("contratto_fine <= ?")
+            params.append(al)
+        return clauses, params
+
+    # --- CRUD ----------------------------------------------------------------
+    def insert(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Inserisce e ritorna la riga scritta (RETURNING: nessuna rilettura)."""
+        self._check_columns(data)
+        cols = ", ".join(data)
+        marks = ", ".join("?" for _ in data)
+        with self.connection() as conn:
+            row = conn.execute(
+                f"INSERT INTO {TABLE} ({cols}) VALUES ({marks}) RETURNING *",
+                [_adapt(v) for v in data.values()],
+            ).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def insert_many(self, rows: List[Dict[str, Any]]) -> List[Optional[int]]:
+        """Inserisce tutte le righe in un'unica transazione (tutto o niente)."""
+        for data in rows:
+            self._check_columns(data)
+        ids: List[Optional[int]] = []
+        with self.connection() as conn:
+            for data in rows:
+                # Testo SQL stabile per lo stesso set di colonne → statement già preparato
+                cols = ", ".join(data)
+                marks = ", ".join("?" for _ in data)
+                cur = conn.execute(
+                    f"INSERT INTO {TABLE} ({cols}) VALUES ({marks})",
+                    [_adapt(v) for v in data.values()],
+                )
+                ids.append(cur.lastrowid)
+        return ids
+
+    def select(
+        self,
+        filters: Optional[Dict] = None,
+        *,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        after: Optional[Tuple[Any, int]] = None,
+    ) -> List[Dict[str, Any]]:
+        f = filters or {}
+        clauses, params = self._where_clause(f)
+        if after is not None:
+            keyset, keyset_params = self._keyset_clause(f.get("order_by"), after)
+            clauses.append(keyset)
+            params.extend(keyset_params)
+        sql = f"SELECT * FROM {TABLE}"
+        if clauses:
+            sql += f" WHERE {' AND '.join(clauses)}"
+        sql += " " + self._order_clause(f.get("order_by"))
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([limit, offset])
+        elif offset:
+            sql += " LIMIT -1 OFFSET ?"
+            params.append(offset)
+        with self.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [_row_to_dict(r) for r in rows]
+
+    def select_columns(self, columns: List[str]) -> List[Dict[str, Any]]:
+        """Tutte le righe con le sole `columns` (letture per analisi a colonne)."""
+        self._check_columns(columns)
+        with self.connection() as conn:
+            rows = conn.execute(f"SELECT {', '.join(columns)} FROM {TABLE} ORDER BY id").fetchall()
+        return [dict(r) for r in rows]
+
+    def get(self, prop_id: int) -> Optional[Dict[str, Any]]:
+        with self.connection() as conn:
+            row = conn.execute(f"SELECT * FROM {TABLE} WHERE id = ?", (prop_id,)).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def update(self, prop_id: int, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Aggiorna e ritorna la riga scritta, None se `prop_id` non esiste."""
+        if not data:
+            return self.get(prop_id)
+        self._check_columns(data)
+        assignments = ", ".join(f"{k} = ?" for k in data)
+        if "updated_at" not in data:
+            # RETURNING vede la riga prima del trigger update_timestamp: timestamp impostato qui
+            assignments += ", updated_at = CURRENT_TIMESTAMP"
+        with self.connection() as conn:
+            row = conn.execute(
+                f"UPDATE {TABLE} SET {assignments} WHERE id = ? RETURNING *",
+                [*(_adapt(v) for v in data.values()), prop_id],
+            ).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def delete(self, prop_id: int) -> bool:
+        with self.connection() as conn:
+            cur = conn.execute(f"DELETE FROM {TABLE} WHERE id = ?", (prop_id,))
+            return cur.rowcount > 0
+
+    def update_many(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """Aggiorna più righe (ognuna con il suo 'id') in un'unica transazione; ritorna gli id aggiornati."""
+        for data in rows:
+            self._check_columns(data)
+        updated: List[int] = []
+        with self.connection() as conn:
+            for data in rows:
+                values = {k: v for k, v in data.items() if k != "id"}
+                if not values:
+                    # Solo l'id: niente da scrivere, conta come aggiornata se esiste
+                    row = conn.execute(f"SELECT id FROM {TABLE} WHERE id = ?", (data["id"],)).fetchone()
+                else:
+                    assignments = ", ".join(f"{k} = ?" for k in values)
+                    row = conn.execute(
+                        f"UPDATE {TABLE} SET {assignments} WHERE id = ? RETURNING id",
+                        [*(_adapt(v) for v in values.values()), data["id"]],
+                    ).fetchone()
+                if row:
+                    updated.append(row[0])
+        return updated
+
+    def set_mensilita_pagata(self, ids: Optional[List[int]], pagata: bool) -> List[int]:
+        """
+        Un solo UPDATE sugli affitti attivi (tutti, o solo `ids`) che non sono già
+        nello stato richiesto. Ritorna gli id modificati.
+        """
+        sql = (f"UPDATE {TABLE} SET mensilita_pagata = ? "
+               "WHERE affittato_a IS NOT NULL AND mensilita_pagata IS NOT ?")
+        changed: List[int] = []
+        with self.connection() as conn:
+            if ids is None:
+                return [r[0] for r in conn.execute(f"{sql} RETURNING id", (pagata, pagata))]
+            # Blocchi sotto il limite di parametri di SQLite
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                marks = ", ".join("?" for _ in chunk)
+                cur = conn.execute(f"{sql} AND id IN ({marks}) RETURNING id", (pagata, pagata, *chunk))
+                changed += [r[0] for r in cur]
+        return changed
+
+    def delete_many(self, ids: List[int]) -> int:
+        deleted = 0
+        with self.connection() as conn:
+            # Blocchi sotto il limite di parametri di SQLite
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                marks = ", ".join("?" for _ in chunk)
+                cur = conn.execute(f"DELETE FROM {TABLE} WHERE id IN ({marks})", chunk)
+                deleted += cur.rowcount
+        return deleted
+
+    # --- Ricerca -------------------------------------------------------------
+    @staticmethod
+    def _match_query(q: str) -> str:
+        # Ogni parola diventa un prefisso; FTS5 mette le parole in AND
+        return " ".join(f'"{t}"*' for t in re.findall(r"\w+", q))
+
+    def search(self, q: str, filters: Optional[Dict] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Ricerca FTS5 ordinata per rilevanza (bm25), con gli stessi filtri di `select`."""
+        match = self._match_query(q)
+        if not match:
+            return []
+        clauses, params = self._where_clause(filters or {})
+        sql = (
+            f"SELECT p.* FROM proprieta_fts JOIN {TABLE} p ON p.id = proprieta_fts.rowid "
+            "WHERE proprieta_fts MATCH ?"
+        )
+        for clause in clauses:
+            sql += f" AND {clause}"
+        sql += " ORDER BY bm25(proprieta_fts), p.nome LIMIT ?"
+        with self.connection() as conn:
+            rows = conn.execute(sql, [match, *params, limit]).fetchall()
+        return [_row_to_dict(r) for r in rows]
+
+    # --- Statistiche ---------------------------------------------------------
+    def stats(self, giorni_scadenza: int) -> Dict[str, Any]:
+        """Totali dalla tabella rollup + conteggio scadenze via idx_contratto_fine."""
+        limite = (date.today() + timedelta(days=giorni_scadenza)).isoformat()
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT totale_immobili, affitti_attivi, non_pagati, entrate_mensili, valore_patrimonio "
+                "FROM proprieta_totali WHERE id = 1"
+            ).fetchone()
+            in_scadenza = conn.execute(
+                f"SELECT COUNT(*) FROM {TABLE} WHERE contratto_fine < ?", (limite,)
+            ).fetchone()[0]
+        stats = dict(row)
+        stats["in_scadenza"] = in_scadenza
+        return stats
+
+    # --- Registro pagamenti ----------------------------------------------------
+    # Mesi dovuti per affitto attivo, ognuno col residuo non coperto dai versamenti
+    # (somma via idx_pagamenti_proprieta_mese) e i giorni trascorsi dalla scadenza.
+    _INSOLUTI = """
+        WITH RECURSIVE affitti AS (
+            SELECT id, affittato_a, affitto_mensile,
+                   MAX(COALESCE(substr(contratto_inizio, 1, 7), :limite), :dal) AS primo,
+                   MIN(COALESCE(substr(contratto_fine, 1, 7), :limite), :limite) AS ultimo
+            FROM proprieta
+            WHERE affittato_a IS NOT NULL AND affitto_mensile > 0
+        ),
+        mesi(mese) AS (
+            SELECT MIN(primo) FROM affitti
+            UNION ALL
+            SELECT strftime('%Y-%m', mese || '-01', '+1 month') FROM mesi WHERE mese < :limite
+        ),
+        dovuti AS (
+            SELECT a.id, a.affittato_a, m.mese,
+                   a.affitto_mensile - COALESCE((SELECT SUM(g.importo) FROM pagamenti g
+                                                 WHERE g.proprieta_id = a.id AND g.mese = m.mese), 0) AS residuo,
+                   CAST(julianday(:oggi) - julianday(m.mese || '-' || printf('%02d', :giorno)) AS INTEGER) AS giorni
+            FROM affitti a JOIN mesi m ON m.mese BETWEEN a.primo AND a.ultimo
+        ),
+        insoluti AS (SELECT * FROM dovuti WHERE residuo > 0.005)
+    """
+
+    def insert_pagamenti(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """Registra i versamenti in un'unica transazione (tutto o niente); ritorna gli id."""
+        with self.connection() as conn:
+            return [
+                conn.execute(
+                    "INSERT INTO pagamenti (proprieta_id, mese, importo, pagato_il) VALUES (?, ?, ?, ?) RETURNING id",
+                    (r["proprieta_id"], r["mese"], r["importo"], _adapt(r["pagato_il"])),
+                ).fetchone()[0]
+                for r in rows
+            ]
+
+    def pagamenti(self, prop_id: int) -> List[Dict[str, Any]]:
+        with self.connection() as conn:
+            rows = conn.execute(
+                "SELECT * FROM pagamenti WHERE proprieta_id = ? ORDER BY mese DESC, id DESC", (prop_id,)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def pagamenti_since(self, since: datetime) -> List[Dict[str, Any]]:
+        """Versamenti registrati da `since` (UTC), per la replica."""
+        ts = since.strftime("%Y-%m-%d %H:%M:%S")
+        with self.connection() as conn:
+            rows = conn.execute(
+                "SELECT * FROM pagamenti WHERE created_at >= ? ORDER BY created_at, id", (ts,)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def morosita(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Insoluti per inquilino, dal più esposto."""
+        sql = self._INSOLUTI + """
+            SELECT affittato_a AS inquilino, COUNT(DISTINCT id) AS immobili, COUNT(*) AS mensilita,
+                   ROUND(SUM(residuo), 2) AS importo, MIN(mese) AS dal, MAX(giorni) AS giorni
+            FROM insoluti GROUP BY affittato_a ORDER BY importo DESC, inquilino
+        """
+        with self.connection() as conn:
+            return [dict(r) for r in conn.execute(sql, params)]
+
+    def aging(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        sql = self._INSOLUTI + """
+            SELECT CASE WHEN giorni <= 30 THEN '0_30' WHEN giorni <= 60 THEN '30_60' ELSE '60_oltre' END AS fascia,
+                   SUM(residuo) AS importo, COUNT(*) AS mensilita
+            FROM insoluti GROUP BY fascia
+        """
+        with self.connection() as conn:
+            return [dict(r) for r in conn.execute(sql, params)]
+
+    def refresh_mensilita(self, mese: str) -> int:
+        """
+        Nuovo mese di riferimento per mensilita_pagata: il flag torna a dire se il
+        mese ha almeno un versamento. Idempotente; ritorna le righe cambiate.
+        """
+        pagato = "EXISTS (SELECT 1 FROM pagamenti g WHERE g.proprieta_id = proprieta.id AND g.mese = :mese)"
+        with self.connection() as conn:
+            cur = conn.execute("UPDATE mensilita_mese SET mese = :mese WHERE id = 1 AND mese != :mese", {"mese": mese})
+            if not cur.rowcount:
+                return 0
+            cur = conn.execute(
+                f"UPDATE {TABLE} SET mensilita_pagata = {pagato} "
+                f"WHERE affittato_a IS NOT NULL AND mensilita_pagata IS NOT {pagato}",
+                {"mese": mese},
+            )
+            return cur.rowcount
+
+    # --- Sincronizzazione ----------------------------------------------------
+    def changes_since(self, since: datetime) -> Tuple[List[Dict[str, Any]], List[int]]:
+        """Righe con updated_at >= `since` (UTC) e id eliminati da allora, via indici sui timestamp."""
+        ts = since.strftime("%Y-%m-%d %H:%M:%S")  # stesso formato di CURRENT_TIMESTAMP
+        with self.connection() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM {TABLE} WHERE updated_at >= ? ORDER BY updated_at, id", (ts,)
+            ).fetchall()
+            deleted = conn.execute(
+                "SELECT id FROM proprieta_eliminate WHERE deleted_at >= ? ORDER BY id", (ts,)
+            ).fetchall()
+        return [_row_to_dict(r) for r in rows], [r[0] for r in deleted]
+
+
+class LocalStorage:
+    """Storage su filesystem con la stessa interfaccia bucket/path di Supabase Storage."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def _file(self, bucket: str, path: str) -> Path:
+        target = (self.root / bucket / path).resolve()
+        if self.root.resolve() not in target.parents:
+            raise ValueError(f"Path non valido: {path}")
+        return target
+
+    def upload(self, bucket: str, path: str, fileobj: BinaryIO, content_type: Optional[str] = None) -> None:
+        target = self._file(bucket, path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with open(target, "wb") as out:
+            shutil.copyfileobj(fileobj, out)
+
+    def public_url(self, bucket: str, path: str) -> Optional[str]:
+        return str(self._file(bucket, path))
+
+    def signed_url(self, bucket: str, path: str, expires_seconds: int) -> Optional[str]:
+        target = self._file(bucket, path)
+        return str(target) if target.exists() else None
+
+    def signed_urls(self, bucket: str, paths: List[str], expires_seconds: int) -> Dict[str, Optional[str]]:
+        return {path: self.signed_url(bucket, path, expires_seconds) for path in paths}
+
+    def remove(self, bucket: str, paths: List[str]) -> None:
+        for path in paths:
+            self._file(bucket, path).unlink(missing_ok=True)
@@ -1,12 +1,16 @@
 # src/excel_io.py
+import io
+import tempfile
 import pandas as pd
+from openpyxl import Workbook
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Iterator, Union, BinaryIO
 try:
-    from . import settings
+    from . import settings, cashflow
     from .db import db
 except ImportError:
     import settings
+    import cashflow
     from db import db
 
 class ExcelIO:
@@ -24,67 +28,226 @@ class ExcelIO:
         'Foto': 'immagine_path'
     }
     
+    EXPORT_EXCLUDED = ['id', 'created_at', 'updated_at']
+
+    @staticmethod
+    def iter_export_rows(page_size: Optional[int] = None) -> Iterator[list]:
+        """
+        Righe del foglio di export (intestazione per prima), lette a pagine dal
+        backend con il cursore keyset: in memoria c'è al massimo una pagina.
+        """
+        page_size = page_size or settings.EXPORT_PAGE_SIZE
+        reverse_mapping = {v: k for k, v in ExcelIO.COLUMNS_MAPPING.items()}
+        keys = None
+        cursor = None
+        while True:
+            page = db.get_proprieta_page(limit=page_size, cursor=cursor, cache=False)
+            for prop in page["items"]:
+                if keys is None:
+                    # Rimuovi colonne tecniche, rinomina quelle note per Excel
+                    keys = [k for k in prop if k not in ExcelIO.EXPORT_EXCLUDED]
+                    yield [reverse_mapping.get(k, k) for k in keys]
+                row = [prop.get(k) for k in keys]
+                # Converti booleani
+                if 'mensilita_pagata' in keys:
+                    i = keys.index('mensilita_pagata')
+                    row[i] = 'SI' if row[i] else 'NO'
+                yield row
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        if keys is None:
+            yield list(ExcelIO.COLUMNS_MAPPING)
+
+    @staticmethod
+    def write_export(target: Union[Path, BinaryIO], page_size: Optional[int] = None) -> None:
+        """Scrive l'export su file o stream binario con un workbook openpyxl write-only."""
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Sheet1")
+        for row in ExcelIO.iter_export_rows(page_size):
+            ws.append(row)
+        wb.save(target)
+
     @staticmethod
     def export_to_excel(filepath: Path):
         """Esporta tutte le proprietà in Excel"""
-        proprieta = db.get_all_proprieta()
-        
-        # Converti in DataFrame
-        df = pd.DataFrame(proprieta)
-        
-        # Rinomina colonne per Excel
-        reverse_mapping = {v: k for k, v in ExcelIO.COLUMNS_MAPPING.items()}
-        df.rename(columns=reverse_mapping, inplace=True)
-        
+        ExcelIO.write_export(filepath)
+
+    @staticmethod
+    def export_to_bytes(page_size: Optional[int] = None) -> bytes:
+        """Export completo come bytes (per download diretti, senza file in DATA_DIR)"""
+        buffer = io.BytesIO()
+        ExcelIO.write_export(buffer, page_size)
+        return buffer.getvalue()
+
+    @staticmethod
+    def iter_export_chunks(chunk_size: int = 64 * 1024, page_size: Optional[int] = None) -> Iterator[bytes]:
+        """
+        Export a blocchi di bytes per risposte HTTP in streaming. Il file xlsx
+        (zip) viene completato in un file temporaneo che resta in RAM solo sotto
+        EXPORT_SPOOL_MAX_BYTES.
+        """
+        return ExcelIO._spooled_chunks(lambda tmp: ExcelIO.write_export(tmp, page_size), chunk_size)
+
+    @staticmethod
+    def _spooled_chunks(write, chunk_size: int) -> Iterator[bytes]:
+        with tempfile.SpooledTemporaryFile(max_size=settings.EXPORT_SPOOL_MAX_BYTES) as tmp:
+            write(tmp)
+            tmp.seek(0)
+            while chunk := tmp.read(chunk_size):
+                yield chunk
+
+    @staticmethod
+    def write_cashflow(target: Union[Path, BinaryIO], mesi: int = 12) -> None:
+        """Piano dei canoni attesi nei prossimi `mesi` mesi: totali, inquilini, categorie e contratti."""
+        cashflow.write_excel(db.get_proiezione(mesi), db.get_arretrati(), target)
+
+    @staticmethod
+    def cashflow_to_bytes(mesi: int = 12) -> bytes:
+        buffer = io.BytesIO()
+        ExcelIO.write_cashflow(buffer, mesi)
+        return buffer.getvalue()
+
+    @staticmethod
+    def iter_cashflow_chunks(mesi: int = 12, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        return ExcelIO._spooled_chunks(lambda tmp: ExcelIO.write_cashflow(tmp, mesi), chunk_size)
+
+    NUMERIC_FIELDS = ['mq_effettivi', 'mq_commerciali', 'valore_mq', 'affitto_mensile',
+                      'mensilita_pagata', 'foglio', 'particella', 'subalterno']
+    REQUIRED_FIELDS = ['nome', 'indirizzo', 'mq_effettivi', 'mq_commerciali', 'valore_mq']
+    DATE_FIELDS = ['contratto_inizio', 'contratto_fine']
+    TRUE_VALUES = ['SI', 'SÌ', '1', 'TRUE']
+
+    @staticmethod
+    def _normalize_frame(df: pd.DataFrame) -> tuple[pd.DataFrame, Dict[int, str]]:
+        """
+        Valida e normalizza il foglio a colonne intere (niente loop per riga).
+        Returns (df normalizzato, {indice riga: primo errore}).
+        """
+        df = df.rename(columns=ExcelIO.COLUMNS_MAPPING)
+        errors = pd.Series("", index=df.index, dtype=object)
+
+        def flag(mask: pd.Series, message) -> None:
+            # Tiene solo il primo errore di ogni riga, come l'import riga per riga
+            mask = mask & (errors == "")
+            if mask.any():
+                errors[mask] = message if isinstance(message, str) else message[mask]
+
+        if 'nome' not in df.columns:
+            df['nome'] = None
+        flag(df['nome'].isna(), "Nome obbligatorio")
+        for field in ExcelIO.REQUIRED_FIELDS[1:]:
+            if field in df.columns:
+                flag(df[field].isna(), f"Campo obbligatorio mancante: {field}")
+            else:
+                flag(pd.Series(True, index=df.index), f"Campo obbligatorio mancante: {field}")
+
         # Converti booleani
-        if 'Mese Pagato' in df.columns:
-            df['Mese Pagato'] = df['Mese Pagato'].apply(lambda x: 'SI' if x else 'NO')
-        
-        # Rimuovi colonne tecniche
-        cols_to_remove = ['id', 'created_at', 'updated_at']
-        df.drop(columns=[c for c in cols_to_remove if c in df.columns], inplace=True)
-        
-        # Salva
-        df.to_excel(filepath, index=False, engine='openpyxl')
-    
+        if 'mensilita_pagata' in df.columns:
+            df['mensilita_pagata'] = (
+                df['mensilita_pagata'].astype(str).str.upper().isin(ExcelIO.TRUE_VALUES).astype(int)
+            )
+
+        # Converti date
+        for date_field in ExcelIO.DATE_FIELDS:
+            if date_field not in df.columns:
+                continue
+            col = df[date_field]
+            parsed = col if pd.api.types.is_datetime64_any_dtype(col) else pd.to_datetime(col, errors='coerce', format='mixed')
+            flag(col.notna() & parsed.isna(), "Data non valida in " + date_field + ": " + col.astype(str))
+            df[date_field] = parsed.dt.strftime('%Y-%m-%d')
+
+        if {'mq_effettivi', 'mq_commerciali'} <= set(df.columns):
+            mq_eff = pd.to_numeric(df['mq_effettivi'], errors='coerce')
+            mq_comm = pd.to_numeric(df['mq_commerciali'], errors='coerce')
+            flag(mq_comm < mq_eff, "MQ Commerciali devono essere >= MQ Effettivi")
+
+        # Rimuovi NaN (e passa a tipi Python nativi)
+        df = df.astype(object).where(df.notna(), None)
+        return df, {idx: msg for idx, msg in errors.items() if msg}
+
     @staticmethod
-    def import_from_excel(filepath: Path) -> tuple[int, List[str]]:
-        """Importa proprietà da Excel. Returns (count, errors)"""
+    def import_from_excel(filepath: Path, batch_size: Optional[int] = None) -> tuple[int, List[str]]:
+        """Importa proprietà da Excel a blocchi di insert bulk. Returns (count, errors)"""
         df = pd.read_excel(filepath, engine='openpyxl')
-        
-        # Rinomina colonne
-        df.rename(columns=ExcelIO.COLUMNS_MAPPING, inplace=True)
-        
-        imported_count = 0
-        errors = []
-        
-        for idx, row in df.iterrows():
-            try:
-                data = row.to_dict()
-                
-                # Validazioni
-                if pd.isna(data.get('nome')):
-                    raise ValueError("Nome obbligatorio")
-                
-                # Converti booleani
-                if 'mensilita_pagata' in data:
-                    val = str(data['mensilita_pagata']).upper()
-                    data['mensilita_pagata'] = 1 if val in ['SI', 'SÌ', '1', 'TRUE'] else 0
-                
-                # Converti date
-                for date_field in ['contratto_inizio', 'contratto_fine']:
-                    if date_field in data and pd.notna(data[date_field]):
-                        data[date_field] = pd.to_datetime(data[date_field]).strftime('%Y-%m-%d')
-                
-                # Rimuovi NaN
-                data = {k: (v if pd.notna(v) else None) for k, v in data.items()}
-                
-                db.create_proprieta(data)
-                imported_count += 1
-                
-            except Exception as e:
-                errors.append(f"Riga {idx + 2}: {str(e)}")
-        
+        df, row_errors = ExcelIO._normalize_frame(df)
+
+        valid = df.drop(index=list(row_errors))
+        records = valid.to_dict('records')
+        ids, insert_errors = db.create_proprieta_bulk(records, batch_size=batch_size)
+
+        for pos, msg in insert_errors.items():
+            row_errors[valid.index[pos]] = msg
+
+        imported_count = sum(1 for i in ids if i is not None)
+        errors = [f"Riga {idx + 2}: {msg}" for idx, msg in sorted(row_errors.items())]
         return imported_count, errors
 
+    @staticmethod
+    def _row_hashes(df: pd.DataFrame, columns: List[str]) -> pd.Series:
+        """Hash del contenuto normalizzato di ogni riga (numeri come float, testo come stringa)."""
+        canon = pd.DataFrame(index=df.index)
+        for col in columns:
+            values = df[col] if col in df.columns else pd.Series(None, index=df.index, dtype=object)
+            if col in ExcelIO.NUMERIC_FIELDS:
+                values = values.map(lambda v: float(v) if isinstance(v, bool) else v, na_action='ignore')
+                canon[col] = pd.to_numeric(values, errors='coerce').astype(float).round(6)
+            else:
+                canon[col] = values.astype(object).where(values.notna(), "").astype(str)
+        return pd.util.hash_pandas_object(canon, index=False)
+
+    @staticmethod
+    def sync_from_excel(
+        filepath: Path,
+        *,
+        delete_missing: bool = False,
+        batch_size: Optional[int] = None,
+    ) -> Dict[str, object]:
+        """
+        Re-import idempotente per `nome`: inserisce i nomi nuovi, aggiorna solo le
+        righe il cui contenuto è cambiato e, con `delete_missing`, elimina le
+        proprietà assenti dal foglio. Legge il portafoglio una volta sola e scrive
+        solo in bulk.
+        Returns {"inserted", "updated", "unchanged", "deleted", "errors"}.
+        """
+        df = pd.read_excel(filepath, engine='openpyxl')
+        df, row_errors = ExcelIO._normalize_frame(df)
+        duplicati = df['nome'].notna() & df['nome'].duplicated(keep='first')
+        for idx in df.index[duplicati]:
+            row_errors.setdefault(idx, "Nome duplicato nel foglio")
+
+        valid = df.drop(index=list(row_errors))
+        columns = [c for c in valid.columns if c != 'id']
+        current = db.get_proprieta_batch().to_frame()  # a colonne, senza passare da una lista di dict
+        if current.empty:
+            current = pd.DataFrame(columns=['id', 'nome'])
+        current = current.set_index('nome', drop=False)
+
+        is_new = ~valid['nome'].isin(current.index)
+        new_rows, old_rows = valid[is_new], valid[~is_new]
+
+        stored = current.loc[old_rows['nome']].set_axis(old_rows.index)
+        changed = ExcelIO._row_hashes(old_rows, columns) != ExcelIO._row_hashes(stored, columns)
+        to_update = old_rows.loc[changed, columns].assign(id=stored.loc[changed, 'id'].astype(int))
+
+        ids, insert_errors = db.create_proprieta_bulk(new_rows[columns].to_dict('records'), batch_size=batch_size)
+        updated, update_errors = db.update_proprieta_bulk(to_update.to_dict('records'), batch_size=batch_size)
+        for pos, msg in insert_errors.items():
+            row_errors[new_rows.index[pos]] = msg
+        for pos, msg in update_errors.items():
+            row_errors[to_update.index[pos]] = msg
+
+        deleted = 0
+        if delete_missing:
+            missing = current.loc[~current['nome'].isin(df['nome']), 'id']
+            deleted = db.delete_proprieta_bulk([int(i) for i in missing])
+
+        return {
+            "inserted": sum(1 for i in ids if i is not None),
+            "updated": updated,
+            "unchanged": int((~changed).sum()),
+            "deleted": deleted,
+            "errors": [f"Riga {idx + 2}: {msg}" for idx, msg in sorted(row_errors.items())],
+        }
+
 excel_io = ExcelIO()
\ No newline at end of file
@@ -0,0 +1,74 @@
+# src/images.py
+"""Pipeline immagini per le piantine: validazione, rimozione EXIF, WebP + miniatura."""
+import hashlib
+import io
+from dataclasses import dataclass
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+try:
+    from . import settings
+except ImportError:
+    import settings
+
+# Formati Pillow corrispondenti a SUPPORTED_IMAGE_FORMATS
+PILLOW_FORMATS = {"JPEG", "PNG", "WEBP"}
+
+
+@dataclass(frozen=True)
+class PiantinaWebp:
+    stem: str        # nome base (senza estensione) usato per i file caricati
+    display: bytes   # versione per la scheda, lato lungo <= IMAGE_MAX_SIDE_PX
+    thumb: bytes     # miniatura per liste e sidebar, lato lungo <= THUMB_MAX_SIDE_PX
+    sha256: str      # hash del file originale, per non ricaricare doppioni
+
+
+def validate_image_file(filename: str, size_bytes: int) -> None:
+    """Controlli economici prima di decodificare: estensione e dimensione."""
+    ext = Path(filename).suffix.lower()
+    if ext not in settings.SUPPORTED_IMAGE_FORMATS:
+        raise ValueError(
+            f"Formato immagine non supportato: {ext or filename} "
+            f"(ammessi: {', '.join(settings.SUPPORTED_IMAGE_FORMATS)})"
+        )
+    if size_bytes > settings.MAX_IMAGE_SIZE_MB * 1024 * 1024:
+        raise ValueError(
+            f"Immagine troppo grande: {size_bytes / 1024 / 1024:.1f} MB (massimo {settings.MAX_IMAGE_SIZE_MB} MB)"
+        )
+
+
+def _encode_webp(img: Image.Image, max_side: int) -> bytes:
+    copy = img.copy()
+    copy.thumbnail((max_side, max_side), Image.LANCZOS)
+    out = io.BytesIO()
+    # Senza parametro exif Pillow non scrive metadati: GPS e dati fotocamera spariscono
+    copy.save(out, format="WEBP", quality=settings.WEBP_QUALITY, method=4)
+    return out.getvalue()
+
+
+def process_piantina(data: bytes, filename: str) -> PiantinaWebp:
+    """
+    Valida e ricodifica una piantina caricata dall'utente.
+    ValueError se il file è troppo grande, di un formato non ammesso o non è un'immagine.
+    """
+    validate_image_file(filename, len(data))
+    try:
+        img = Image.open(io.BytesIO(data))
+        if img.format not in PILLOW_FORMATS:
+            raise ValueError(f"Il contenuto non è un'immagine {', '.join(sorted(PILLOW_FORMATS))}")
+        img.load()
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Immagine non valida: {e}") from e
+
+    # Applica la rotazione EXIF prima di scartare i metadati
+    img = ImageOps.exif_transpose(img)
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    img = img.convert("RGBA" if has_alpha else "RGB")
+
+    return PiantinaWebp(
+        stem=Path(filename).stem,
+        display=_encode_webp(img, settings.IMAGE_MAX_SIDE_PX),
+        thumb=_encode_webp(img, settings.THUMB_MAX_SIDE_PX),
+        sha256=hashlib.sha256(data).hexdigest(),
+    )
@@ -0,0 +1,47 @@
+# src/lazy.py
+"""
+Import differiti per i moduli pesanti.
+
+pandas, openpyxl e Pillow costano più di mezzo secondo all'avvio e servono
+solo a import/export, analisi e piantine. `modulo("analytics", __package__)`
+ritorna un segnaposto che importa il modulo vero al primo accesso a un suo
+attributo: chi lo dichiara a livello di modulo non paga l'import finché non
+lo usa. Con `__package__` vuoto (avvio da src/, es. `streamlit run
+src/main.py`) il nome è assoluto, come nel ramo `except ImportError` degli
+import del progetto.
+
+PyInstaller non vede questi import: i moduli vanno elencati come
+`--hidden-import` in build.bat.
+"""
+import importlib
+import threading
+from types import ModuleType
+from typing import Any, Optional
+
+
+class Modulo:
+    """Segnaposto di un modulo importato al primo accesso (una volta sola anche fra thread)."""
+
+    def __init__(self, nome: str):
+        self._nome = nome
+        self._modulo: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+
+    def _carica(self) -> ModuleType:
+        if self._modulo is None:
+            with self._lock:
+                if self._modulo is None:
+                    self._modulo = importlib.import_module(self._nome)
+        return self._modulo
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._carica(), attr)
+
+    def __repr__(self) -> str:
+        stato = "importato" if self._modulo is not None else "non ancora importato"
+        return f"<modulo differito {self._nome!r} ({stato})>"
+
+
+def modulo(nome: str, package: Optional[str] = None) -> Modulo:
+    """`nome` relativo a `package` (come `from . import nome`), assoluto se `package` è vuoto."""
+    return Modulo(f"{package}.{nome}" if package else nome)
@@ -1,16 +1,25 @@
 import streamlit as st
 from pathlib import Path
-from datetime import datetime
+from dataclasses import replace
+from datetime import date, datetime
 import tempfile
+import time
 
 try:
     from . import settings
-    from .db import db
-    from .excel_io import excel_io
+    from .db import db, images
+    from .query import ORDINAMENTI
+    from . import metrics, scadenze, lazy
 except ImportError:
     import settings
-    from db import db
-    from excel_io import excel_io
+    from db import db, images
+    from query import ORDINAMENTI
+    import metrics
+    import scadenze
+    import lazy
+
+# pandas e openpyxl si caricano al primo import/export, non a ogni avvio
+excel_io = lazy.modulo("excel_io", __package__)
 
 
 # Configurazione pagina
@@ -22,16 +31,17 @@ if "selected_prop_id" not in st.session_state:
 if "refresh" not in st.session_state:
     st.session_state.refresh = 0
 
+# Replica locale: il thread di sincronizzazione parte una volta sola per processo
+db.start_sync()
+
 
-def calcola_giorni_scadenza(data_fine: str) -> int:
-    """Calcola giorni alla scadenza"""
-    if not data_fine:
-        return 999
-    try:
-        scadenza = datetime.fromisoformat(data_fine).date()
-        return (scadenza - datetime.now().date()).days
-    except Exception:
-        return 999
+BADGE_STATO = {
+    scadenze.LIBERO: "⚪",
+    scadenze.ATTIVO: "🟢",
+    scadenze.IN_SCADENZA: "🟢",
+    scadenze.SCADUTO: "⏰",
+    scadenze.NON_PAGATO: "🔴",
+}
 
 
 def render_sidebar():
@@ -40,41 +50,84 @@ def render_sidebar():
 
     st.sidebar.subheader("🔍 Filtri")
     cerca = st.sidebar.text_input("Cerca (nome, indirizzo, catasto)", "")
-    ordina = st.sidebar.selectbox("Ordina per", ["nome", "valore_mq DESC", "contratto_fine ASC"])
+    ordina = st.sidebar.selectbox("Ordina per", ORDINAMENTI)
     solo_affitti = st.sidebar.checkbox("Solo affitti attivi")
-    scadenza_60 = st.sidebar.checkbox("Scadenza < 60 giorni")
+    scadenza_vicina = st.sidebar.checkbox(f"Scadenza < {settings.SCADENZA_WARNING_GIORNI} giorni")
     non_pagati = st.sidebar.checkbox("Mensilità non pagate")
 
     filters = {
         "order_by": ordina,
         "solo_affitti": solo_affitti,
-        "scadenza_giorni": 60 if scadenza_60 else None,
+        "scadenza_giorni": settings.SCADENZA_WARNING_GIORNI if scadenza_vicina else None,
         "non_pagati": non_pagati,
     }
 
-    proprieta = db.get_all_proprieta(filters)
-
-    if cerca:
-        q = cerca.lower()
-        proprieta = [
-            p for p in proprieta
-            if any(q in str(p.get(k, "")).lower() for k in ["nome", "indirizzo", "foglio", "particella", "subalterno", "zona_cens", "categoria", "classe"])
-        ]
+    # Date e stato già calcolati al caricamento (in cache fra un rerun e l'altro)
+    portafoglio = db.get_portafoglio(filters, cerca, limit=100)
+    proprieta = portafoglio.righe
 
     st.sidebar.markdown("---")
     st.sidebar.subheader("📋 Elenco")
 
     for prop in proprieta:
-        giorni_scadenza = calcola_giorni_scadenza(prop.get("contratto_fine"))
-        badge = "🟢" if prop.get("mensilita_pagata") else "🔴" if prop.get("affittato_a") else "⚪"
+        badge = BADGE_STATO[prop["stato"]]
         affitto_info = f"{badge} {prop.get('affitto_mensile', 0):.0f}€" if prop.get("affittato_a") else "⚪ Libero"
-        warning = f" ⚠️ {giorni_scadenza}gg" if 0 < giorni_scadenza < 60 else ""
+        if prop["stato"] == scadenze.SCADUTO:
+            warning = " ⏰ scaduto"
+        elif prop["giorni_scadenza"] is not None and 0 <= prop["giorni_scadenza"] < settings.SCADENZA_WARNING_GIORNI:
+            warning = f" ⚠️ {prop['giorni_scadenza']}gg"
+        else:
+            warning = " ❓ data" if prop["date_non_valide"] else ""
 
         if st.sidebar.button(f"{prop.get('nome')}\n{affitto_info}{warning}", key=f"prop_{prop.get('id')}", use_container_width=True):
             st.session_state.selected_prop_id = int(prop["id"])
             st.session_state.edit_mode = None
+            st.session_state.analisi = False
             st.session_state.confirm_delete = None
 
+    render_mensilita(proprieta)
+    render_sync_status()
+
+
+def render_mensilita(proprieta: list):
+    """Azione multipla sulle mensilità del mese scelte: segna pagate o annulla (un solo UPDATE)"""
+    affittati = {int(p["id"]): p.get("nome") for p in proprieta if p.get("affittato_a")}
+    with st.sidebar.expander("💶 Mensilità"):
+        scelti = st.multiselect("Affitti in elenco", list(affittati), format_func=affittati.get)
+        col1, col2 = st.columns(2)
+        if col1.button("✅ Pagate", disabled=not scelti, use_container_width=True):
+            n = len(db.set_mensilita_pagata(scelti, True))
+            st.session_state.esito_mensilita = f"✅ {n} mensilità segnate come pagate"
+            st.rerun()
+        # Togliere il flag annulla i versamenti del mese: solo sulle righe scelte
+        if col2.button("↩️ Annulla", disabled=not scelti, use_container_width=True):
+            n = len(db.set_mensilita_pagata(scelti, False))
+            st.session_state.esito_mensilita = f"↩️ {n} mensilità riportate a non pagate"
+            st.rerun()
+        if st.session_state.get("esito_mensilita"):
+            st.success(st.session_state.pop("esito_mensilita"))
+
+
+def render_sync_status():
+    """Stato della replica locale (solo con DB_BACKEND="replica")"""
+    stato = db.sync_status()
+    if stato is None:
+        return
+    with st.sidebar.expander("🔄 Sincronizzazione"):
+        ultimo = stato["ultimo_sync"].astimezone().strftime("%H:%M:%S") if stato["ultimo_sync"] else "mai"
+        st.caption(f"Modifiche da inviare: {stato['pendenti']} · ultimo sync: {ultimo}")
+        if stato["ultimo_errore"]:
+            st.warning(f"Offline: {stato['ultimo_errore']}")
+        if st.button("Sincronizza ora", use_container_width=True):
+            try:
+                db.sync_worker.sync_once()
+            except Exception:
+                pass  # l'errore resta in stato["ultimo_errore"]
+            st.rerun()
+        for c in stato["conflitti"]:
+            campo = c["campo"] or "riga eliminata in remoto"
+            st.caption(f"⚠️ #{c['prop_id']} {campo}: vince {c['vincitore']} ({c['risolto_at']})")
+
 
 def render_scheda_immobile(prop_id: int):
     """Render scheda dettagliata immobile"""
@@ -88,7 +141,7 @@ def render_scheda_immobile(prop_id: int):
         img_url = prop.get("immagine_url")
         if not img_url and prop.get("immagine_path"):
             try:
-                img_url = db.get_signed_piantina_url(prop["id"], expires_seconds=3600)
+                img_url = db.get_signed_piantina_url(prop["id"], expires_seconds=3600, path=prop["immagine_path"])
             except Exception:
                 img_url = None
 
@@ -128,15 +181,21 @@ def render_scheda_immobile(prop_id: int):
             st.write(f"**Canone mensile:** {prop.get('affitto_mensile', 0):,.2f}€")
         with col_aff2:
             st.write(f"**Contratto:** {prop.get('contratto_inizio')} → {prop.get('contratto_fine')}")
-            giorni = calcola_giorni_scadenza(prop.get("contratto_fine"))
-            if giorni < 0:
+            scadenze.annota(prop, date.today(), settings.SCADENZA_WARNING_GIORNI)
+            giorni = prop["giorni_scadenza"]
+            if prop["date_non_valide"]:
+                st.warning(f"❓ Data non valida: {', '.join(prop['date_non_valide'])}")
+            elif giorni is None:
+                st.info("♾️ Contratto senza scadenza")
+            elif giorni < 0:
                 st.error(f"⏰ SCADUTO da {abs(giorni)} giorni")
-            elif giorni < 60:
+            elif giorni < settings.SCADENZA_WARNING_GIORNI:
                 st.warning(f"⚠️ Scade tra {giorni} giorni")
             else:
                 st.success(f"✅ Scade tra {giorni} giorni")
 
             st.success("🟢 Mensilità PAGATA" if prop.get("mensilita_pagata") else "🔴 Mensilità NON PAGATA")
+        render_pagamenti(prop)
     else:
         st.info("⚪ Immobile attualmente libero")
 
@@ -146,7 +205,7 @@ def render_scheda_immobile(prop_id: int):
     contratto_url = prop.get("contratto_url")
     if not contratto_url and prop.get("contratto_path"):
         try:
-            contratto_url = db.get_signed_contratto_url(prop["id"], expires_seconds=3600)
+            contratto_url = db.get_signed_contratto_url(prop["id"], expires_seconds=3600, path=prop["contratto_path"])
         except Exception:
             contratto_url = None
 
@@ -175,6 +234,47 @@ def render_scheda_immobile(prop_id: int):
                 st.warning("⚠️ Clicca di nuovo per confermare")
 
 
+def render_pagamenti(prop: dict):
+    """Storico versamenti e registrazione di un nuovo versamento"""
+    with st.expander("💶 Pagamenti"):
+        with st.form(f"pagamento_{prop['id']}", clear_on_submit=True):
+            c1, c2, c3 = st.columns(3)
+            mese = c1.text_input("Mese (AAAA-MM)", value=date.today().strftime("%Y-%m"))
+            importo = c2.number_input("Importo €", min_value=0.0, value=float(prop.get("affitto_mensile") or 0))
+            pagato_il = c3.date_input("Pagato il", value=date.today())
+            if st.form_submit_button("➕ Registra"):
+                _, errori = db.create_pagamenti(
+                    [{"proprieta_id": prop["id"], "mese": mese, "importo": importo, "pagato_il": pagato_il}]
+                )
+                if errori:
+                    st.error(f"❌ {errori[0]}")
+                else:
+                    st.rerun()
+
+        pagamenti = db.get_pagamenti(prop["id"])
+        if pagamenti:
+            st.dataframe(
+                [{"Mese": p["mese"], "Importo €": p["importo"], "Pagato il": p["pagato_il"]} for p in pagamenti],
+                hide_index=True, use_container_width=True,
+            )
+        else:
+            st.caption("Nessun versamento registrato")
+
+
+def render_morosita():
+    """Insoluti per fascia di ritardo e inquilini più esposti"""
+    aging = db.get_aging()
+    if not aging["mensilita"]:
+        return
+    st.subheader("📉 Insoluti")
+    etichette = {"0_30": "0-30 gg", "30_60": "30-60 gg", "60_oltre": "> 60 gg"}
+    cols = st.columns(len(aging["fasce"]) + 1)
+    cols[0].metric("Totale", f"{aging['totale']:,.2f}€", f"{aging['mensilita']} mensilità", delta_color="off")
+    for col, fascia in zip(cols[1:], aging["fasce"]):
+        col.metric(etichette[fascia["fascia"]], f"{fascia['importo']:,.2f}€")
+    st.dataframe(db.get_morosita(), hide_index=True, use_container_width=True)
+
+
 def render_form_proprieta(prop_id: int = None):
     """Form CRUD proprietà"""
     prop = db.get_proprieta_by_id(prop_id) if prop_id else {}
@@ -196,7 +296,10 @@ def render_form_proprieta(prop_id: int = None):
             contratto_inizio = st.date_input("Contratto Inizio", value=datetime.fromisoformat(prop["contratto_inizio"]).date() if prop.get("contratto_inizio") else None)
             contratto_fine = st.date_input("Contratto Fine", value=datetime.fromisoformat(prop["contratto_fine"]).date() if prop.get("contratto_fine") else None)
             mensilita_pagata = st.checkbox("Mensilità Pagata", value=bool(prop.get("mensilita_pagata", 0)))
-            immagine = st.file_uploader("Carica Foto", type=["jpg", "jpeg", "png", "webp"])
+            immagine = st.file_uploader(
+                f"Carica Foto (max {settings.MAX_IMAGE_SIZE_MB} MB)",
+                type=[ext.lstrip(".") for ext in settings.SUPPORTED_IMAGE_FORMATS],
+            )
             contratto_pdf = st.file_uploader("Carica Contratto (PDF)", type=["pdf"])
 
         with st.expander("📐 Dati catastali", expanded=True):
@@ -232,18 +335,16 @@ def render_form_proprieta(prop_id: int = None):
             }
 
             try:
+                # Immagine validata e ricodificata prima di qualsiasi scrittura
+                piantina = images.process_piantina(immagine.getvalue(), immagine.name) if immagine else None
+
                 target_id = prop_id or db.create_proprieta(data)
                 if prop_id:
                     db.update_proprieta(prop_id, data)
 
-                if immagine:
-                    ext = Path(immagine.name).suffix.lower()
-                    filename = f"{nome.lower().replace(' ', '_')}_{int(datetime.now().timestamp())}{ext}"
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
-                        tmp.write(immagine.getbuffer())
-                        tmp_path = tmp.name
-                    db.upload_piantina_and_link(prop_id=target_id, local_file_path=tmp_path, filename=filename, make_public_url=True)
-                    Path(tmp_path).unlink(missing_ok=True)
+                if piantina:
+                    stem = f"{nome.lower().replace(' ', '_')}_{int(datetime.now().timestamp())}"
+                    db.link_piantina(target_id, replace(piantina, stem=stem), make_public_url=True)
 
                 if contratto_pdf:
                     filename = f"contratto_{int(datetime.now().timestamp())}.pdf"
@@ -271,34 +372,151 @@ def render_azioni_globali():
         st.session_state.selected_prop_id = None
         st.rerun()
 
+    if st.sidebar.button("📈 Analisi portafoglio", use_container_width=True):
+        st.session_state.analisi = True
+        st.session_state.edit_mode = None
+        st.session_state.selected_prop_id = None
+        st.rerun()
+
     if st.sidebar.button("📤 Export Excel", use_container_width=True):
         try:
-            export_path = settings.DATA_DIR / f"export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            excel_io.export_to_excel(export_path)
-            with open(export_path, "rb") as f:
-                st.sidebar.download_button("⬇️ Scarica File", f.read(), file_name=export_path.name)
+            file_name = f"export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+            st.sidebar.download_button("⬇️ Scarica File", excel_io.ExcelIO.export_to_bytes(), file_name=file_name)
             st.sidebar.success("✅ Export completato!")
         except Exception as e:
             st.sidebar.error(f"❌ Errore export: {e}")
 
+    aggiorna_esistenti = st.sidebar.checkbox("Aggiorna esistenti (per nome)")
+    elimina_mancanti = aggiorna_esistenti and st.sidebar.checkbox("Elimina immobili assenti dal file")
     uploaded_file = st.sidebar.file_uploader("📥 Import Excel", type=["xlsx"])
     if uploaded_file:
         try:
             temp_path = settings.DATA_DIR / "temp_import.xlsx"
             with open(temp_path, "wb") as f:
                 f.write(uploaded_file.getbuffer())
-            count, errors = excel_io.import_from_excel(temp_path)
-            if errors:
-                st.sidebar.warning(f"⚠️ Importati {count}, {len(errors)} errori.")
+            if aggiorna_esistenti:
+                res = excel_io.ExcelIO.sync_from_excel(temp_path, delete_missing=elimina_mancanti)
+                errors = res["errors"]
+                riepilogo = (f"{res['inserted']} nuovi, {res['updated']} aggiornati, "
+                             f"{res['unchanged']} invariati, {res['deleted']} eliminati")
+                if errors:
+                    st.sidebar.warning(f"⚠️ {riepilogo}, {len(errors)} errori.")
+                else:
+                    st.sidebar.success(f"✅ {riepilogo}")
             else:
-                st.sidebar.success(f"✅ Importati {count} immobili!")
+                count, errors = excel_io.ExcelIO.import_from_excel(temp_path)
+                if errors:
+                    st.sidebar.warning(f"⚠️ Importati {count}, {len(errors)} errori.")
+                else:
+                    st.sidebar.success(f"✅ Importati {count} immobili!")
             temp_path.unlink()
             st.rerun()
         except Exception as e:
             st.sidebar.error(f"❌ Errore import: {e}")
 
 
+def _percento(x) -> str:
+    return "—" if x is None else f"{x:.1%}"
+
+
+def render_analisi():
+    """Dashboard di portafoglio: rendimenti, €/m², sfitto e concentrazione per gruppo catastale"""
+    report = db.get_analytics()
+    tot = report["totale"]
+    st.subheader("📈 Analisi portafoglio")
+    if not tot["immobili"]:
+        st.info("Nessun immobile da analizzare")
+        return
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("🏦 Valore", f"{tot['valore']:,.0f}€")
+    col2.metric("💹 Rendimento lordo", _percento(tot["rendimento_lordo"]),
+                f"{_percento(tot['rendimento_portafoglio'])} sul patrimonio", delta_color="off")
+    col3.metric("🏚️ Sfitto", _percento(tot["tasso_sfitto"]), f"{tot['immobili'] - tot['affittati']} immobili",
+                delta_color="off")
+    col4.metric("🎯 Top 10% del valore", _percento(tot["concentrazione"]["quota_top10pct"]))
+
+    mq = tot["valore_mq"]
+    if mq["mediana"] is not None:
+        st.caption(f"€/m²: mediana {mq['mediana']:,.0f} · p10 {mq['p10']:,.0f} · p90 {mq['p90']:,.0f} · "
+                   f"min {mq['min']:,.0f} · max {mq['max']:,.0f}")
+
+    etichette = {"categoria": "Categoria", "zona_cens": "Zona censuaria", "classe": "Classe"}
+    for tab, (col, righe) in zip(st.tabs(list(etichette.values())), report["gruppi"].items()):
+        with tab:
+            st.dataframe(righe, hide_index=True, use_container_width=True, column_config={
+                col: etichette[col],
+                "tasso_sfitto": st.column_config.NumberColumn("Sfitto", format="percent"),
+                "quota_valore": st.column_config.NumberColumn("Quota valore", format="percent"),
+                "rendimento_lordo": st.column_config.NumberColumn("Rendimento", format="percent"),
+                "valore": st.column_config.NumberColumn("Valore €", format="%.0f"),
+                "canone_annuo": st.column_config.NumberColumn("Canoni annui €", format="%.0f"),
+            })
+
+    migliori, peggiori = st.columns(2)
+    migliori.write("**Rendimento più alto**")
+    migliori.dataframe(report["rendimenti"]["migliori"], hide_index=True, use_container_width=True)
+    peggiori.write("**Rendimento più basso**")
+    peggiori.dataframe(report["rendimenti"]["peggiori"], hide_index=True, use_container_width=True)
+
+    render_cashflow()
+
+
+def render_cashflow():
+    """Canoni attesi mese per mese, con lo sfitto dopo le scadenze"""
+    st.markdown("---")
+    st.subheader("📅 Canoni attesi")
+    anni = st.select_slider("Orizzonte (anni)", options=[1, 2, 3, 4, 5], value=1)
+    flusso = db.get_cashflow(anni * 12, inquilini=20)
+    tot = flusso["totale"]
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("💶 Canoni attesi", f"{tot['canoni']:,.0f}€")
+    col2.metric("📉 Arretrati", f"{tot['arretrati']:,.0f}€")
+    col3.metric("💰 Da incassare", f"{tot['da_incassare']:,.0f}€")
+    st.line_chart(flusso["per_mese"], x="mese", y=["canoni", "sfitto"])
+
+    inquilini, categorie = st.tabs(["Per inquilino", "Per categoria"])
+    inquilini.dataframe([{k: v for k, v in r.items() if k != "mesi"} for r in flusso["per_inquilino"]],
+                        hide_index=True, use_container_width=True)
+    categorie.dataframe([{k: v for k, v in r.items() if k != "mesi"} for r in flusso["per_categoria"]],
+                        hide_index=True, use_container_width=True)
+    if st.button("📤 Piano canoni in Excel"):
+        st.download_button("⬇️ Scarica piano", excel_io.ExcelIO.cashflow_to_bytes(anni * 12),
+                           file_name=f"cashflow_{date.today():%Y%m%d}_{anni * 12}m.xlsx")
+
+
+def render_debug_panel(calls: list, secondi_rerun: float):
+    """Chiamate a backend e storage di questo rerun (DEBUG_PANEL=1)"""
+    per_metodo = {}
+    for c in calls:
+        voce = per_metodo.setdefault(f"{c['target']}.{c['method']}", {"chiamate": 0, "ms": 0.0, "righe": 0, "errori": 0})
+        voce["chiamate"] += 1
+        voce["ms"] += c["secondi"] * 1000
+        voce["righe"] += c["righe"]
+        voce["errori"] += c["errore"] is not None
+    totale_ms = sum(v["ms"] for v in per_metodo.values())
+    with st.sidebar.expander("🐞 Debug", expanded=True):
+        st.caption(f"Rerun: {secondi_rerun * 1000:.0f} ms · backend: {len(calls)} chiamate, {totale_ms:.0f} ms")
+        cache = db.cache_info()
+        st.caption(f"Cache: {cache['hits']} hit, {cache['misses']} miss")
+        if per_metodo:
+            st.dataframe(
+                [{"metodo": k, **v, "ms": round(v["ms"], 1)} for k, v in sorted(per_metodo.items())],
+                hide_index=True, use_container_width=True,
+            )
+
+
 def main():
+    if not settings.DEBUG_PANEL:
+        return render_app()
+    start = time.perf_counter()
+    with metrics.trace() as calls:
+        render_app()
+    render_debug_panel(calls, time.perf_counter() - start)
+
+
+def render_app():
     st.title("🏠 Gestionale Immobiliare")
     render_sidebar()
     render_azioni_globali()
@@ -310,21 +528,36 @@ def main():
             st.rerun()
     elif st.session_state.get("selected_prop_id") is not None:
         render_scheda_immobile(int(st.session_state.selected_prop_id))
+    elif st.session_state.get("analisi"):
+        render_analisi()
     else:
         st.info("👈 Seleziona un immobile o creane uno nuovo")
-        proprieta = db.get_all_proprieta()
-        if proprieta:
+        stats = db.get_stats(settings.SCADENZA_WARNING_GIORNI)
+        if stats["totale_immobili"]:
             col1, col2, col3, col4 = st.columns(4)
-            affitti = [p for p in proprieta if p.get("affittato_a")]
-            non_pagati = [p for p in affitti if not p.get("mensilita_pagata")]
-            scadenze = [p for p in proprieta if calcola_giorni_scadenza(p.get("contratto_fine")) < 60]
-            col1.metric("📋 Totale", len(proprieta))
-            col2.metric("🏠 Affitti", len(affitti))
-            col3.metric("🔴 Non Pagate", len(non_pagati))
-            col4.metric("⚠️ Scadenze <60gg", len(scadenze))
-            entrate = sum(float(p.get("affitto_mensile") or 0) for p in affitti)
-            st.metric("💰 Entrate Mensili", f"{entrate:,.2f}€")
-
+            col1.metric("📋 Totale", stats["totale_immobili"])
+            col2.metric("🏠 Affitti", stats["affitti_attivi"])
+            col3.metric("🔴 Non Pagate", stats["non_pagati"])
+            col4.metric(f"⚠️ Scadenze <{settings.SCADENZA_WARNING_GIORNI}gg", stats["in_scadenza"])
+            st.metric("💰 Entrate Mensili", f"{stats['entrate_mensili']:,.2f}€")
+            render_prossime_scadenze()
+            render_morosita()
+
+
+def render_prossime_scadenze(n: int = 5):
+    """Prossime `n` scadenze dall'indice su contratto_fine: si leggono solo quelle righe"""
+    oggi = date.today()
+    prossime = [
+        scadenze.annota(p, oggi, settings.SCADENZA_WARNING_GIORNI)
+        for p in db.get_scadenze(oggi, date.max, limit=n)["items"]
+    ]
+    if prossime:
+        st.subheader("📅 Prossime scadenze")
+        st.dataframe(
+            [{"Immobile": p["nome"], "Inquilino": p.get("affittato_a") or "—", "Scadenza": p["fine"],
+              "Giorni": p["giorni_scadenza"]} for p in prossime],
+            hide_index=True, use_container_width=True,
+        )
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,204 @@
+# src/metrics.py
+"""
+Metriche di processo in formato Prometheus (esposte dall'API su /metrics).
+
+- Latenza e dimensione delle risposte HTTP per route (middleware in api.py).
+- Durata, righe ed errori di ogni chiamata a backend e storage:
+  `DatabaseManager` avvolge entrambi in `Instrumented`.
+- `trace()` raccoglie le chiamate fatte dal thread corrente (un rerun di
+  Streamlit) per il pannello di debug.
+
+Niente dipendenze: istogrammi e contatori minimi, thread-safe.
+"""
+import inspect
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: tuple, le: Optional[str] = None) -> str:
+    pairs = [f'{k}="{_escape(v)}"' for k, v in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, doc: str, labels: Tuple[str, ...]):
+        self.name, self.doc, self.labels = name, doc, labels
+        self._values: Dict[tuple, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, *values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[values] += amount
+
+    def value(self, *values: str) -> float:
+        return self._values.get(values, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, v in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, key)} {v:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labels: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name, self.doc, self.labels, self.buckets = name, doc, labels, buckets
+        # Per serie: [conteggi per bucket..., somma, conteggio]
+        self._series: Dict[tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *values: str) -> None:
+        with self._lock:
+            series = self._series.setdefault(values, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, *values: str) -> int:
+        series = self._series.get(values)
+        return int(series[-1]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, n in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_labels(self.labels, key, f'{bound:g}')} {n:g}")
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, '+Inf')} {series[-1]:g}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, key)} {series[-2]:.6g}")
+                lines.append(f"{self.name}_count{_labels(self.labels, key)} {series[-1]:g}")
+        return lines
+
+
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "Durata delle richieste HTTP",
+                         ("method", "route", "status"), LATENCY_BUCKETS)
+HTTP_SIZE = Histogram("http_response_size_bytes", "Dimensione del corpo delle risposte HTTP",
+                      ("method", "route"), SIZE_BUCKETS)
+CALL_LATENCY = Histogram("backend_call_duration_seconds", "Durata delle chiamate a backend e storage",
+                         ("target", "method"), LATENCY_BUCKETS)
+CALL_ROWS = Histogram("backend_call_rows", "Righe ritornate dalle chiamate a backend e storage",
+                      ("target", "method"), ROWS_BUCKETS)
+CALL_ERRORS = Counter("backend_call_errors_total", "Chiamate a backend e storage finite in eccezione",
+                      ("target", "method", "error"))
+
+ALL = (HTTP_LATENCY, HTTP_SIZE, CALL_LATENCY, CALL_ROWS, CALL_ERRORS)
+
+
+def render() -> str:
+    """Tutte le metriche nel formato testuale di Prometheus (0.0.4)."""
+    return "\n".join(line for metric in ALL for line in metric.render()) + "\n"
+
+
+# --- Traccia per thread (pannello di debug di Streamlit) ----------------------
+_trace = threading.local()
+
+
+@contextmanager
+def trace() -> Iterator[List[Dict[str, Any]]]:
+    """Raccoglie in una lista le chiamate a backend/storage fatte dal thread corrente."""
+    calls: List[Dict[str, Any]] = []
+    previous = getattr(_trace, "calls", None)
+    _trace.calls = calls
+    try:
+        yield calls
+    finally:
+        _trace.calls = previous
+
+
+def _rows(result: Any) -> int:
+    if result is None:
+        return 0
+    if isinstance(result, bool):
+        return int(result)
+    if isinstance(result, int):
+        return result
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple):
+        # changes_since: (righe modificate, id eliminati)
+        return sum(_rows(part) for part in result if isinstance(part, list))
+    return 1
+
+
+def record_call(target: str, method: str, seconds: float, result: Any = None, error: Optional[BaseException] = None) -> None:
+    CALL_LATENCY.observe(seconds, target, method)
+    rows = 0
+    if error is not None:
+        CALL_ERRORS.inc(target, method, type(error).__name__)
+    else:
+        rows = _rows(result)
+        CALL_ROWS.observe(rows, target, method)
+    calls = getattr(_trace, "calls", None)
+    if calls is not None:
+        calls.append({"target": target, "method": method, "secondi": seconds, "righe": rows,
+                      "errore": None if error is None else type(error).__name__})
+
+
+class Instrumented:
+    """
+    Proxy di un backend o storage: i metodi pubblici (sincroni o coroutine)
+    registrano durata, righe ed errori; attributi e assegnazioni passano
+    all'oggetto avvolto.
+    """
+
+    _NOT_TIMED = {"connection", "close", "aclose"}
+
+    def __init__(self, wrapped: Any, target: str):
+        object.__setattr__(self, "wrapped", wrapped)
+        object.__setattr__(self, "target", target)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.wrapped, name)
+        if name.startswith("_") or name in self._NOT_TIMED or not callable(attr):
+            return attr
+        target = self.target
+
+        if inspect.iscoroutinefunction(attr):
+            async def timed_async(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    result = await attr(*args, **kwargs)
+                except Exception as e:
+                    record_call(target, name, time.perf_counter() - start, error=e)
+                    raise
+                record_call(target, name, time.perf_counter() - start, result)
+                return result
+            return timed_async
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = attr(*args, **kwargs)
+            except Exception as e:
+                record_call(target, name, time.perf_counter() - start, error=e)
+                raise
+            record_call(target, name, time.perf_counter() - start, result)
+            return result
+        return timed
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self.wrapped, name, value)
+
+    def __delattr__(self, name: str) -> None:
+        delattr(self.wrapped, name)
+
+
+def unwrap(obj: Any) -> Any:
+    """L'oggetto avvolto da `Instrumented` (o `obj` stesso)."""
+    return obj.wrapped if isinstance(obj, Instrumented) else obj
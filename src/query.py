@@ -0,0 +1,116 @@
+# src/query.py
+"""Helper condivisi dai backend per ordinamento, paginazione keyset, sincronizzazione e registro pagamenti."""
+import base64
+import json
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+# Ordinamenti ammessi (gli stessi proposti dalla sidebar)
+ORDINAMENTI = ["nome", "valore_mq DESC", "contratto_fine ASC"]
+
+
+def parse_order_by(order_by: Optional[str]) -> Tuple[str, bool]:
+    """'valore_mq DESC' -> ('valore_mq', True). Default: nome ascendente."""
+    order_key = (order_by or "nome").split()[0]
+    order_desc = "DESC" in (order_by or "")
+    return order_key, order_desc
+
+
+def encode_cursor(order_by: Optional[str], row: Dict[str, Any]) -> str:
+    """Token opaco che punta subito dopo `row` nell'ordinamento (order_key, id)."""
+    order_key, _ = parse_order_by(order_by)
+    payload = {"o": order_by or "nome", "v": row.get(order_key), "id": row["id"]}
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, order_by: Optional[str]) -> Tuple[Any, int]:
+    """Ritorna (valore chiave, id) dal token; ValueError se non valido o di un altro ordinamento."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        value, last_id, cursor_order = payload["v"], int(payload["id"]), payload["o"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Cursore non valido") from e
+    if cursor_order != (order_by or "nome"):
+        raise ValueError("Il cursore appartiene a un ordinamento diverso")
+    return value, last_id
+
+
+def scadenza_range(filters: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Intervallo (dal, al) inclusivo su contratto_fine, in ISO, dai filtri:
+    `scadenza_dal`/`scadenza_al` espliciti oppure `scadenza_giorni` = N, cioè i
+    contratti che scadono da oggi ai prossimi N giorni (oggi incluso).
+    """
+    dal, al = filters.get("scadenza_dal"), filters.get("scadenza_al")
+    giorni = filters.get("scadenza_giorni")
+    if giorni is not None and giorni is not False:
+        oggi = date.today()
+        dal = dal or oggi
+        al = al or oggi + timedelta(days=int(giorni) - 1)
+    iso = lambda d: d.isoformat() if isinstance(d, date) else d
+    return iso(dal), iso(al)
+
+
+def changes_window(since: datetime, margin_s: float) -> Tuple[datetime, datetime]:
+    """(since in UTC, sync_token) per una lettura incrementale; `since` senza fuso è inteso UTC."""
+    since = since.replace(tzinfo=timezone.utc) if since.tzinfo is None else since.astimezone(timezone.utc)
+    # Token preso prima della lettura, arretrato per scritture in corso e orologi non allineati
+    token = datetime.now(timezone.utc) - timedelta(seconds=margin_s)
+    return since, token
+
+
+def changes_result(since: datetime, token: datetime, changed: List[Dict[str, Any]], deleted: List[int]) -> Dict[str, Any]:
+    # Senza modifiche il token resta `since`: risposta identica, quindi stesso ETag (304)
+    if (not changed and not deleted) or token < since:
+        token = since
+    return {"changed": changed, "deleted": deleted, "sync_token": token.strftime("%Y-%m-%dT%H:%M:%SZ")}
+
+
+# --- Registro pagamenti ---------------------------------------------------------
+AGING_FASCE = ("0_30", "30_60", "60_oltre")  # giorni di ritardo dalla scadenza del canone
+
+
+def mese_corrente(oggi: Optional[date] = None) -> str:
+    return (oggi or date.today()).strftime("%Y-%m")
+
+
+def morosita_params(oggi: date, dal: Optional[str], giorno_scadenza: int) -> Dict[str, Any]:
+    """
+    Parametri delle query su insoluti e aging: sono dovuti i mesi dal più tardo
+    fra `dal` e l'inizio del contratto fino all'ultimo già scaduto a `oggi`
+    (il canone scade il giorno `giorno_scadenza` del mese di competenza).
+    """
+    if oggi.day >= giorno_scadenza:
+        limite = mese_corrente(oggi)
+    else:
+        limite = mese_corrente(oggi.replace(day=1) - timedelta(days=1))
+    return {"oggi": oggi.isoformat(), "dal": dal or "0000-00", "limite": limite, "giorno": giorno_scadenza}
+
+
+def morosita_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Riga di pagamenti_morosita (Supabase) -> stesse chiavi del backend SQLite.
+
+    In SQL `dal` è già il nome di un parametro, la funzione ritorna `dal_mese`.
+    """
+    out = {k: v for k, v in row.items() if k != "dal_mese"}
+    out["dal"] = row.get("dal_mese")
+    return out
+
+
+def aging_result(rows: List[Dict[str, Any]], oggi: date) -> Dict[str, Any]:
+    """Righe (fascia, importo, mensilita) del backend -> report con tutte le fasce, anche vuote."""
+    by_fascia = {r["fascia"]: r for r in rows}
+    fasce = [
+        {"fascia": f,
+         "importo": round(float(by_fascia.get(f, {}).get("importo") or 0), 2),
+         "mensilita": int(by_fascia.get(f, {}).get("mensilita") or 0)}
+        for f in AGING_FASCE
+    ]
+    return {
+        "al": oggi.isoformat(),
+        "totale": round(sum(f["importo"] for f in fasce), 2),
+        "mensilita": sum(f["mensilita"] for f in fasce),
+        "fasce": fasce,
+    }
@@ -0,0 +1,137 @@
+# src/records.py
+"""
+Rappresentazioni compatte delle proprietà, in alternativa alle liste di dict.
+
+- `Proprieta`: record tipizzato con `__slots__` (niente dict per istanza).
+- `ProprietaBatch`: il portafoglio a colonne. Numeri in array float64, id in
+  int64, `mensilita_pagata` in array bool, testi ripetitivi (categorie, date,
+  inquilini...) come `pd.Categorical`, gli altri testi in array di oggetti.
+  `to_frame()` ne fa un DataFrame senza copiare le colonne.
+
+`DatabaseManager.get_proprieta_batch` / `get_proprieta_records` le ritornano
+su richiesta; tutte le altre letture restano a dict come il JSON dei backend.
+"""
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass(frozen=True, slots=True)
+class Proprieta:
+    id: int
+    nome: str
+    indirizzo: str
+    mq_effettivi: float
+    mq_commerciali: float
+    valore_mq: float
+    affittato_a: Optional[str] = None
+    affitto_mensile: float = 0.0
+    contratto_inizio: Optional[str] = None
+    contratto_fine: Optional[str] = None
+    mensilita_pagata: bool = False
+    immagine_path: Optional[str] = None
+    immagine_url: Optional[str] = None
+    miniatura_path: Optional[str] = None
+    miniatura_url: Optional[str] = None
+    immagine_sha256: Optional[str] = None
+    contratto_path: Optional[str] = None
+    contratto_url: Optional[str] = None
+    contratto_sha256: Optional[str] = None
+    foglio: Optional[float] = None
+    particella: Optional[float] = None
+    subalterno: Optional[float] = None
+    zona_cens: Optional[str] = None
+    categoria: Optional[str] = None
+    classe: Optional[str] = None
+    quota: Optional[str] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, row: Dict[str, Any]) -> "Proprieta":
+        """Riga del backend -> record (le colonne sconosciute sono ignorate)."""
+        values = {k: row[k] for k in COLUMNS if k in row}
+        values["mensilita_pagata"] = bool(values.get("mensilita_pagata"))
+        if values.get("affitto_mensile") is None:
+            values["affitto_mensile"] = 0.0
+        return cls(**values)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+COLUMNS = [f.name for f in fields(Proprieta)]
+INT_COLUMNS = ["id"]
+FLOAT_COLUMNS = ["mq_effettivi", "mq_commerciali", "valore_mq", "affitto_mensile", "foglio", "particella", "subalterno"]
+BOOL_COLUMNS = ["mensilita_pagata"]
+MAX_QUOTA_DISTINTI = 0.5  # testi con meno valori distinti di metà delle righe diventano categorici
+
+Colonna = Union[np.ndarray, pd.Categorical]
+
+
+def _testo(values: List[Any]) -> Colonna:
+    codes, uniques = pd.factorize(np.array(values, dtype=object), use_na_sentinel=True)
+    if len(uniques) <= len(values) * MAX_QUOTA_DISTINTI:
+        return pd.Categorical.from_codes(codes, categories=pd.Index(uniques, dtype=object))
+    return np.array(values, dtype=object)
+
+
+def _python(value: Any) -> Any:
+    """Scalare numpy/pandas -> Python nativo, NaN -> None."""
+    if value is None or (isinstance(value, float) and np.isnan(value)) or value is pd.NA:
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class ProprietaBatch:
+    """Portafoglio a colonne (le colonne sono condivise con `to_frame()`: vanno trattate in sola lettura)."""
+
+    def __init__(self, columns: Dict[str, Colonna]):
+        self.columns = columns
+        self._len = len(next(iter(columns.values()))) if columns else 0
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]]) -> "ProprietaBatch":
+        columns: Dict[str, Colonna] = {}
+        for key in COLUMNS:
+            values = [r.get(key) for r in rows]
+            if key in INT_COLUMNS:
+                columns[key] = np.array(values, dtype=np.int64)
+            elif key in FLOAT_COLUMNS:
+                columns[key] = np.array(values, dtype=np.float64)  # None -> NaN
+            elif key in BOOL_COLUMNS:
+                columns[key] = np.fromiter((bool(v) for v in values), dtype=bool, count=len(values))
+            else:
+                columns[key] = _testo(values)
+        return cls(columns)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, i: int) -> Proprieta:
+        return Proprieta(**{k: _python(col[i]) for k, col in self.columns.items()})
+
+    def __iter__(self) -> Iterator[Proprieta]:
+        return (self[i] for i in range(self._len))
+
+    def records(self) -> List[Proprieta]:
+        return list(self)
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return [r.to_dict() for r in self]
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame sulle stesse colonne (nessuna copia dei dati)."""
+        return pd.DataFrame(self.columns, copy=False)
+
+    def nbytes(self) -> int:
+        """Memoria delle colonne (per i testi non categorici conta solo l'array di puntatori)."""
+        total = 0
+        for col in self.columns.values():
+            if isinstance(col, pd.Categorical):
+                total += col.codes.nbytes + int(col.categories.memory_usage(deep=True))
+            else:
+                total += col.nbytes
+        return total
@@ -0,0 +1,454 @@
+# src/replica.py
+"""
+Replica locale offline-first (DB_BACKEND="replica").
+
+L'app legge e scrive solo sul file SQLite locale; ogni scrittura finisce anche
+in `sync_outbox`, nella stessa transazione, compresi i versamenti del registro
+pagamenti (op "pagamento"): il flag mensilita_pagata che ne deriva lo
+ricalcola il trigger remoto quando il versamento arriva. Il cambio del mese di
+riferimento viene replicato sul remoto prima di spedire l'outbox. `SyncWorker` in un thread di
+background spinge l'outbox verso Supabase e scarica le modifiche remote per
+updated_at (con i tombstone delle eliminazioni): il remoto lo tocca solo lui.
+
+I versamenti remoti si scaricano per created_at e `sync_pagamenti` lega ogni id
+remoto a quello locale, così nessuno entra due volte. Dal remoto il flag
+mensilita_pagata arriva solo quando si spegne: acceso lo ricalcola il trigger
+locale dal versamento scaricato, senza registrare un canone intero al posto di
+un pagamento parziale.
+
+Conflitti: last-writer-wins per campo. Se un campo modificato in locale è
+cambiato anche in remoto (il valore remoto non è più quello su cui si basava
+la modifica locale), vince la scrittura più recente fra l'ora della modifica
+locale e updated_at remoto. Ogni conflitto è registrato in `sync_conflitti`.
+"""
+import json
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    from . import settings
+    from .db_sqlite import SQLiteBackend
+    from .query import changes_window, changes_result
+except ImportError:
+    import settings
+    from db_sqlite import SQLiteBackend
+    from query import changes_window, changes_result
+
+REPLICA_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_outbox (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL CHECK(op IN ('insert', 'update', 'delete', 'pagamento')),
+    prop_id INTEGER NOT NULL,  -- negativo finché l'inserimento non è arrivato al remoto
+    data TEXT,                 -- JSON dei campi scritti (del versamento per "pagamento")
+    base TEXT,                 -- JSON dei valori precedenti (solo update)
+    created_at TEXT NOT NULL   -- ora UTC della modifica locale
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_prop ON sync_outbox(prop_id);
+
+CREATE TABLE IF NOT EXISTS sync_stato (
+    chiave TEXT PRIMARY KEY,
+    valore TEXT
+);
+
+-- Versamenti remoti già presenti in locale (scaricati, inviati o registrati dai trigger del flag)
+CREATE TABLE IF NOT EXISTS sync_pagamenti (
+    remoto_id INTEGER PRIMARY KEY,
+    locale_id INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sync_conflitti (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    prop_id INTEGER NOT NULL,
+    campo TEXT,                -- NULL: riga eliminata in remoto
+    locale TEXT,
+    remoto TEXT,
+    vincitore TEXT NOT NULL CHECK(vincitore IN ('locale', 'remoto')),
+    risolto_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+TIMESTAMP_COLUMNS = ("created_at", "updated_at")
+
+
+def _utc(ts: Any) -> Optional[datetime]:
+    """Timestamp SQLite ('YYYY-MM-DD HH:MM:SS', UTC) o ISO di Postgres -> datetime UTC."""
+    if not ts:
+        return None
+    if isinstance(ts, datetime):
+        dt = ts
+    else:
+        dt = datetime.fromisoformat(str(ts).replace("Z", "+00:00"))
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class ReplicaBackend(SQLiteBackend):
+    """
+    `SQLiteBackend` che accoda ogni scrittura in `sync_outbox`. Le righe create
+    offline hanno id negativi, sostituiti dall'id remoto al primo invio.
+    """
+
+    def _init_schema(self, conn) -> None:
+        super()._init_schema(conn)
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'sync_outbox'").fetchone()
+        if row is not None and "'pagamento'" not in row[0]:
+            # Outbox creata prima del registro pagamenti: nuovo CHECK, voci in coda conservate
+            conn.executescript(
+                "ALTER TABLE sync_outbox RENAME TO sync_outbox_old; DROP INDEX IF EXISTS idx_outbox_prop;"
+                + REPLICA_SCHEMA
+                + "INSERT INTO sync_outbox SELECT * FROM sync_outbox_old; DROP TABLE sync_outbox_old;"
+            )
+        conn.executescript(REPLICA_SCHEMA)
+
+    # --- Scritture locali + outbox ------------------------------------------
+    @staticmethod
+    def _enqueue(conn, op: str, prop_id: int, data: Optional[Dict] = None, base: Optional[Dict] = None) -> None:
+        conn.execute(
+            "INSERT INTO sync_outbox (op, prop_id, data, base, created_at) VALUES (?, ?, ?, ?, ?)",
+            (op, prop_id,
+             None if data is None else json.dumps(data, default=str),
+             None if base is None else json.dumps(base, default=str),
+             _now()),
+        )
+
+    def insert(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with self.connection() as conn:
+            # Id temporaneo mai usato né dalle righe né dall'outbox
+            temp_id = conn.execute(
+                "SELECT MIN(0, COALESCE((SELECT MIN(id) FROM proprieta), 0), "
+                "COALESCE((SELECT MIN(prop_id) FROM sync_outbox), 0)) - 1"
+            ).fetchone()[0]
+            row = super().insert({**data, "id": temp_id})
+            self._enqueue(conn, "insert", temp_id, {k: row[k] for k in data if k != "id"})
+        return row
+
+    def insert_many(self, rows: List[Dict[str, Any]]) -> List[Optional[int]]:
+        with self.connection():
+            return [self.insert(data)["id"] for data in rows]
+
+    def update(self, prop_id: int, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with self.connection() as conn:
+            before = self.get(prop_id)
+            row = super().update(prop_id, data)
+            if before is not None and row is not None:
+                changed = [k for k in data if k not in TIMESTAMP_COLUMNS and before.get(k) != row.get(k)]
+                if changed:
+                    self._enqueue(conn, "update", prop_id,
+                                  {k: row[k] for k in changed}, {k: before.get(k) for k in changed})
+        return row
+
+    def update_many(self, rows: List[Dict[str, Any]]) -> List[int]:
+        with self.connection():
+            updated = [self.update(data["id"], {k: v for k, v in data.items() if k != "id"}) for data in rows]
+        return [row["id"] for row in updated if row]
+
+    def delete(self, prop_id: int) -> bool:
+        with self.connection() as conn:
+            deleted = super().delete(prop_id)
+            if deleted and prop_id < 0:
+                # Mai arrivata al remoto: basta dimenticare le modifiche in coda
+                conn.execute("DELETE FROM sync_outbox WHERE prop_id = ?", (prop_id,))
+            elif deleted:
+                self._enqueue(conn, "delete", prop_id)
+        return deleted
+
+    def delete_many(self, ids: List[int]) -> int:
+        with self.connection():
+            return sum(self.delete(prop_id) for prop_id in ids)
+
+    def set_mensilita_pagata(self, ids: Optional[List[int]], pagata: bool) -> List[int]:
+        with self.connection() as conn:
+            changed = super().set_mensilita_pagata(ids, pagata)
+            for prop_id in changed:
+                self._enqueue(conn, "update", prop_id, {"mensilita_pagata": pagata}, {"mensilita_pagata": not pagata})
+        return changed
+
+    def insert_pagamenti(self, rows: List[Dict[str, Any]]) -> List[int]:
+        with self.connection() as conn:
+            ids = super().insert_pagamenti(rows)
+            for r, locale_id in zip(rows, ids):
+                self._enqueue(conn, "pagamento", r["proprieta_id"],
+                              {"id": locale_id, **{k: r[k] for k in ("mese", "importo", "pagato_il")}})
+        return ids
+
+    # --- Usati da SyncWorker: niente outbox ----------------------------------
+    def mese_riferimento(self) -> Optional[str]:
+        """Mese di riferimento di mensilita_pagata (vedi refresh_mensilita)."""
+        with self.connection() as conn:
+            row = conn.execute("SELECT mese FROM mensilita_mese WHERE id = 1").fetchone()
+        return row[0] if row else None
+
+    def next_outbox(self) -> Optional[Dict[str, Any]]:
+        with self.connection() as conn:
+            row = conn.execute("SELECT * FROM sync_outbox ORDER BY seq LIMIT 1").fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry["data"] = json.loads(entry["data"]) if entry["data"] else {}
+        entry["base"] = json.loads(entry["base"]) if entry["base"] else {}
+        return entry
+
+    def ack(self, seq: int) -> None:
+        with self.connection() as conn:
+            conn.execute("DELETE FROM sync_outbox WHERE seq = ?", (seq,))
+
+    def pending(self) -> int:
+        with self.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM sync_outbox").fetchone()[0]
+
+    def _local_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        data = {k: v for k, v in row.items() if k in self.columns}
+        for col in TIMESTAMP_COLUMNS:
+            if data.get(col):
+                data[col] = _utc(data[col]).strftime("%Y-%m-%d %H:%M:%S")
+        return data
+
+    def apply_remote(self, row: Dict[str, Any]) -> None:
+        """Scrive una riga remota; i campi con modifiche locali ancora da inviare restano locali."""
+        data = self._local_row(row)
+        with self.connection() as conn:
+            pending = conn.execute(
+                "SELECT op, data FROM sync_outbox WHERE prop_id = ? ORDER BY seq", (row["id"],)
+            ).fetchall()
+            if any(op == "delete" for op, _ in pending):
+                return
+            if data.get("mensilita_pagata"):
+                # Lo accende il versamento scaricato con apply_remote_pagamenti: scritto
+                # qui, il trigger locale registrerebbe il canone intero
+                data.pop("mensilita_pagata")
+            for op, fields in pending:
+                if op == "pagamento":
+                    # Il remoto non ha ancora il versamento: il flag locale è quello giusto
+                    data.pop("mensilita_pagata", None)
+                else:
+                    data.update(json.loads(fields or "{}"))
+            if SQLiteBackend.get(self, row["id"]) is None:
+                SQLiteBackend.insert(self, data)
+            else:
+                SQLiteBackend.update(self, row["id"], {k: v for k, v in data.items() if k != "id"})
+
+    def apply_remote_pagamenti(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Registra i versamenti remoti non ancora presenti; ritorna quanti ne ha
+        aggiunti. Un versamento creato dal trigger remoto per un flag segnato in
+        locale esiste già qui (trigger locale): si lega a quello, non si duplica.
+        """
+        nuovi = 0
+        with self.connection() as conn:
+            for p in rows:
+                if conn.execute("SELECT 1 FROM sync_pagamenti WHERE remoto_id = ?", (p["id"],)).fetchone():
+                    continue
+                if SQLiteBackend.get(self, p["proprieta_id"]) is None:
+                    continue  # immobile eliminato in locale o in remoto
+                gemello = conn.execute(
+                    "SELECT id FROM pagamenti WHERE proprieta_id = ? AND mese = ? AND importo = ? "
+                    "AND id NOT IN (SELECT locale_id FROM sync_pagamenti) "
+                    "AND id NOT IN (SELECT json_extract(data, '$.id') FROM sync_outbox "
+                    "WHERE op = 'pagamento' AND json_extract(data, '$.id') IS NOT NULL) "
+                    "ORDER BY id LIMIT 1",
+                    (p["proprieta_id"], p["mese"], p["importo"]),
+                ).fetchone()
+                if gemello is None:
+                    locale_id = SQLiteBackend.insert_pagamenti(self, [p])[0]
+                    nuovi += 1
+                else:
+                    locale_id = gemello[0]
+                self.link_pagamento(locale_id, p["id"])
+        return nuovi
+
+    def link_pagamento(self, locale_id: int, remoto_id: int) -> None:
+        with self.connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO sync_pagamenti (remoto_id, locale_id) VALUES (?, ?)",
+                         (remoto_id, locale_id))
+
+    def apply_remote_delete(self, prop_id: int) -> None:
+        with self.connection() as conn:
+            pending = conn.execute(
+                "SELECT data FROM sync_outbox WHERE prop_id = ? AND op = 'update' ORDER BY seq", (prop_id,)
+            ).fetchall()
+            for (fields,) in pending:
+                self.log_conflict(prop_id, None, fields, None, "remoto")
+            conn.execute("DELETE FROM sync_outbox WHERE prop_id = ?", (prop_id,))
+            SQLiteBackend.delete(self, prop_id)
+
+    def replace_temp(self, temp_id: int, row: Dict[str, Any]) -> None:
+        """
+        Dopo l'invio di una riga creata offline: id remoto al posto di quello
+        temporaneo, sul posto. Eliminare e reinserire la riga cancellerebbe in
+        cascata i suoi versamenti; con i vincoli differiti si spostano prima i
+        versamenti e poi la riga (`nome = nome` riallinea l'indice full-text).
+        """
+        with self.connection() as conn:
+            conn.execute("PRAGMA defer_foreign_keys = ON")
+            conn.execute("UPDATE sync_outbox SET prop_id = ? WHERE prop_id = ?", (row["id"], temp_id))
+            conn.execute("UPDATE pagamenti SET proprieta_id = ? WHERE proprieta_id = ?", (row["id"], temp_id))
+            conn.execute("UPDATE proprieta SET id = ?, nome = nome WHERE id = ?", (row["id"], temp_id))
+            self.apply_remote(row)
+
+    def log_conflict(self, prop_id: int, campo: Optional[str], locale: Any, remoto: Any, vincitore: str) -> None:
+        with self.connection() as conn:
+            conn.execute(
+                "INSERT INTO sync_conflitti (prop_id, campo, locale, remoto, vincitore) VALUES (?, ?, ?, ?, ?)",
+                (prop_id, campo,
+                 None if locale is None else str(locale),
+                 None if remoto is None else str(remoto),
+                 vincitore),
+            )
+
+    def conflicts(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self.connection() as conn:
+            rows = conn.execute("SELECT * FROM sync_conflitti ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(r) for r in rows]
+
+    def get_stato(self, chiave: str) -> Optional[str]:
+        with self.connection() as conn:
+            row = conn.execute("SELECT valore FROM sync_stato WHERE chiave = ?", (chiave,)).fetchone()
+        return row[0] if row else None
+
+    def set_stato(self, chiave: str, valore: str) -> None:
+        with self.connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO sync_stato (chiave, valore) VALUES (?, ?)", (chiave, valore))
+
+
+class SyncWorker:
+    """
+    Sincronizza `replica` con `remote` (SupabaseBackend, o qualsiasi backend con
+    insert/get/update/delete/changes_since/insert_pagamenti/pagamenti_since/
+    refresh_mensilita)
+    ogni `interval` secondi in un thread
+    daemon. `sync_once()` esegue un giro: prima l'outbox, poi le modifiche remote.
+    """
+
+    def __init__(
+        self,
+        replica: ReplicaBackend,
+        remote,
+        *,
+        interval: float = settings.REPLICA_SYNC_INTERVAL_S,
+        on_change: Optional[Callable[[], None]] = None,
+    ):
+        self.replica = replica
+        self.remote = remote
+        self.interval = interval
+        self.on_change = on_change
+        self.last_sync: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Avvia il thread (idempotente: Streamlit riesegue lo script a ogni interazione)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="replica-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sync_once()
+            except Exception:
+                pass  # rete assente o remoto non raggiungibile: si riprova al prossimo giro
+            self._stop.wait(self.interval)
+
+    def sync_once(self) -> Dict[str, int]:
+        with self._lock:
+            try:
+                inviati = self.push()
+                ricevuti = self.pull()
+            except Exception as e:
+                self.last_error = str(e)
+                raise
+            self.last_sync = datetime.now(timezone.utc)
+            self.last_error = None
+        if (inviati or ricevuti) and self.on_change:
+            self.on_change()
+        return {"inviati": inviati, "ricevuti": ricevuti}
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "pendenti": self.replica.pending(),
+            "ultimo_sync": self.last_sync,
+            "ultimo_errore": self.last_error,
+            "conflitti": self.replica.conflicts(10),
+        }
+
+    # --- Invio ---------------------------------------------------------------
+    def push(self) -> int:
+        """Spedisce l'outbox in ordine; un errore interrompe il giro e la voce resta in coda."""
+        inviati = 0
+        mese = self.replica.mese_riferimento()
+        if mese and mese != self.replica.get_stato("mese_remoto"):
+            # Prima dei versamenti: il trigger remoto aggiorna il flag solo per il suo mese corrente
+            self.remote.refresh_mensilita(mese)
+            self.replica.set_stato("mese_remoto", mese)
+        while (entry := self.replica.next_outbox()) is not None:
+            prop_id, data = entry["prop_id"], entry["data"]
+            if entry["op"] == "insert":
+                self.replica.replace_temp(prop_id, self.remote.insert(data))
+                self.replica.ack(entry["seq"])
+            elif entry["op"] == "update":
+                row = self._push_update(prop_id, data, entry["base"], _utc(entry["created_at"]))
+                self.replica.ack(entry["seq"])
+                if row is not None:
+                    self.replica.apply_remote(row)
+            elif entry["op"] == "pagamento":
+                locale_id = data.pop("id", None)
+                [remoto_id] = self.remote.insert_pagamenti([{"proprieta_id": prop_id, **data}])
+                if locale_id is not None:
+                    self.replica.link_pagamento(locale_id, remoto_id)
+                self.replica.ack(entry["seq"])
+            else:
+                self.remote.delete(prop_id)
+                self.replica.ack(entry["seq"])
+            inviati += 1
+        return inviati
+
+    def _push_update(self, prop_id: int, data: Dict, base: Dict, changed_at: datetime) -> Optional[Dict]:
+        remote = self.remote.get(prop_id)
+        if remote is None:
+            # Eliminata in remoto: la modifica locale si perde (il pull rimuove la riga)
+            self.replica.log_conflict(prop_id, None, json.dumps(data, default=str), None, "remoto")
+            return None
+        remote_at = _utc(remote.get("updated_at"))
+        winners = {}
+        for field, value in data.items():
+            theirs = remote.get(field)
+            if theirs == base.get(field) or theirs == value:
+                winners[field] = value
+                continue
+            # Campo cambiato da entrambe le parti: vince la scrittura più recente
+            local_wins = remote_at is None or changed_at >= remote_at
+            self.replica.log_conflict(prop_id, field, value, theirs, "locale" if local_wins else "remoto")
+            if local_wins:
+                winners[field] = value
+        return self.remote.update(prop_id, winners) if winners else remote
+
+    # --- Ricezione -----------------------------------------------------------
+    def pull(self) -> int:
+        since = _utc(self.replica.get_stato("sync_token")) or datetime(1970, 1, 1, tzinfo=timezone.utc)
+        since, token = changes_window(since, settings.SYNC_CLOCK_MARGIN_S)
+        changed, deleted = self.remote.changes_since(since)
+        # Versamenti letti dopo le righe: ogni flag acceso nelle righe ha il suo versamento
+        pag_since = _utc(self.replica.get_stato("pagamenti_token")) or datetime(1970, 1, 1, tzinfo=timezone.utc)
+        pag_since, pag_token = changes_window(pag_since, settings.SYNC_CLOCK_MARGIN_S)
+        pagamenti = self.remote.pagamenti_since(pag_since)
+        for row in changed:
+            self.replica.apply_remote(row)
+        for prop_id in deleted:
+            self.replica.apply_remote_delete(prop_id)
+        nuovi = self.replica.apply_remote_pagamenti(pagamenti)
+        self.replica.set_stato("sync_token", changes_result(since, token, changed, deleted)["sync_token"])
+        self.replica.set_stato("pagamenti_token", changes_result(pag_since, pag_token, pagamenti, [])["sync_token"])
+        return len(changed) + len(deleted) + nuovi
@@ -0,0 +1,105 @@
+# src/scadenze.py
+"""
+Date dei contratti e stato delle proprietà calcolati una volta sola.
+
+`Portafoglio` prende le righe lette dal backend, converte `contratto_inizio` e
+`contratto_fine` in `date`, aggiunge giorni alla scadenza e stato, e tiene un
+indice delle scadenze ordinato: "prossime N scadenze" e "in scadenza entro D
+giorni" sono ricerche binarie. `DatabaseManager.get_portafoglio` lo tiene in
+cache, quindi i rerun di Streamlit non rileggono né riconvertono le date.
+"""
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+LIBERO = "libero"
+ATTIVO = "attivo"
+IN_SCADENZA = "in_scadenza"
+SCADUTO = "scaduto"
+NON_PAGATO = "non_pagato"
+STATI = (LIBERO, ATTIVO, IN_SCADENZA, SCADUTO, NON_PAGATO)
+
+
+def _data(value: Any) -> Optional[date]:
+    """ISO (anche con orario) o date -> date; ValueError se il testo non è una data."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def annota(row: Dict[str, Any], oggi: date, giorni_avviso: int) -> Dict[str, Any]:
+    """
+    Aggiunge a `row` (in place) inizio, fine (date o None), giorni_scadenza,
+    stato e date_non_valide (campi con testo non convertibile, che non contano
+    come scadenza invece di diventare un "mai" silenzioso).
+
+    Stato di un affitto, in ordine di priorità: scaduto, non_pagato,
+    in_scadenza (da oggi ai prossimi `giorni_avviso` giorni esclusi), attivo.
+    """
+    non_valide = []
+    for campo, chiave in (("contratto_inizio", "inizio"), ("contratto_fine", "fine")):
+        try:
+            row[chiave] = _data(row.get(campo))
+        except ValueError:
+            row[chiave] = None
+            non_valide.append(campo)
+    fine = row["fine"]
+    giorni = (fine - oggi).days if fine else None
+
+    if not row.get("affittato_a"):
+        stato = LIBERO
+    elif giorni is not None and giorni < 0:
+        stato = SCADUTO
+    elif not row.get("mensilita_pagata"):
+        stato = NON_PAGATO
+    elif giorni is not None and giorni < giorni_avviso:
+        stato = IN_SCADENZA
+    else:
+        stato = ATTIVO
+    row.update(giorni_scadenza=giorni, stato=stato, date_non_valide=non_valide)
+    return row
+
+
+class Portafoglio:
+    """
+    Righe annotate con `annota` e indice delle scadenze (fine, id) ordinato.
+    È condiviso dalla cache: righe e indice vanno trattati in sola lettura.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]], oggi: date, giorni_avviso: int):
+        self.oggi = oggi
+        self.giorni_avviso = giorni_avviso
+        self.righe = [annota(r, oggi, giorni_avviso) for r in rows]
+        per_fine = sorted((r for r in self.righe if r["fine"]), key=lambda r: (r["fine"], r["id"]))
+        self._fine = [r["fine"] for r in per_fine]
+        self._per_fine = per_fine
+        self.conteggi: Dict[str, int] = {s: 0 for s in STATI}
+        self.conteggi.update(Counter(r["stato"] for r in self.righe))
+
+    def __len__(self) -> int:
+        return len(self.righe)
+
+    def prossime(self, n: int) -> List[Dict[str, Any]]:
+        """Le prossime `n` scadenze da oggi (incluso)."""
+        start = bisect_left(self._fine, self.oggi)
+        return self._per_fine[start:start + n]
+
+    def in_scadenza(self, giorni: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Contratti che scadono da oggi ai prossimi `giorni` giorni esclusi (default: soglia di avviso)."""
+        giorni = self.giorni_avviso if giorni is None else giorni
+        start = bisect_left(self._fine, self.oggi)
+        end = bisect_left(self._fine, self.oggi + timedelta(days=giorni))
+        return self._per_fine[start:end]
+
+    def scaduti(self) -> List[Dict[str, Any]]:
+        """Contratti con fine prima di oggi, dal più vecchio."""
+        return self._per_fine[:bisect_left(self._fine, self.oggi)]
+
+    def scadenze_fra(self, dal: date, al: date) -> List[Dict[str, Any]]:
+        """Contratti con fine fra `dal` e `al` inclusi."""
+        return self._per_fine[bisect_left(self._fine, dal):bisect_right(self._fine, al)]
@@ -1,4 +1,5 @@
 # src/settings.py
+import os
 from pathlib import Path
 from typing import Literal
 
@@ -6,17 +7,58 @@ from typing import Literal
 BASE_DIR = Path(__file__).parent.parent
 DATA_DIR = BASE_DIR / "data"
 IMAGES_DIR = DATA_DIR / "images"
-DB_PATH = DATA_DIR / "immobiliare.db"
+DB_PATH = Path(os.getenv("DB_PATH") or DATA_DIR / "immobiliare.db")
+SCHEMA_PATH = BASE_DIR / "schema.sql"
 
 # Crea cartelle se non esistono
 DATA_DIR.mkdir(exist_ok=True)
 IMAGES_DIR.mkdir(exist_ok=True)
 
+# Backend dati: "supabase" (cloud), "sqlite" (installazione locale su DB_PATH)
+# oppure "replica" (SQLite locale su DB_PATH sincronizzato in background con Supabase)
+DB_BACKEND: Literal["supabase", "sqlite", "replica"] = os.getenv("DB_BACKEND", "supabase")  # type: ignore[assignment]
+SQLITE_POOL_SIZE = 4          # connessioni condivise fra i thread di FastAPI/Streamlit
+SQLITE_STATEMENT_CACHE = 256  # prepared statements riutilizzati per connessione
+SQLITE_BUSY_TIMEOUT_S = 5.0
+
+# Client HTTP async dell'API verso PostgREST (un pool condiviso da tutte le richieste)
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE = 20        # connessioni tenute aperte fra una richiesta e l'altra
+HTTP_KEEPALIVE_EXPIRY_S = 30.0
+HTTP_TIMEOUT_S = 10.0
+
+# Cache letture in DatabaseManager (invalidata a ogni scrittura dello stesso processo)
+CACHE_ENABLED = os.getenv("DB_CACHE", "1") != "0"
+CACHE_TTL_S = 30.0       # tetto alla latenza con cui si vedono modifiche fatte da altri processi
+CACHE_MAX_ENTRIES = 256
+SIGNED_URL_REFRESH_MARGIN_S = 300  # un URL firmato in cache può durare fino a 5 minuti meno di quanto richiesto
+
+# Import/Export Excel
+IMPORT_BATCH_SIZE = 500  # righe per singola scrittura bulk
+EXPORT_PAGE_SIZE = 1000  # righe lette per pagina durante l'export
+EXPORT_SPOOL_MAX_BYTES = 8 * 1024 * 1024  # oltre questa soglia l'export in streaming passa su disco
+
 # Configurazione sincronizzazione
 SYNC_MODE: Literal["local", "api"] = "local"
 API_BASE_URL = "http://localhost:8000"  # Modificare per server remoto
+SYNC_CLOCK_MARGIN_S = 5  # il sync_token della sincronizzazione incrementale arretra di qualche secondo
+GZIP_MIN_BYTES = 1024    # risposte API più piccole non vengono compresse
+REPLICA_SYNC_INTERVAL_S = 30  # giro di sincronizzazione della replica locale (DB_BACKEND="replica")
 
 # Limiti e validazioni
 MAX_IMAGE_SIZE_MB = 5
 SUPPORTED_IMAGE_FORMATS = [".jpg", ".jpeg", ".png", ".webp"]
-SCADENZA_WARNING_GIORNI = 60
\ No newline at end of file
+IMAGE_MAX_SIDE_PX = 1600  # versione mostrata nella scheda
+THUMB_MAX_SIDE_PX = 320   # miniatura per elenchi
+WEBP_QUALITY = 80
+UPLOAD_WORKERS = 8  # upload paralleli nel caricamento massivo degli allegati
+SCADENZA_WARNING_GIORNI = 60
+
+# Registro pagamenti
+GIORNO_SCADENZA_AFFITTO = 5  # il canone del mese scade in questo giorno; da lì partono i giorni di ritardo
+# Primo mese (AAAA-MM) tenuto nel registro: i mesi precedenti non contano come insoluti.
+# Da impostare al mese di adozione se i contratti sono iniziati prima.
+PAGAMENTI_DAL = os.getenv("PAGAMENTI_DAL")
+
+# Pannello di debug in Streamlit: chiamate a backend/storage e tempi di ogni rerun
+DEBUG_PANEL = os.getenv("DEBUG_PANEL") == "1"
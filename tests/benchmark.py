@@ -0,0 +1,248 @@
+# benchmark.py
+"""
+Benchmark riproducibile su portafogli sintetici (vedi generate_portfolio.py),
+backend SQLite locale, cache disattivata.
+
+    python -m tests.benchmark --sizes 1000 10000 100000 --out benchmarks/v1.4.json
+    python -m tests.benchmark --sizes 10000 --baseline benchmarks/v1.4.json
+
+Misura import/export Excel, `get_all_proprieta` con ogni filtro, la ricerca,
+`get_analytics`, la proiezione dei canoni a 60 mesi, `/stats` e `/proprieta`
+paginato (tutte le pagine col cursore). Il risultato è un JSON con un record
+per (operazione, dimensione); con `--baseline` le operazioni più lente della
+soglia vengono segnalate e l'uscita è 1.
+
+    python -m tests.benchmark --startup
+
+misura invece l'import a freddo di `src.db` e `src.api` in un interprete
+nuovo (backend Supabase senza credenziali: il client nasce al primo uso) e
+fallisce se supera STARTUP_BUDGET_S o se all'avvio si caricano pandas,
+openpyxl, Pillow o il client Supabase.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    from . import generate_portfolio as gen
+except ImportError:
+    import generate_portfolio as gen
+
+from fastapi.testclient import TestClient
+
+from src import api, excel_io as excel_module
+from src.db import DatabaseManager
+from src.db_async import AsyncDatabaseManager
+from src.excel_io import ExcelIO
+
+FILTRI = {
+    "tutte": None,
+    "solo_affitti": {"solo_affitti": True},
+    "non_pagati": {"non_pagati": True},
+    "scadenza_60g": {"scadenza_giorni": 60},
+    "per_valore": {"order_by": "valore_mq DESC"},
+}
+RICERCHE = ["Milano", "trilocale roma", "Rossi"]
+PAGE_SIZE = 1000
+REGRESSION_RATIO = 1.2  # più lento del 20% rispetto alla baseline...
+REGRESSION_MIN_S = 0.005  # ...e di almeno 5 ms (sotto è rumore di misura)
+
+ROOT = Path(__file__).resolve().parent.parent
+STARTUP_BUDGET_S = {"src.db": 0.3, "src.api": 1.0}  # import a freddo, mediana
+MODULI_PESANTI = ["pandas", "numpy", "openpyxl", "PIL", "supabase", "postgrest"]
+
+
+def _time(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return {"median_s": statistics.median(runs), "min_s": min(runs), "runs": repeat}
+
+
+def _use(db: DatabaseManager, adb: AsyncDatabaseManager) -> tuple:
+    """Stesso aggancio dei test: i moduli leggono il `db` globale. Ritorna i precedenti."""
+    previous = (excel_module.db, api.adb)
+    excel_module.db, api.adb = db, adb
+    return previous
+
+
+def _walk_pages(client: TestClient) -> int:
+    righe, cursor = 0, None
+    while True:
+        params = {"limit": PAGE_SIZE, **({"cursor": cursor} if cursor else {})}
+        resp = client.get("/proprieta", params=params)
+        resp.raise_for_status()
+        righe += len(resp.json())
+        cursor = resp.headers.get("X-Next-Cursor")
+        if not cursor:
+            return righe
+
+
+def run_size(n: int, seed: int, repeat: int, workdir: Path) -> List[Dict[str, Any]]:
+    results = []
+
+    def record(op: str, timing: Dict[str, float]) -> None:
+        results.append({"op": op, "n": n, **timing})
+        print(f"  {op:<28} n={n:<8} {timing['median_s'] * 1000:10.1f} ms")
+
+    df = gen.genera_portafoglio(n, seed)
+    db = DatabaseManager(workdir / f"bench_{n}.db", cache=False)
+    previous = _use(db, AsyncDatabaseManager(db))
+    try:
+        _measure(n, df, db, repeat, workdir, record)
+    finally:
+        _use(*previous)
+        db.backend.close()
+    return results
+
+
+def _measure(n: int, df, db: DatabaseManager, repeat: int, workdir: Path, record) -> None:
+    # Scritture: una sola esecuzione (i nomi sono UNIQUE)
+    if n <= gen.EXCEL_MAX_ROWS:
+        sheet = gen.write_excel(df, workdir / f"portafoglio_{n}.xlsx")
+        record("import_from_excel", _time(lambda: ExcelIO.import_from_excel(sheet), 1))
+    else:
+        record("create_proprieta_bulk", _time(lambda: gen.popola(db, df), 1))
+
+    for nome, filtri in FILTRI.items():
+        record(f"get_all_proprieta[{nome}]", _time(lambda f=filtri: db.get_all_proprieta(f), repeat))
+    for q in RICERCHE:
+        record(f"search[{q}]", _time(lambda q=q: db.search_proprieta(q), repeat))
+
+    record("get_analytics", _time(db.get_analytics, repeat))
+    record("get_cashflow[60m]", _time(lambda: db.get_cashflow(60), repeat))
+
+    with TestClient(api.app) as client:
+        record("GET /stats", _time(lambda: client.get("/stats").raise_for_status(), repeat))
+        record("GET /proprieta (prima pagina)",
+               _time(lambda: client.get("/proprieta", params={"limit": 100}).raise_for_status(), repeat))
+        record("GET /proprieta (tutte le pagine)", _time(lambda: _walk_pages(client), repeat))
+
+    if n <= gen.EXCEL_MAX_ROWS:
+        record("export_to_excel", _time(lambda: ExcelIO.export_to_excel(workdir / f"export_{n}.xlsx"), 1))
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def run(sizes: List[int], seed: int = 42, repeat: int = 3, workdir: Optional[Path] = None) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        root = workdir or Path(tmp)
+        results = []
+        for n in sizes:
+            print(f"▶ {n} proprietà")
+            results.extend(run_size(n, seed, repeat, root))
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": "sqlite",
+            "seed": seed,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def regressions(current: Dict[str, Any], baseline: Dict[str, Any], ratio: float = REGRESSION_RATIO) -> List[str]:
+    """Operazioni (stessa op e n) più lente di `ratio` volte la baseline."""
+    before = {(r["op"], r["n"]): r["median_s"] for r in baseline["results"]}
+    slower = []
+    for r in current["results"]:
+        old = before.get((r["op"], r["n"]))
+        if old and r["median_s"] > old * ratio and r["median_s"] - old > REGRESSION_MIN_S:
+            slower.append(f"{r['op']} n={r['n']}: {old * 1000:.1f} → {r['median_s'] * 1000:.1f} ms")
+    return slower
+
+
+def _import_a_freddo(modulo: str) -> Dict[str, Any]:
+    script = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {modulo}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"print(json.dumps([elapsed, [m for m in {MODULI_PESANTI!r} if m in sys.modules]]))\n"
+    )
+    env = {k: v for k, v in os.environ.items() if not k.startswith("SUPABASE_")}
+    env["DB_BACKEND"] = "supabase"
+    out = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    elapsed, pesanti = json.loads(out.stdout.strip().splitlines()[-1])
+    return {"elapsed_s": elapsed, "pesanti": pesanti}
+
+
+def startup(repeat: int = 3) -> List[Dict[str, Any]]:
+    """Import a freddo di ogni modulo di STARTUP_BUDGET_S, ognuno in `repeat` interpreti nuovi."""
+    results = []
+    for modulo, budget in STARTUP_BUDGET_S.items():
+        runs = [_import_a_freddo(modulo) for _ in range(repeat)]
+        results.append({
+            "op": f"import {modulo}",
+            "median_s": statistics.median(r["elapsed_s"] for r in runs),
+            "budget_s": budget,
+            "pesanti": sorted({m for r in runs for m in r["pesanti"]}),
+        })
+        print(f"  import {modulo:<22} {results[-1]['median_s'] * 1000:10.1f} ms (budget {budget * 1000:.0f} ms)")
+    return results
+
+
+def over_budget(results: List[Dict[str, Any]]) -> List[str]:
+    """Import oltre il budget o che caricano moduli pesanti."""
+    problemi = []
+    for r in results:
+        if r["median_s"] > r["budget_s"]:
+            problemi.append(f"{r['op']}: {r['median_s'] * 1000:.0f} ms > {r['budget_s'] * 1000:.0f} ms")
+        if r["pesanti"]:
+            problemi.append(f"{r['op']} carica {', '.join(r['pesanti'])}")
+    return problemi
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CRUD, import/export e statistiche")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", type=Path, help="file JSON dei risultati")
+    parser.add_argument("--baseline", type=Path, help="JSON di un run precedente da confrontare")
+    parser.add_argument("--startup", action="store_true", help="misura solo l'import a freddo contro il budget")
+    args = parser.parse_args()
+
+    if args.startup:
+        problemi = over_budget(startup(args.repeat))
+        for line in problemi:
+            print(f"❌ Avvio: {line}")
+        sys.exit(1 if problemi else 0)
+
+    report = run(args.sizes, args.seed, args.repeat)
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"✅ Risultati in {args.out}")
+    if args.baseline:
+        slower = regressions(report, json.loads(args.baseline.read_text(encoding="utf-8")))
+        for line in slower:
+            print(f"❌ Regressione: {line}")
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
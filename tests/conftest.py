@@ -0,0 +1,43 @@
+# tests/conftest.py
+import os
+import tempfile
+
+import pytest
+
+# I test girano sul backend SQLite locale, senza credenziali Supabase
+os.environ.setdefault("DB_BACKEND", "sqlite")
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "immobiliare_test.db"))
+
+# Dopo le variabili d'ambiente: settings le legge all'import
+from src import api, excel_io as excel_module  # noqa: E402
+from src.db import DatabaseManager  # noqa: E402
+from src.db_async import AsyncDatabaseManager  # noqa: E402
+
+
+def _prop(nome, **extra):
+    """Dati minimi di una proprietà valida; `extra` aggiunge o sostituisce campi."""
+    return {'nome': nome, 'indirizzo': 'Via Test', 'mq_effettivi': 50,
+            'mq_commerciali': 55, 'valore_mq': 2000, **extra}
+
+
+@pytest.fixture
+def temp_db(tmp_path):
+    """DatabaseManager su un file SQLite temporaneo"""
+    db = DatabaseManager(tmp_path / "test.db")
+    yield db
+    db.backend.close()
+
+
+@pytest.fixture
+def api_adb(temp_db, monkeypatch):
+    """Gli endpoint async dell'API usano `temp_db` (con `pytestmark = pytest.mark.usefixtures("api_adb")`)"""
+    adb = AsyncDatabaseManager(temp_db)
+    monkeypatch.setattr(api, "adb", adb)
+    return adb
+
+
+@pytest.fixture
+def excel_db(temp_db, monkeypatch):
+    """ExcelIO legge e scrive su `temp_db`"""
+    monkeypatch.setattr(excel_module, "db", temp_db)
+    return temp_db
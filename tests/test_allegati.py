@@ -0,0 +1,142 @@
+# tests/test_allegati.py
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from storage3 import SyncStorageClient
+
+from src import allegati, api
+from src.db import CONTRACT_BUCKET, PIANTINE_BUCKET, SupabaseStorage
+from conftest import _prop
+
+
+@pytest.fixture
+def temp_db(temp_db, tmp_path, monkeypatch):
+    temp_db.storage.root = tmp_path / "storage"
+    monkeypatch.setattr(allegati, "db", temp_db)
+    return temp_db
+
+
+def _crea(db, nome):
+    return db.create_proprieta(_prop(nome))
+
+
+def _cartella(tmp_path):
+    root = tmp_path / "onboarding"
+    (root / "Villa Città").mkdir(parents=True)
+    Image.new('RGB', (400, 300)).save(root / "Villa Città" / "piantina.png")
+    (root / "Villa Città" / "contratto.pdf").write_bytes(b'%PDF-1.4 contratto')
+    (root / "Villa Città" / "seconda.png").write_bytes(b'non letta')
+    (root / "Attico Centro.pdf").write_bytes(b'%PDF-1.4 attico')
+    (root / "Sconosciuto.pdf").write_bytes(b'%PDF-1.4')
+    (root / "note.txt").write_text("appunti")
+    return root
+
+
+def test_match_key_ignores_accents_case_and_punctuation():
+    assert allegati.match_key("Villa  Città") == allegati.match_key("villa_citta")
+    assert allegati.nome_da_percorso("Villa Rossi/piantina.jpg") == "Villa Rossi"
+    assert allegati.nome_da_percorso("Villa Rossi.pdf") == "Villa Rossi"
+
+
+def test_bulk_upload_links_matching_properties(temp_db, tmp_path, monkeypatch):
+    villa = _crea(temp_db, "Villa Citta")
+    attico = _crea(temp_db, "Attico Centro")
+    calls = []
+    original = temp_db.update_proprieta_bulk
+    monkeypatch.setattr(temp_db, "update_proprieta_bulk", lambda rows: calls.append(rows) or original(rows))
+
+    report = allegati.upload_folder(_cartella(tmp_path), max_workers=3)
+
+    esiti = {(r['nome'], r['file']): r['esito'] for r in report['files']}
+    assert esiti == {
+        ("Villa Città", "contratto.pdf"): "caricato",
+        ("Villa Città", "piantina.png"): "caricato",
+        ("Villa Città", "seconda.png"): "ignorato",
+        ("Attico Centro", "Attico Centro.pdf"): "caricato",
+        ("Sconosciuto", "Sconosciuto.pdf"): "ignorato",
+        ("note", "note.txt"): "ignorato",
+    }
+    assert (report['caricati'], report['ignorati'], report['errori']) == (3, 3, 0)
+    assert report['file_al_secondo'] > 0
+
+    # Un solo aggiornamento massivo per tutte le righe
+    assert len(calls) == 1 and sorted(r['id'] for r in calls[0]) == sorted([villa, attico])
+    prop = temp_db.get_proprieta_by_id(villa)
+    assert prop['immagine_path'] == f'{villa}/piantina.webp'
+    assert prop['contratto_path'] == f'{villa}/contratto.pdf'
+    assert (tmp_path / "storage" / PIANTINE_BUCKET / prop['miniatura_path']).exists()
+    assert (tmp_path / "storage" / CONTRACT_BUCKET / f'{attico}/attico-centro.pdf').exists()
+
+
+def test_bulk_upload_skips_already_stored_files(temp_db, tmp_path):
+    villa = _crea(temp_db, "Villa Citta")
+    root = _cartella(tmp_path)
+    allegati.upload_folder(root)
+
+    report = allegati.upload_folder(root)
+    assert report['caricati'] == 0
+    assert {r['file'] for r in report['files'] if r['esito'] == 'saltato'} == {'piantina.png', 'contratto.pdf'}
+
+    # Contenuto cambiato: si ricarica solo quel file
+    (root / "Villa Città" / "contratto.pdf").write_bytes(b'%PDF-1.4 rinnovo')
+    report = allegati.upload_folder(root)
+    assert [r['file'] for r in report['files'] if r['esito'] == 'caricato'] == ['contratto.pdf']
+    assert temp_db.get_proprieta_by_id(villa)['contratto_sha256'] is not None
+
+
+def test_invalid_image_reported_as_error(temp_db):
+    _crea(temp_db, "Villa")
+    report = allegati.bulk_upload([allegati.Allegato("Villa", "rotta.png", b'non una immagine')])
+    assert report['files'][0]['esito'] == 'errore'
+    assert 'non valida' in report['files'][0]['messaggio']
+
+
+class _StorageRemoto:
+    """Supabase Storage finto: come quello vero, rifiuta un path già esistente senza x-upsert"""
+
+    def __init__(self):
+        self.oggetti = {}
+
+    def __call__(self, request):
+        assert 'contenttype' not in request.headers
+        key = request.url.path.split('/object/', 1)[1]
+        if key in self.oggetti and request.headers.get('x-upsert') != 'true':
+            return httpx.Response(400, json={'statusCode': '409', 'error': 'Duplicate',
+                                             'message': 'The resource already exists'})
+        self.oggetti[key] = request.read()
+        return httpx.Response(200, json={'Key': key})
+
+
+def test_changed_file_replaces_remote_object(temp_db, tmp_path):
+    remoto = _StorageRemoto()
+    http = httpx.Client(base_url="http://supabase.test/storage/v1/", transport=httpx.MockTransport(remoto))
+    client = SimpleNamespace(storage=SyncStorageClient("http://supabase.test/storage/v1/", {}, http_client=http))
+    temp_db.storage = SupabaseStorage(client)
+    villa = _crea(temp_db, "Villa Citta")
+    root = _cartella(tmp_path)
+    assert allegati.upload_folder(root, make_public_url=False)['errori'] == 0
+
+    (root / "Villa Città" / "contratto.pdf").write_bytes(b'%PDF-1.4 rinnovo')
+    report = allegati.upload_folder(root, make_public_url=False)
+    esiti = {r['file']: r['esito'] for r in report['files']}
+    assert esiti['contratto.pdf'] == 'caricato' and esiti['piantina.png'] == 'saltato'
+    assert report['errori'] == 0
+    assert b'rinnovo' in remoto.oggetti[f'{CONTRACT_BUCKET}/{villa}/contratto.pdf']
+
+
+def test_api_reads_uploads_inside_the_workers(temp_db, monkeypatch):
+    villa = _crea(temp_db, "Villa")
+    sorgenti = []
+    original = api.bulk_upload
+    monkeypatch.setattr(api, "bulk_upload", lambda items: sorgenti.extend(a.source for a in items) or original(items))
+
+    files = [('files', ('Villa/contratto.pdf', b'%PDF-1.4 contratto', 'application/pdf'))]
+    report = TestClient(api.app).post("/allegati/bulk", files=files).json()
+
+    # Al pool arriva il file di spool, non il contenuto già letto
+    assert sorgenti and not isinstance(sorgenti[0], bytes)
+    assert report['caricati'] == 1
+    assert temp_db.get_proprieta_by_id(villa)['contratto_path'] == f'{villa}/contratto.pdf'
@@ -0,0 +1,56 @@
+# tests/test_analytics.py
+import pytest
+from fastapi.testclient import TestClient
+
+from src import analytics, api
+from conftest import _prop
+
+pytestmark = pytest.mark.usefixtures("api_adb")
+
+MQ = {'mq_effettivi': 90, 'mq_commerciali': 100}  # valore = 100 m² commerciali × valore_mq
+
+
+def _popola(db):
+    # Valori: A 200k, B 300k, C 100k, D 400k (senza categoria)
+    db.create_proprieta(_prop('A', **MQ, categoria='A/2', zona_cens='1', affittato_a='Rossi', affitto_mensile=1000))
+    db.create_proprieta(_prop('B', **MQ, categoria='A/2', zona_cens='1', valore_mq=3000,
+                              affittato_a='Bianchi', affitto_mensile=500))
+    db.create_proprieta(_prop('C', **MQ, categoria='C/6', zona_cens='2', valore_mq=1000))
+    db.create_proprieta(_prop('D', **MQ, valore_mq=4000))
+
+
+def test_yields_vacancy_and_groups(temp_db):
+    _popola(temp_db)
+
+    report = temp_db.get_analytics()
+
+    tot = report['totale']
+    assert (tot['immobili'], tot['affittati'], tot['tasso_sfitto']) == (4, 2, 0.5)
+    assert tot['valore'] == 1_000_000 and tot['canone_annuo'] == 18_000
+    # 18k di canoni sui 500k degli affittati, 1,8% sull'intero patrimonio
+    assert tot['rendimento_lordo'] == 0.036 and tot['rendimento_portafoglio'] == 0.018
+    assert tot['valore_mq']['mediana'] == 2500 and tot['concentrazione']['quota_top10'] == 1.0
+
+    categorie = {g['categoria']: g for g in report['gruppi']['categoria']}
+    assert list(categorie) == ['A/2', analytics.NON_INDICATO, 'C/6']  # dal valore più alto
+    assert categorie['A/2']['rendimento_lordo'] == 0.036 and categorie['A/2']['quota_valore'] == 0.5
+    assert categorie['C/6']['tasso_sfitto'] == 1 and categorie['C/6']['rendimento_lordo'] is None
+    assert [r['nome'] for r in report['rendimenti']['migliori']] == ['A', 'B']
+
+
+def test_report_cached_until_next_write(temp_db):
+    _popola(temp_db)
+    first = temp_db.get_analytics()
+    misses = temp_db.cache_info()['misses']
+
+    assert TestClient(api.app).get("/analytics").json() == first
+    assert temp_db.cache_info()['misses'] == misses
+
+    temp_db.create_proprieta(_prop('E', **MQ, categoria='A/2'))
+    assert temp_db.get_analytics()['totale']['immobili'] == 5
+
+
+def test_empty_portfolio(temp_db):
+    report = temp_db.get_analytics()
+    assert report['totale']['immobili'] == 0 and report['totale']['rendimento_lordo'] is None
+    assert report['gruppi'] == {col: [] for col in analytics.GRUPPI}
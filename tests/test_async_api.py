@@ -0,0 +1,124 @@
+# tests/test_async_api.py
+import asyncio
+import json
+
+import httpx
+import pytest
+from postgrest import AsyncPostgrestClient, SyncPostgrestClient
+
+from src import api
+from src.db import SupabaseBackend
+from src.db_async import AsyncDatabaseManager, AsyncSupabaseBackend
+from conftest import _prop
+
+
+pytestmark = pytest.mark.usefixtures("api_adb")
+
+
+async def _client():
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://test")
+
+
+def test_concurrent_requests_on_one_loop(temp_db):
+    for i in range(10):
+        temp_db.create_proprieta(_prop(f'Immobile {i}'))
+
+    async def run():
+        async with await _client() as client:
+            return await asyncio.gather(*[
+                client.get("/proprieta", params={"limit": 5, "skip": i % 10}) for i in range(100)
+            ])
+
+    responses = asyncio.run(run())
+    assert all(r.status_code == 200 for r in responses)
+    assert {len(r.json()) for r in responses} == {5, 4, 3, 2, 1}
+
+
+def test_crud_round_trip(temp_db):
+    async def run():
+        async with await _client() as client:
+            created = await client.post("/proprieta", json=_prop('Nuova'))
+            prop_id = created.json()['id']
+            updated = await client.put(f"/proprieta/{prop_id}", json={'affitto_mensile': 800})
+            deleted = await client.delete(f"/proprieta/{prop_id}")
+            missing = await client.get(f"/proprieta/{prop_id}")
+            return created, updated, deleted, missing
+
+    created, updated, deleted, missing = asyncio.run(run())
+    assert created.status_code == 201 and created.json()['nome'] == 'Nuova'
+    assert updated.json()['affitto_mensile'] == 800
+    assert deleted.status_code == 204
+    assert missing.status_code == 404
+
+
+def test_writes_cost_one_backend_call(temp_db, monkeypatch):
+    calls = []
+    for name in ("insert", "update", "get"):
+        original = getattr(temp_db.backend, name)
+        monkeypatch.setattr(temp_db.backend, name,
+                            lambda *a, _n=name, _f=original, **k: calls.append(_n) or _f(*a, **k))
+
+    async def run():
+        async with await _client() as client:
+            created = await client.post("/proprieta", json=_prop('Una'))
+            updated = await client.put(f"/proprieta/{created.json()['id']}", json={'valore_mq': 2100})
+            missing = await client.put("/proprieta/9999", json={'valore_mq': 2100})
+            return created, updated, missing
+
+    created, updated, missing = asyncio.run(run())
+    assert created.status_code == 201 and updated.json()['valore_mq'] == 2100
+    assert missing.status_code == 404
+    assert calls == ["insert", "update", "update"]
+
+
+def test_cache_shared_with_sync_facade(temp_db):
+    prop_id = temp_db.create_proprieta(_prop('Condivisa'))
+    adb = AsyncDatabaseManager(temp_db)
+    assert temp_db.get_proprieta_by_id(prop_id)['affitto_mensile'] == 0
+
+    async def run():
+        cached = await adb.get_proprieta_by_id(prop_id)
+        await adb.update_proprieta(prop_id, {'affitto_mensile': 500})
+        return cached
+
+    assert asyncio.run(run())['affitto_mensile'] == 0
+    assert temp_db.cache_info()['hits'] == 1
+    # La scrittura async invalida la cache letta dalla facciata sincrona
+    assert temp_db.get_proprieta_by_id(prop_id)['affitto_mensile'] == 500
+
+
+def test_async_supabase_builds_same_queries():
+    sync = SupabaseBackend(SyncPostgrestClient("http://supabase.test/rest/v1"))
+    async_ = AsyncSupabaseBackend(AsyncPostgrestClient("http://supabase.test/rest/v1"))
+    filters = {'order_by': 'valore_mq DESC', 'solo_affitti': True, 'scadenza_giorni': 30}
+    after = (1500.0, 7)
+
+    q_sync = sync._select_query(filters, limit=11, after=after)
+    q_async = async_._select_query(filters, limit=11, after=after)
+    assert q_sync.request.params == q_async.request.params
+    assert "valore_mq.lt.%221500.0%22" in str(q_async.request.params)
+
+
+def test_contract_dates_reach_postgrest_as_json(temp_db, api_adb):
+    bodies = []
+
+    def handler(request):
+        body = json.loads(request.content)
+        bodies.append(body)
+        return httpx.Response(200 if request.method == "PATCH" else 201, json=[{
+            **_prop('Nuova'), 'id': 1, 'created_at': '2026-01-01T00:00:00', 'updated_at': '2026-01-01T00:00:00', **body,
+        }])
+
+    http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    api_adb._backend = AsyncSupabaseBackend(AsyncPostgrestClient("http://supabase.test/rest/v1", http_client=http))
+
+    async def run():
+        async with await _client() as client:
+            created = await client.post("/proprieta", json=_prop('Nuova', contratto_fine='2027-06-30'))
+            updated = await client.put("/proprieta/1", json={'contratto_inizio': '2026-07-01'})
+            return created, updated
+
+    created, updated = asyncio.run(run())
+    assert created.status_code == 201 and updated.status_code == 200
+    assert bodies[0]['contratto_fine'] == '2027-06-30'
+    assert bodies[1]['contratto_inizio'] == '2026-07-01' and 'nome' not in bodies[1]
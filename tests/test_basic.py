@@ -1,19 +1,7 @@
 # tests/test_basic.py
 import pytest
+from src import db as db_module
 from src.db import DatabaseManager
-from pathlib import Path
-import tempfile
-
-@pytest.fixture
-def temp_db():
-    """Database temporaneo per test"""
-    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as f:
-        db_path = Path(f.name)
-    
-    db = DatabaseManager(db_path)
-    yield db
-    
-    db_path.unlink()
 
 def test_create_proprieta(temp_db):
     """Test creazione proprietà"""
@@ -91,6 +79,21 @@ def test_filter_non_pagati(temp_db):
     assert len(non_pagati) == 1
     assert non_pagati[0]['nome'] == 'Non Pagato'
 
+def test_backend_created_on_first_use(tmp_path, monkeypatch):
+    """Backend e client Supabase nascono al primo uso, non con il manager"""
+    db = DatabaseManager(tmp_path / "lazy.db")
+    assert db._backend is None and not (tmp_path / "lazy.db").exists()
+    assert db.get_all_proprieta() == []
+    assert (tmp_path / "lazy.db").exists()
+    db.backend.close()
+
+    # Senza credenziali l'errore arriva alla prima lettura, non all'import
+    monkeypatch.setattr(db_module.settings, "DB_BACKEND", "supabase")
+    monkeypatch.setattr(db_module, "SUPABASE_URL", None)
+    remoto = DatabaseManager()
+    with pytest.raises(RuntimeError):
+        remoto.get_all_proprieta()
+
 # Esegui test
 if __name__ == "__main__":
-    pytest.main([__file__, "-v"])
\ No newline at end of file
+    pytest.main([__file__, "-v"])
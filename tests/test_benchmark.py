@@ -0,0 +1,38 @@
+# tests/test_benchmark.py
+import benchmark
+import generate_portfolio as gen
+
+
+def test_generator_is_seeded_and_valid():
+    df = gen.genera_portafoglio(500, seed=7)
+    assert df.equals(gen.genera_portafoglio(500, seed=7))
+    assert not df.equals(gen.genera_portafoglio(500, seed=8))
+    assert df['nome'].is_unique
+    assert (df['mq_commerciali'] >= df['mq_effettivi']).all()
+    affittati = df['affittato_a'].notna()
+    assert (df.loc[affittati, 'contratto_fine'] > df.loc[affittati, 'contratto_inizio']).all()
+    assert not df.loc[~affittati, 'mensilita_pagata'].any()
+    assert df['immagine_sha256'].dropna().str.len().eq(64).all()
+
+
+def test_benchmark_report_and_regressions(tmp_path):
+    report = benchmark.run([200], repeat=1, workdir=tmp_path)
+
+    ops = {r['op'] for r in report['results']}
+    assert {'import_from_excel', 'export_to_excel', 'GET /stats',
+            'GET /proprieta (tutte le pagine)', 'get_all_proprieta[scadenza_60g]'} <= ops
+    assert report['meta']['seed'] == 42
+
+    slower = {'results': [dict(r, median_s=r['median_s'] * 2 + 0.01) for r in report['results']]}
+    assert len(benchmark.regressions(slower, report)) == len(report['results'])
+    assert benchmark.regressions(report, report) == []
+
+
+def test_startup_does_not_load_heavy_modules():
+    results = benchmark.startup(repeat=1)
+
+    assert [r['op'] for r in results] == ['import src.db', 'import src.api']
+    assert all(r['pesanti'] == [] for r in results)
+
+    lenti = [dict(r, median_s=r['budget_s'] + 0.1, pesanti=['pandas']) for r in results]
+    assert len(benchmark.over_budget(lenti)) == 4
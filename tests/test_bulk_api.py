@@ -0,0 +1,60 @@
+# tests/test_bulk_api.py
+import pytest
+from fastapi.testclient import TestClient
+
+from src import api
+from conftest import _prop
+
+pytestmark = pytest.mark.usefixtures("api_adb")
+
+
+def test_bulk_create_reports_rejected_rows(temp_db):
+    temp_db.create_proprieta(_prop('Esistente'))
+    rows = [_prop('A', contratto_fine='2027-01-31'), _prop('Esistente'), _prop('B')]
+
+    resp = TestClient(api.app).post("/proprieta/bulk", json=rows)
+
+    body = resp.json()
+    assert resp.status_code == 200 and body['creati'] == 2
+    assert body['ids'][1] is None and [e['indice'] for e in body['errori']] == [1]
+    assert temp_db.get_proprieta_by_id(body['ids'][0])['contratto_fine'] == '2027-01-31'
+
+
+def test_bulk_patch_only_sent_fields(temp_db):
+    a = temp_db.create_proprieta(_prop('A', affittato_a='Tizio', mensilita_pagata=True))
+    b = temp_db.create_proprieta(_prop('B'))
+
+    resp = TestClient(api.app).patch("/proprieta/bulk", json=[
+        {'id': a, 'affitto_mensile': 700},
+        {'id': 9999, 'valore_mq': 1},
+        {'id': b, 'nome': 'B2'},
+    ])
+
+    body = resp.json()
+    assert body['aggiornati'] == 2
+    assert body['errori'] == [{'indice': 1, 'errore': 'Proprietà non trovata'}]
+    prop_a = temp_db.get_proprieta_by_id(a)
+    # I campi non inviati restano invariati
+    assert prop_a['affitto_mensile'] == 700 and prop_a['mensilita_pagata'] is True
+    assert temp_db.get_proprieta_by_id(b)['nome'] == 'B2'
+
+    # Una riga con il solo id non ha nulla da aggiornare: non è un errore
+    assert temp_db.update_proprieta_bulk([{'id': a}, {'id': b, 'nome': 'B3'}]) == (2, {})
+
+
+def test_mark_paid_and_reset(temp_db):
+    ids = [temp_db.create_proprieta(_prop(f'P{i}', affittato_a='Tizio')) for i in range(4)]
+    libero = temp_db.create_proprieta(_prop('Libero'))
+    client = TestClient(api.app)
+
+    resp = client.post("/proprieta/mensilita", json={'ids': ids[:2] + [libero], 'pagata': True})
+    assert resp.json() == {'aggiornati': 2, 'ids': ids[:2]}
+    assert temp_db.get_stats()['non_pagati'] == 2
+
+    # Già pagate: nessuna riga cambia
+    assert client.post("/proprieta/mensilita", json={'ids': ids[:2]}).json()['aggiornati'] == 0
+
+    resp = client.post("/proprieta/mensilita", json={'pagata': False})
+    assert sorted(resp.json()['ids']) == ids[:2]
+    assert temp_db.get_stats()['non_pagati'] == 4
+    assert temp_db.get_proprieta_by_id(libero)['mensilita_pagata'] is False
@@ -0,0 +1,68 @@
+# tests/test_cache.py
+import pytest
+
+from src.cache import QueryCache
+from src.db import DatabaseManager
+from conftest import _prop
+
+
+@pytest.fixture
+def temp_db(tmp_path):
+    db = DatabaseManager(tmp_path / "test.db", cache=True)
+    db.create_proprieta(_prop('A'))
+    yield db
+    db.backend.close()
+
+
+def test_repeated_reads_hit_cache(temp_db, monkeypatch):
+    """Un rerun che rilegge lista, dettaglio e totali non tocca il backend"""
+    temp_db.get_all_proprieta({'order_by': 'nome', 'solo_affitti': False})
+    prop_id = temp_db.get_all_proprieta()[0]['id']
+    temp_db.get_proprieta_by_id(prop_id)
+    temp_db.get_stats(60)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("chiamata al backend")
+    monkeypatch.setattr(temp_db.backend, "select", fail)
+    monkeypatch.setattr(temp_db.backend, "get", fail)
+    monkeypatch.setattr(temp_db.backend, "stats", fail)
+
+    temp_db.get_all_proprieta({'order_by': 'nome'})
+    temp_db.get_proprieta_by_id(prop_id)
+    temp_db.get_stats(60)
+    assert temp_db.cache_info()['hits'] == 3
+
+
+def test_writes_invalidate(temp_db):
+    prop = temp_db.get_all_proprieta()[0]
+    assert temp_db.get_proprieta_by_id(prop['id'])['valore_mq'] == 2000
+
+    temp_db.update_proprieta(prop['id'], {'valore_mq': 2500})
+    assert temp_db.get_proprieta_by_id(prop['id'])['valore_mq'] == 2500
+    assert temp_db.get_all_proprieta()[0]['valore_mq'] == 2500
+
+    temp_db.create_proprieta(_prop('B'))
+    assert temp_db.get_stats()['totale_immobili'] == 2
+
+    temp_db.delete_proprieta(prop['id'])
+    assert temp_db.get_proprieta_by_id(prop['id']) is None
+    assert [p['nome'] for p in temp_db.get_all_proprieta()] == ['B']
+
+
+def test_cached_rows_are_copies(temp_db):
+    temp_db.get_all_proprieta()[0]['nome'] = 'Sporcato'
+    assert temp_db.get_all_proprieta()[0]['nome'] == 'A'
+
+
+def test_ttl_and_lru():
+    cache = QueryCache(maxsize=2, ttl=60)
+    loads = []
+    for key in ['a', 'b', 'a', 'c', 'b']:
+        cache.get_or_load(key, lambda: loads.append(key) or key)
+    # 'b' è uscita quando è entrata 'c' (la meno usata di recente)
+    assert loads == ['a', 'b', 'c', 'b']
+
+    cache.ttl = 0
+    cache.get_or_load('x', lambda: loads.append('x'))
+    cache.get_or_load('x', lambda: loads.append('x'))
+    assert loads[-2:] == ['x', 'x']
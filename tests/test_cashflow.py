@@ -0,0 +1,72 @@
+# tests/test_cashflow.py
+import io
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+from openpyxl import load_workbook
+
+from src import api
+from src.excel_io import ExcelIO
+from conftest import _prop
+
+pytestmark = pytest.mark.usefixtures("api_adb", "excel_db")
+
+DAL = date(2025, 3, 10)  # proiezione marzo-agosto 2025
+
+
+def _popola(db):
+    # Scade a maggio, poi sfitto
+    db.create_proprieta(_prop('A', affittato_a='Rossi', affitto_mensile=1000, categoria='A/2',
+                              contratto_inizio='2024-01-01', contratto_fine='2025-05-31'))
+    # Parte a giugno, senza scadenza
+    db.create_proprieta(_prop('B', affittato_a='Rossi', affitto_mensile=500, categoria='C/6',
+                              contratto_inizio='2025-06-15'))
+    # Senza data di inizio: già in corso
+    db.create_proprieta(_prop('C', affittato_a='Verdi', affitto_mensile=800, categoria='A/2',
+                              contratto_fine='2025-12-31'))
+    db.create_proprieta(_prop('D'))
+
+
+def test_monthly_totals_follow_contract_timelines(temp_db):
+    _popola(temp_db)
+
+    flusso = temp_db.get_cashflow(6, DAL)
+
+    assert flusso['mesi'] == ['2025-03', '2025-04', '2025-05', '2025-06', '2025-07', '2025-08']
+    assert [m['canoni'] for m in flusso['per_mese']] == [1800] * 3 + [1300] * 3
+    assert [m['contratti'] for m in flusso['per_mese']] == [2] * 6
+    # Sfitto: canoni dei contratti in corso a marzo che non ci sono più
+    assert [m['sfitto'] for m in flusso['per_mese']] == [0] * 3 + [1000] * 3
+    assert flusso['totale']['canoni'] == 9300 and flusso['totale']['contratti'] == 3
+
+
+def test_totals_per_tenant_and_category_with_arrears(temp_db):
+    _popola(temp_db)
+    arretrati = {r['inquilino']: r['importo'] for r in temp_db.get_morosita()}
+
+    flusso = temp_db.get_cashflow(6, DAL)
+
+    inquilini = {r['inquilino']: r for r in flusso['per_inquilino']}
+    assert [r['inquilino'] for r in flusso['per_inquilino']] == ['Verdi', 'Rossi']
+    assert inquilini['Rossi']['totale'] == 4500 and inquilini['Rossi']['contratti'] == 2
+    assert inquilini['Rossi']['arretrati'] == arretrati['Rossi']
+    assert flusso['totale']['da_incassare'] == 9300 + sum(arretrati.values())
+    categorie = {r['categoria']: r['mesi'] for r in flusso['per_categoria']}
+    assert categorie == {'A/2': [1800] * 3 + [800] * 3, 'C/6': [0] * 3 + [500] * 3}
+
+
+def test_api_and_excel_schedule(temp_db):
+    _popola(temp_db)
+    client = TestClient(api.app)
+
+    body = client.get("/cashflow", params={'mesi': 6, 'dal': DAL.isoformat(), 'inquilini': 1}).json()
+    assert body['totale']['canoni'] == 9300 and len(body['per_inquilino']) == 1
+    assert client.get("/cashflow", params={'mesi': 61}).status_code == 422
+
+    resp = client.get("/cashflow/excel", params={'mesi': 24})
+    wb = load_workbook(io.BytesIO(resp.content), read_only=True)
+    assert wb.sheetnames == ['Totale', 'Per inquilino', 'Per categoria', 'Per contratto']
+    righe = list(wb['Per contratto'].values)
+    assert len(righe) == 4 and len(righe[0]) == 4 + 24
+    assert ExcelIO.cashflow_to_bytes(6)[:2] == b'PK'
@@ -0,0 +1,59 @@
+# tests/test_excel_export.py
+import io
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from src import api
+from src import excel_io as excel_module
+from src.db import DatabaseManager
+from src.excel_io import ExcelIO
+from conftest import _prop
+
+
+@pytest.fixture
+def temp_db(temp_db, monkeypatch):
+    monkeypatch.setattr(excel_module, "db", temp_db)
+    monkeypatch.setattr(api, "db", temp_db)
+    for i in range(7):
+        temp_db.create_proprieta(_prop(f'Immobile {i}', valore_mq=2000 + i,
+                                       affittato_a='Tizio' if i % 2 else None, mensilita_pagata=i == 1))
+    return temp_db
+
+
+def test_export_pages_through_backend(temp_db, tmp_path):
+    path = tmp_path / "export.xlsx"
+    ExcelIO.write_export(path, page_size=3)
+
+    df = pd.read_excel(path, engine='openpyxl')
+    assert list(df['Nome']) == [f'Immobile {i}' for i in range(7)]
+    assert list(df['Mese Pagato'][:3]) == ['NO', 'SI', 'NO']
+    assert 'id' not in df.columns and 'updated_at' not in df.columns
+    assert 'categoria' in df.columns
+    # Le pagine dell'export non restano in cache
+    assert temp_db.cache_info()['size'] == 0
+
+
+def test_export_round_trip(temp_db, tmp_path):
+    """Il file esportato si reimporta senza modifiche"""
+    path = tmp_path / "export.xlsx"
+    path.write_bytes(ExcelIO.export_to_bytes(page_size=2))
+
+    result = ExcelIO.sync_from_excel(path)
+    assert (result['inserted'], result['updated'], result['unchanged']) == (0, 0, 7)
+
+
+def test_export_empty_has_header(tmp_path, monkeypatch):
+    db = DatabaseManager(tmp_path / "empty.db")
+    monkeypatch.setattr(excel_module, "db", db)
+    df = pd.read_excel(io.BytesIO(ExcelIO.export_to_bytes()), engine='openpyxl')
+    assert df.empty and 'Nome' in df.columns
+    db.backend.close()
+
+
+def test_api_export_stream(temp_db):
+    resp = TestClient(api.app).get("/export/excel")
+    assert resp.status_code == 200
+    assert 'attachment' in resp.headers['content-disposition']
+    assert len(pd.read_excel(io.BytesIO(resp.content), engine='openpyxl')) == 7
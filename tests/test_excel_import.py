@@ -0,0 +1,101 @@
+# tests/test_excel_import.py
+import pandas as pd
+import pytest
+
+from src import excel_io as excel_module
+from src.excel_io import ExcelIO
+from conftest import _prop
+
+pytestmark = pytest.mark.usefixtures("excel_db")
+
+
+def _sheet(tmp_path, rows):
+    path = tmp_path / "import.xlsx"
+    pd.DataFrame(rows).to_excel(path, index=False, engine='openpyxl')
+    return path
+
+
+def _row(nome, **extra):
+    row = {
+        'Nome': nome,
+        'Indirizzo': 'Via Test 1',
+        'MQ Effettivi': 50.0,
+        'MQ Commerciali': 55.0,
+        'Valore €/m²': 2000.0,
+        'Affittato A': None,
+        'Canone Mensile €': 0.0,
+        'Contratto Inizio': None,
+        'Contratto Fine': None,
+        'Mese Pagato': 'NO',
+    }
+    row.update(extra)
+    return row
+
+
+def test_import_normalizes_rows(temp_db, tmp_path):
+    path = _sheet(tmp_path, [
+        _row('A', **{'Affittato A': 'Tizio', 'Canone Mensile €': 800.0, 'Mese Pagato': 'SI',
+                     'Contratto Inizio': '2024-01-01', 'Contratto Fine': '2026-12-31'}),
+        _row('B'),
+    ])
+
+    count, errors = ExcelIO.import_from_excel(path)
+
+    assert (count, errors) == (2, [])
+    a = temp_db.get_all_proprieta()[0]
+    assert a['mensilita_pagata'] is True
+    assert a['contratto_fine'] == '2026-12-31'
+    assert temp_db.get_all_proprieta()[1]['affittato_a'] is None
+
+
+def test_bad_rows_do_not_fail_the_batch(temp_db, tmp_path):
+    """Righe non valide vengono segnalate con il numero di riga Excel, le altre importate"""
+    temp_db.create_proprieta(_prop('Esistente'))
+    path = _sheet(tmp_path, [
+        _row('Ok 1'),
+        _row(None),
+        _row('Mq errati', **{'MQ Commerciali': 40.0}),
+        _row('Data errata', **{'Contratto Fine': 'non una data'}),
+        _row('Esistente'),
+        _row('Ok 2'),
+    ])
+
+    count, errors = ExcelIO.import_from_excel(path, batch_size=2)
+
+    assert count == 2
+    assert [e.split(':')[0] for e in errors] == ['Riga 3', 'Riga 4', 'Riga 5', 'Riga 6']
+    assert 'Nome obbligatorio' in errors[0]
+    assert 'MQ Commerciali' in errors[1]
+    assert 'contratto_fine' in errors[2]
+    assert {p['nome'] for p in temp_db.get_all_proprieta()} == {'Esistente', 'Ok 1', 'Ok 2'}
+
+
+def test_sync_only_writes_changes(temp_db, tmp_path, monkeypatch):
+    """Re-import per nome: nuovi inseriti, modificati aggiornati, invariati non scritti, mancanti eliminati"""
+    rows = [_row(f'P{i}', **{'Affittato A': 'Tizio', 'Canone Mensile €': 500.0 + i,
+                             'Contratto Fine': '2027-01-31', 'Mese Pagato': 'SI'}) for i in range(5)]
+    first = ExcelIO.sync_from_excel(_sheet(tmp_path, rows))
+    assert (first['inserted'], first['updated'], first['unchanged']) == (5, 0, 0)
+
+    # Stesso foglio: nessuna scrittura
+    def no_writes(*args, **kwargs):
+        raise AssertionError("scrittura inattesa")
+    monkeypatch.setattr(temp_db.backend, "insert_many", no_writes)
+    monkeypatch.setattr(temp_db.backend, "update_many", no_writes)
+    again = ExcelIO.sync_from_excel(_sheet(tmp_path, rows))
+    assert (again['inserted'], again['updated'], again['unchanged'], again['errors']) == (0, 0, 5, [])
+    monkeypatch.undo()
+    monkeypatch.setattr(excel_module, "db", temp_db)
+
+    rows[1]['Canone Mensile €'] = 999.0
+    rows[2]['Mese Pagato'] = 'NO'
+    del rows[4]
+    rows.append(_row('Nuovo'))
+    result = ExcelIO.sync_from_excel(_sheet(tmp_path, rows), delete_missing=True)
+
+    assert {k: result[k] for k in ('inserted', 'updated', 'unchanged', 'deleted')} == \
+        {'inserted': 1, 'updated': 2, 'unchanged': 2, 'deleted': 1}
+    by_nome = {p['nome']: p for p in temp_db.get_all_proprieta()}
+    assert set(by_nome) == {'P0', 'P1', 'P2', 'P3', 'Nuovo'}
+    assert by_nome['P1']['affitto_mensile'] == 999.0
+    assert by_nome['P2']['mensilita_pagata'] is False
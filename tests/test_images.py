@@ -0,0 +1,68 @@
+# tests/test_images.py
+import io
+
+import pytest
+from PIL import Image
+
+from src import settings
+from src.db import PIANTINE_BUCKET
+from src.images import process_piantina
+from conftest import _prop
+
+
+def _jpeg(size=(3000, 2000), exif=True):
+    img = Image.new('RGB', size, color=(73, 109, 137))
+    out = io.BytesIO()
+    if exif:
+        meta = Image.Exif()
+        meta[0x010F] = 'FotoCamera'   # Make
+        meta[0x0112] = 6              # Orientation: ruotata di 90°
+        img.save(out, format='JPEG', exif=meta)
+    else:
+        img.save(out, format='JPEG')
+    return out.getvalue()
+
+
+def test_resize_thumbnail_and_exif_stripped():
+    result = process_piantina(_jpeg(), 'Foto.JPG')
+
+    display = Image.open(io.BytesIO(result.display))
+    thumb = Image.open(io.BytesIO(result.thumb))
+    assert display.format == thumb.format == 'WEBP'
+    # Rotazione EXIF applicata (ora verticale), lato lungo limitato
+    assert display.size == (1067, 1600)
+    assert max(thumb.size) == settings.THUMB_MAX_SIDE_PX
+    assert not display.getexif()
+    assert len(result.thumb) < len(result.display)
+
+
+@pytest.mark.parametrize("data, filename, message", [
+    (b'x' * (settings.MAX_IMAGE_SIZE_MB * 1024 * 1024 + 1), 'grande.jpg', 'troppo grande'),
+    (b'GIF89a', 'animazione.gif', 'non supportato'),
+    (b'non una immagine', 'finta.png', 'non valida'),
+])
+def test_rejected_files(data, filename, message):
+    with pytest.raises(ValueError, match=message):
+        process_piantina(data, filename)
+
+
+def test_upload_stores_display_and_thumbnail(temp_db, tmp_path):
+    db = temp_db
+    db.storage.root = tmp_path / "storage"
+    prop_id = db.create_proprieta(_prop('P'))
+    src = tmp_path / "Piantina Piano 1.png"
+    Image.new('RGB', (800, 600)).save(src)
+
+    res = db.upload_piantina_and_link(prop_id, str(src))
+
+    assert res['path'] == f'{prop_id}/piantina-piano-1.webp'
+    assert res['thumb_path'] == f'{prop_id}/piantina-piano-1_thumb.webp'
+    prop = db.get_proprieta_by_id(prop_id)
+    assert prop['immagine_path'] == res['path'] and prop['miniatura_path'] == res['thumb_path']
+    assert prop['immagine_sha256']
+    assert (tmp_path / "storage" / PIANTINE_BUCKET / res['thumb_path']).exists()
+
+    assert db.remove_piantina(prop_id)
+    assert not (tmp_path / "storage" / PIANTINE_BUCKET / res['thumb_path']).exists()
+    prop = db.get_proprieta_by_id(prop_id)
+    assert prop['miniatura_path'] is None and prop['immagine_sha256'] is None
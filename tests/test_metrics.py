@@ -0,0 +1,65 @@
+# tests/test_metrics.py
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import api, metrics
+from src.db import DatabaseManager
+from src.db_async import AsyncDatabaseManager
+from conftest import _prop
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    db = DatabaseManager(tmp_path / "test.db", cache=False)
+    monkeypatch.setattr(api, "adb", AsyncDatabaseManager(db))
+    yield db
+    db.backend.close()
+
+
+def test_backend_calls_are_recorded(temp_db):
+    temp_db.get_all_proprieta()  # prima lettura: allinea il mese di mensilita_pagata
+    selects = metrics.CALL_LATENCY.count("backend", "select")
+    with metrics.trace() as calls:
+        prop_id = temp_db.create_proprieta(_prop('Uno'))
+        temp_db.create_proprieta(_prop('Due'))
+        temp_db.get_all_proprieta()
+        with pytest.raises(ValueError):
+            temp_db.update_proprieta(prop_id, {'colonna_inesistente': 1})
+
+    assert [c['method'] for c in calls] == ['insert', 'insert', 'select', 'update']
+    assert calls[2]['righe'] == 2 and calls[3]['errore'] == 'ValueError'
+    assert metrics.CALL_LATENCY.count("backend", "select") == selects + 1
+    assert metrics.CALL_ERRORS.value("backend", "update", "ValueError") >= 1
+    # Fuori da trace() non si accumula nulla
+    temp_db.get_all_proprieta()
+    assert len(calls) == 4
+
+
+def test_async_backend_calls_are_recorded():
+    class Fake:
+        async def select(self):
+            return [1, 2, 3]
+
+    wrapped = metrics.Instrumented(Fake(), "test")
+    with metrics.trace() as calls:
+        assert asyncio.run(wrapped.select()) == [1, 2, 3]
+    assert calls[0]['righe'] == 3
+
+
+def test_metrics_endpoint_reports_routes_and_sizes(temp_db):
+    prop_id = temp_db.create_proprieta(_prop('Casa'))
+    client = TestClient(api.app)
+    client.get(f"/proprieta/{prop_id}")
+    client.get("/proprieta/9999")
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200 and resp.headers['content-type'].startswith('text/plain')
+    text = resp.text
+    # Una serie per template di route, non per id
+    assert 'route="/proprieta/{proprieta_id}",status="200"' in text
+    assert 'route="/proprieta/{proprieta_id}",status="404"' in text
+    assert f'/proprieta/{prop_id}"' not in text
+    assert 'http_response_size_bytes_count{method="GET",route="/proprieta/{proprieta_id}"}' in text
+    assert 'backend_call_duration_seconds_bucket{target="backend",method="get",le="+Inf"}' in text
@@ -0,0 +1,99 @@
+# tests/test_pagamenti.py
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import api
+from src.query import mese_corrente
+from conftest import _prop
+
+pytestmark = pytest.mark.usefixtures("api_adb")
+
+OGGI = date(2025, 3, 20)  # scadenza il 5: marzo è già dovuto
+
+
+def _affitto(db, nome, inquilino, canone=1000, inizio='2025-01-01'):
+    return db.create_proprieta(_prop(nome, affittato_a=inquilino, affitto_mensile=canone,
+                                     contratto_inizio=inizio, contratto_fine='2029-12-31'))
+
+
+def test_bulk_payments_via_api(temp_db):
+    pid = _affitto(temp_db, 'A', 'Rossi')
+
+    resp = TestClient(api.app).post("/pagamenti", json=[
+        {'proprieta_id': pid, 'mese': '2025-01', 'importo': 1000, 'pagato_il': '2025-01-04'},
+        {'proprieta_id': 999, 'mese': '2025-02', 'importo': 500},
+        {'proprieta_id': pid, 'mese': '2025-02', 'importo': 400},
+    ])
+
+    body = resp.json()
+    assert resp.status_code == 200 and body['registrati'] == 2
+    assert body['ids'][1] is None and [e['indice'] for e in body['errori']] == [1]
+    storico = TestClient(api.app).get(f"/proprieta/{pid}/pagamenti").json()
+    assert [(p['mese'], p['importo']) for p in storico] == [('2025-02', 400), ('2025-01', 1000)]
+
+
+def test_flag_follows_current_month_ledger(temp_db):
+    pid = _affitto(temp_db, 'A', 'Rossi')
+    mese = mese_corrente()
+
+    # Versamento (anche parziale) sul mese corrente -> pagata
+    temp_db.create_pagamenti([{'proprieta_id': pid, 'mese': mese, 'importo': 200}])
+    assert temp_db.get_proprieta_by_id(pid)['mensilita_pagata']
+    # Arretrato: non tocca il flag del mese
+    other = _affitto(temp_db, 'B', 'Bianchi')
+    temp_db.create_pagamenti([{'proprieta_id': other, 'mese': '2020-01', 'importo': 1000}])
+    assert not temp_db.get_proprieta_by_id(other)['mensilita_pagata']
+
+    # Flag tolto a mano -> versamenti del mese annullati; rimesso -> canone intero
+    temp_db.set_mensilita_pagata([pid], False)
+    assert temp_db.get_pagamenti(pid) == []
+    temp_db.set_mensilita_pagata([pid], True)
+    assert [(p['mese'], p['importo']) for p in temp_db.get_pagamenti(pid)] == [(mese, 1000)]
+
+
+def test_arrears_per_tenant_with_partial_payments(temp_db):
+    a = _affitto(temp_db, 'A', 'Rossi', canone=1000)
+    b = _affitto(temp_db, 'B', 'Rossi', canone=500, inizio='2025-03-01')
+    c = _affitto(temp_db, 'C', 'Verdi', canone=800, inizio='2025-02-10')
+    temp_db.create_pagamenti([
+        {'proprieta_id': a, 'mese': '2025-01', 'importo': 1000},
+        {'proprieta_id': a, 'mese': '2025-02', 'importo': 600},
+        {'proprieta_id': c, 'mese': '2025-02', 'importo': 800},
+        {'proprieta_id': c, 'mese': '2025-03', 'importo': 800},
+    ])
+
+    righe = TestClient(api.app).get("/pagamenti/morosita", params={'al': OGGI.isoformat()}).json()
+
+    # Rossi: 400 di febbraio + marzo intero su A + marzo su B
+    assert righe == [{'inquilino': 'Rossi', 'immobili': 2, 'mensilita': 3, 'importo': 1900.0,
+                      'dal': '2025-02', 'giorni': 43}]
+    # Prima della scadenza di marzo è dovuto solo il residuo di febbraio
+    [prima] = temp_db.get_morosita(date(2025, 3, 3))
+    assert prima['importo'] == 400 and prima['mensilita'] == 1
+
+
+def test_aging_buckets(temp_db):
+    _affitto(temp_db, 'A', 'Rossi', canone=1000, inizio='2024-12-01')
+
+    aging = temp_db.get_aging(OGGI)
+
+    # Scadenze: 5/12 (105 gg), 5/1 (74), 5/2 (43), 5/3 (15)
+    assert aging['totale'] == 4000 and aging['mensilita'] == 4
+    assert {f['fascia']: f['importo'] for f in aging['fasce']} == {'0_30': 1000, '30_60': 1000, '60_oltre': 2000}
+    assert TestClient(api.app).get("/pagamenti/aging", params={'al': OGGI.isoformat()}).json() == aging
+
+
+def test_month_rollover_recomputes_flag(temp_db):
+    a = _affitto(temp_db, 'A', 'Rossi')
+    b = _affitto(temp_db, 'B', 'Bianchi')
+    temp_db.create_pagamenti([
+        {'proprieta_id': a, 'mese': mese_corrente(), 'importo': 1000},
+        {'proprieta_id': b, 'mese': '2099-01', 'importo': 1000},
+    ])
+
+    assert temp_db.backend.refresh_mensilita('2099-01') == 2
+    assert temp_db.backend.refresh_mensilita('2099-01') == 0
+    assert not temp_db.backend.get(a)['mensilita_pagata']
+    assert temp_db.backend.get(b)['mensilita_pagata']
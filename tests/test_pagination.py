@@ -0,0 +1,61 @@
+# tests/test_pagination.py
+import pytest
+from fastapi.testclient import TestClient
+
+from src import api
+from src.query import ORDINAMENTI
+from conftest import _prop
+
+
+@pytest.fixture
+def temp_db(temp_db):
+    """Database con proprietà che hanno valori ripetuti e NULL nelle chiavi di ordinamento"""
+    for i in range(23):
+        temp_db.create_proprieta(_prop(
+            f'Immobile {i:02d}',
+            valore_mq=1000 + (i % 4) * 500,
+            contratto_fine=f'2027-0{1 + i % 5}-01' if i % 3 else None,
+        ))
+    return temp_db
+
+
+@pytest.mark.parametrize("order_by", ORDINAMENTI)
+def test_cursor_walk_matches_full_list(temp_db, order_by):
+    """Scorrere le pagine col cursore restituisce tutte le righe, nell'ordine completo, senza duplicati"""
+    expected = [p['id'] for p in temp_db.get_all_proprieta({'order_by': order_by})]
+
+    seen, cursor = [], None
+    while True:
+        page = temp_db.get_proprieta_page({'order_by': order_by}, limit=5, cursor=cursor)
+        seen.extend(p['id'] for p in page['items'])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+
+    assert seen == expected
+
+
+def test_offset_mode(temp_db):
+    all_ids = [p['id'] for p in temp_db.get_all_proprieta()]
+    assert [p['id'] for p in temp_db.get_all_proprieta(limit=4, offset=10)] == all_ids[10:14]
+
+
+def test_cursor_other_order_rejected(temp_db):
+    cursor = temp_db.get_proprieta_page({'order_by': 'nome'}, limit=5)['next_cursor']
+    with pytest.raises(ValueError):
+        temp_db.get_proprieta_page({'order_by': 'valore_mq DESC'}, limit=5, cursor=cursor)
+
+
+def test_api_next_cursor_header(temp_db, api_adb):
+    client = TestClient(api.app)
+
+    first = client.get("/proprieta", params={"limit": 20, "order_by": "valore_mq DESC"})
+    assert first.status_code == 200
+    assert len(first.json()) == 20
+    cursor = first.headers["X-Next-Cursor"]
+
+    rest = client.get("/proprieta", params={"limit": 20, "order_by": "valore_mq DESC", "cursor": cursor})
+    assert len(rest.json()) == 3
+    assert "X-Next-Cursor" not in rest.headers
+
+    assert client.get("/proprieta", params={"order_by": "indirizzo"}).status_code == 400
@@ -0,0 +1,79 @@
+# tests/test_records.py
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from src import analytics
+from src.records import Proprieta, ProprietaBatch
+from conftest import _prop
+
+
+def _righe(n):
+    return [{'id': i, 'nome': f'Immobile {i:06d}', 'indirizzo': f'Via Roma {i}', 'mq_effettivi': 80.0,
+             'mq_commerciali': 90.0, 'valore_mq': 2500.0 + i % 7,
+             'affittato_a': f'Inquilino {i % 50}' if i % 3 else None,
+             'affitto_mensile': 700.0 if i % 3 else 0.0, 'contratto_fine': f'2027-{i % 12 + 1:02d}-01',
+             'mensilita_pagata': i % 2, 'categoria': 'A/2', 'zona_cens': str(i % 3),
+             'created_at': '2026-01-01 10:00:00', 'updated_at': '2026-01-01 10:00:00'}
+            for i in range(1, n + 1)]
+
+
+def test_records_round_trip_from_backend(temp_db):
+    temp_db.create_proprieta(_prop('A', affittato_a='Rossi', affitto_mensile=800,
+                                   mensilita_pagata=1, categoria='A/2'))
+    temp_db.create_proprieta(_prop('B'))
+
+    records = temp_db.get_proprieta_records()
+    rows = temp_db.get_all_proprieta()
+
+    assert [r.nome for r in records] == [r['nome'] for r in rows]
+    a = next(r for r in records if r.nome == 'A')
+    assert isinstance(a, Proprieta) and a.mensilita_pagata is True and a.affitto_mensile == 800
+    assert not hasattr(a, '__dict__')
+    b = next(r for r in records if r.nome == 'B')
+    assert b.affittato_a is None and b.foglio is None and b.categoria is None
+    assert Proprieta.from_dict(a.to_dict()) == a
+
+
+def test_batch_frame_is_zero_copy_and_feeds_analytics():
+    rows = _righe(1000)
+    batch = ProprietaBatch.from_rows(rows)
+
+    df = batch.to_frame()
+    assert len(batch) == len(df) == 1000
+    assert np.shares_memory(df['valore_mq'].to_numpy(), batch.columns['valore_mq'])
+    assert isinstance(df['categoria'].dtype, pd.CategoricalDtype)
+    assert df['affittato_a'].isna().sum() == 333
+    assert batch[2].to_dict() == Proprieta.from_dict(rows[2]).to_dict()
+
+    assert analytics.analizza(df) == analytics.analizza(rows)
+    assert list(df.columns) == list(batch.columns)  # analytics non aggiunge colonne al frame del batch
+
+
+def test_batch_uses_a_fraction_of_list_of_dicts_memory():
+    n = 20_000
+
+    tracemalloc.start()
+    rows = _righe(n)
+    dicts, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    batch = ProprietaBatch.from_rows(rows)
+    del rows  # resta solo il batch
+    compatto, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert len(batch) == n
+    assert compatto < dicts / 3
+
+
+def test_batch_reads_skip_the_cache(temp_db):
+    temp_db.create_proprieta(_prop('A', affittato_a='Rossi'))
+    assert temp_db.get_proprieta_batch() is not temp_db.get_proprieta_batch()
+    assert len(temp_db.get_proprieta_batch({'solo_affitti': True})) == 1
+    assert temp_db.cache_info()['size'] == 0
+
+    temp_db.create_proprieta(_prop('B'))
+    assert len(temp_db.get_proprieta_batch()) == 2
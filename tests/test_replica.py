@@ -0,0 +1,175 @@
+# tests/test_replica.py
+from datetime import date
+
+import pytest
+
+from src.db_sqlite import SQLiteBackend
+from src.replica import ReplicaBackend, SyncWorker
+from conftest import _prop
+
+
+@pytest.fixture
+def replica(tmp_path):
+    local = ReplicaBackend(tmp_path / "locale.db")
+    # Il "remoto" è un secondo backend con la stessa interfaccia di SupabaseBackend
+    remote = SQLiteBackend(tmp_path / "remoto.db")
+    yield local, remote, SyncWorker(local, remote)
+    local.close()
+    remote.close()
+
+
+def _backdate(backend, prop_id, ts):
+    with backend.connection() as conn:
+        conn.execute("UPDATE proprieta SET updated_at = ? WHERE id = ?", (ts, prop_id))
+
+
+def test_offline_writes_are_queued_and_pushed(replica):
+    local, remote, worker = replica
+    temp = local.insert(_prop('Offline'))
+    assert temp['id'] < 0
+    local.update(temp['id'], {'affitto_mensile': 700})
+    scartata = local.insert(_prop('Ripensamento'))
+    local.delete(scartata['id'])
+    # La riga mai inviata non lascia nulla in coda
+    assert local.pending() == 2 and remote.select() == []
+
+    assert worker.sync_once()['inviati'] == 2
+    [row] = remote.select()
+    assert row['nome'] == 'Offline' and row['affitto_mensile'] == 700
+    # L'id temporaneo è sostituito da quello remoto
+    assert [r['id'] for r in local.select()] == [row['id']]
+    assert local.pending() == 0
+
+
+def test_pull_applies_remote_changes_and_deletions(replica):
+    local, remote, worker = replica
+    a = remote.insert(_prop('A'))['id']
+    b = remote.insert(_prop('B'))['id']
+    worker.sync_once()
+    assert sorted(r['nome'] for r in local.select()) == ['A', 'B']
+
+    remote.update(a, {'nome': 'A2'})
+    remote.delete(b)
+    worker.sync_once()
+    assert [r['nome'] for r in local.select()] == ['A2']
+    assert local.pending() == 0
+
+
+def test_conflict_last_writer_wins_per_field(replica):
+    local, remote, worker = replica
+    prop_id = remote.insert(_prop('Casa', affitto_mensile=500))['id']
+    worker.sync_once()
+
+    # Modifica locale "vecchia" su due campi, modifica remota più recente su uno dei due
+    local.update(prop_id, {'affitto_mensile': 600, 'valore_mq': 2500})
+    with local.connection() as conn:
+        conn.execute("UPDATE sync_outbox SET created_at = '2020-01-01T00:00:00+00:00'")
+    remote.update(prop_id, {'affitto_mensile': 800})
+
+    worker.sync_once()
+    row = remote.get(prop_id)
+    assert row['affitto_mensile'] == 800 and row['valore_mq'] == 2500
+    assert local.get(prop_id)['affitto_mensile'] == 800
+    [conflitto] = local.conflicts()
+    assert (conflitto['campo'], conflitto['vincitore']) == ('affitto_mensile', 'remoto')
+
+    # Modifica locale più recente della remota: vince il locale
+    _backdate(remote, prop_id, '2020-01-01 00:00:00')
+    remote.update(prop_id, {'affitto_mensile': 900, 'updated_at': '2020-01-01 00:00:00'})
+    local.update(prop_id, {'affitto_mensile': 650})
+    worker.sync_once()
+    assert remote.get(prop_id)['affitto_mensile'] == 650
+    assert local.conflicts()[0]['vincitore'] == 'locale'
+
+
+def test_failed_push_keeps_outbox(replica, monkeypatch):
+    local, remote, worker = replica
+    local.insert(_prop('In coda'))
+
+    def offline(data):
+        raise ConnectionError("rete assente")
+
+    monkeypatch.setattr(remote, "insert", offline)
+    with pytest.raises(ConnectionError):
+        worker.sync_once()
+    assert local.pending() == 1 and worker.info()['ultimo_errore'] == "rete assente"
+
+    monkeypatch.undo()
+    worker.sync_once()
+    assert local.pending() == 0 and worker.info()['ultimo_errore'] is None
+
+
+def _pagamento(prop_id, importo=700):
+    return {'proprieta_id': prop_id, 'mese': date.today().strftime('%Y-%m'),
+            'importo': importo, 'pagato_il': date.today().isoformat()}
+
+
+def test_payments_are_queued_and_pushed(replica):
+    local, remote, worker = replica
+    prop_id = remote.insert(_prop('Casa', affittato_a='Rossi', affitto_mensile=700))['id']
+    worker.sync_once()
+
+    local.insert_pagamenti([_pagamento(prop_id, 300)])
+    assert local.get(prop_id)['mensilita_pagata'] and local.pending() == 1
+    # Un pull prima dell'invio non riporta indietro il flag locale
+    worker.pull()
+    assert local.get(prop_id)['mensilita_pagata']
+
+    worker.sync_once()
+    assert local.pending() == 0
+    assert remote.get(prop_id)['mensilita_pagata']
+    assert [p['importo'] for p in remote.pagamenti(prop_id)] == [300]
+
+
+def test_offline_property_keeps_its_payments(replica):
+    local, remote, worker = replica
+    temp = local.insert(_prop('Offline', affittato_a='Verdi', affitto_mensile=500))['id']
+    local.insert_pagamenti([_pagamento(temp, 500)])
+
+    assert worker.sync_once()['inviati'] == 2
+    [row] = remote.select()
+    assert [p['importo'] for p in local.pagamenti(row['id'])] == [500]
+    assert local.pagamenti(temp) == []
+    assert [p['importo'] for p in remote.pagamenti(row['id'])] == [500]
+    assert local.get(row['id'])['mensilita_pagata'] and remote.get(row['id'])['mensilita_pagata']
+    # L'indice full-text segue il nuovo id
+    assert [r['id'] for r in local.search('Offline')] == [row['id']]
+
+
+def test_remote_partial_payment_is_pulled_not_rebooked(replica):
+    local, remote, worker = replica
+    prop_id = remote.insert(_prop('Casa', affittato_a='Rossi', affitto_mensile=700))['id']
+    worker.sync_once()
+
+    # Acconto registrato da un altro client: il flag remoto si accende
+    remote.insert_pagamenti([_pagamento(prop_id, 200)])
+    assert remote.get(prop_id)['mensilita_pagata']
+    worker.sync_once()
+    assert [p['importo'] for p in local.pagamenti(prop_id)] == [200]
+    assert local.get(prop_id)['mensilita_pagata']
+
+    # Giri successivi (finestra con margine) e versamenti inviati da qui non si duplicano
+    local.insert_pagamenti([_pagamento(prop_id, 500)])
+    worker.sync_once()
+    worker.sync_once()
+    assert sorted(p['importo'] for p in local.pagamenti(prop_id)) == [200, 500]
+    assert sorted(p['importo'] for p in remote.pagamenti(prop_id)) == [200, 500]
+    assert local.pending() == 0
+
+
+def test_flag_set_locally_keeps_one_payment(replica):
+    local, remote, worker = replica
+    prop_id = remote.insert(_prop('Casa', affittato_a='Rossi', affitto_mensile=700))['id']
+    worker.sync_once()
+
+    # Il trigger locale e quello remoto registrano ciascuno il canone: resta un versamento
+    local.set_mensilita_pagata([prop_id], True)
+    worker.sync_once()
+    worker.sync_once()
+    assert [p['importo'] for p in local.pagamenti(prop_id)] == [700]
+    assert [p['importo'] for p in remote.pagamenti(prop_id)] == [700]
+
+    # Annullato in remoto: il flag spento cancella anche il versamento locale
+    remote.set_mensilita_pagata([prop_id], False)
+    worker.sync_once()
+    assert local.pagamenti(prop_id) == [] and not local.get(prop_id)['mensilita_pagata']
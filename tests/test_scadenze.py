@@ -0,0 +1,84 @@
+# tests/test_scadenze.py
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import api, scadenze
+from conftest import _prop
+
+
+@pytest.fixture
+def temp_db(temp_db):
+    oggi = date.today()
+    # giorni alla scadenza per ciascun immobile (None = nessun contratto)
+    for nome, giorni in [('Scaduto', -5), ('Oggi', 0), ('Vicino', 30), ('Limite', 59),
+                         ('Lontano', 60), ('Molto lontano', 400), ('Libero', None)]:
+        temp_db.create_proprieta(_prop(
+            nome, affittato_a='Tizio' if giorni is not None else None,
+            contratto_fine=(oggi + timedelta(days=giorni)).isoformat() if giorni is not None else None,
+        ))
+    return temp_db
+
+
+def test_scadenza_giorni_filter(temp_db):
+    """Il filtro della sidebar è applicato dal backend: da oggi a N giorni esclusi"""
+    rows = temp_db.get_all_proprieta({'scadenza_giorni': 60, 'order_by': 'contratto_fine ASC'})
+    assert [p['nome'] for p in rows] == ['Oggi', 'Vicino', 'Limite']
+
+
+def test_range_uses_contratto_fine_index(temp_db):
+    with temp_db.backend.connection() as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM proprieta WHERE contratto_fine >= ? AND contratto_fine <= ? "
+            "ORDER BY contratto_fine ASC NULLS LAST, id ASC", ('2026-01-01', '2026-03-01')
+        ).fetchall()
+    assert any('idx_contratto_fine' in row[-1] for row in plan)
+
+
+def test_get_scadenze_between_dates(temp_db):
+    oggi = date.today()
+    page = temp_db.get_scadenze(oggi - timedelta(days=10), oggi + timedelta(days=400), limit=3)
+    assert [p['nome'] for p in page['items']] == ['Scaduto', 'Oggi', 'Vicino']
+    rest = temp_db.get_scadenze(oggi - timedelta(days=10), oggi + timedelta(days=400), cursor=page['next_cursor'])
+    assert [p['nome'] for p in rest['items']] == ['Limite', 'Lontano', 'Molto lontano']
+
+
+def test_api_scadenze(temp_db, api_adb):
+    client = TestClient(api.app)
+    assert [p['nome'] for p in client.get("/scadenze").json()] == ['Oggi', 'Vicino', 'Limite']
+    assert client.get("/scadenze", params={"dal": "2030-01-02", "al": "2030-01-01"}).status_code == 400
+
+
+def test_portafoglio_status_and_expiry_index(temp_db):
+    ids = {p['nome']: p['id'] for p in temp_db.get_all_proprieta()}
+    temp_db.set_mensilita_pagata([ids['Vicino'], ids['Lontano']], True)
+
+    port = temp_db.get_portafoglio({'order_by': 'nome'})
+
+    stati = {p['nome']: p['stato'] for p in port.righe}
+    assert stati['Scaduto'] == scadenze.SCADUTO and stati['Libero'] == scadenze.LIBERO
+    assert stati['Vicino'] == scadenze.IN_SCADENZA and stati['Lontano'] == scadenze.ATTIVO
+    assert stati['Oggi'] == scadenze.NON_PAGATO
+    # Stessa finestra del filtro del backend, con ricerche binarie sull'indice
+    assert [p['nome'] for p in port.in_scadenza()] == ['Oggi', 'Vicino', 'Limite']
+    assert [p['nome'] for p in port.prossime(2)] == ['Oggi', 'Vicino']
+    assert [p['nome'] for p in port.scaduti()] == ['Scaduto']
+    assert port.conteggi[scadenze.NON_PAGATO] == 3
+
+
+def test_portafoglio_cached_without_reparsing(temp_db, monkeypatch):
+    first = temp_db.get_portafoglio()
+
+    def no_parsing(value):
+        raise AssertionError("date riconvertite")
+    monkeypatch.setattr(scadenze, "_data", no_parsing)
+
+    assert temp_db.get_portafoglio() is first
+
+
+def test_invalid_date_is_reported():
+    row = scadenze.annota({'affittato_a': 'Tizio', 'mensilita_pagata': 1, 'contratto_inizio': '2024-01-01',
+                           'contratto_fine': '31/12/2025'}, date(2025, 6, 1), 60)
+    assert row['fine'] is None and row['giorni_scadenza'] is None
+    assert row['date_non_valide'] == ['contratto_fine'] and row['stato'] == scadenze.ATTIVO
@@ -0,0 +1,74 @@
+# tests/test_search.py
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import api
+from src.db import DatabaseManager
+from conftest import _prop
+
+
+@pytest.fixture
+def temp_db(temp_db):
+    temp_db.create_proprieta(_prop('Bilocale Garibaldi', indirizzo='Corso Garibaldi 10, Milano',
+                                   foglio=12, particella=345, categoria='A/2', affittato_a='Tizio'))
+    temp_db.create_proprieta(_prop('Attico', indirizzo='Via della Città 3, Como',
+                                   foglio=7, categoria='A/1', zona_cens='Centro'))
+    temp_db.create_proprieta(_prop('Box', indirizzo='Via Garibaldi 2, Lecco', categoria='C/6'))
+    return temp_db
+
+
+def _nomi(rows):
+    return [p['nome'] for p in rows]
+
+
+def test_prefix_and_accents(temp_db):
+    assert _nomi(temp_db.search_proprieta('citta')) == ['Attico']
+    assert _nomi(temp_db.search_proprieta('Città')) == ['Attico']
+    assert set(_nomi(temp_db.search_proprieta('gari'))) == {'Bilocale Garibaldi', 'Box'}
+    assert _nomi(temp_db.search_proprieta('gari mil')) == ['Bilocale Garibaldi']
+
+
+def test_ranking_and_limit(temp_db):
+    # 'Garibaldi' compare due volte nel bilocale (nome + indirizzo): rilevanza maggiore
+    assert _nomi(temp_db.search_proprieta('garibaldi')) == ['Bilocale Garibaldi', 'Box']
+    assert len(temp_db.search_proprieta('garibaldi', limit=1)) == 1
+
+
+def test_cadastral_fields_and_filters(temp_db):
+    assert _nomi(temp_db.search_proprieta('345')) == ['Bilocale Garibaldi']
+    assert _nomi(temp_db.search_proprieta('c/6')) == ['Box']
+    assert _nomi(temp_db.search_proprieta('garibaldi', {'solo_affitti': True})) == ['Bilocale Garibaldi']
+
+
+def test_index_follows_writes(temp_db):
+    box = temp_db.search_proprieta('box')[0]
+    temp_db.update_proprieta(box['id'], {'indirizzo': 'Piazza Duomo 1'})
+    assert _nomi(temp_db.search_proprieta('duomo')) == ['Box']
+    assert _nomi(temp_db.search_proprieta('lecco')) == []
+    temp_db.delete_proprieta(box['id'])
+    assert temp_db.search_proprieta('duomo') == []
+
+
+def test_index_built_for_existing_database(tmp_path):
+    """Un DB senza indice FTS viene indicizzato all'apertura"""
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE proprieta (id INTEGER PRIMARY KEY AUTOINCREMENT, nome TEXT NOT NULL UNIQUE, "
+                 "indirizzo TEXT NOT NULL, mq_effettivi REAL NOT NULL, mq_commerciali REAL NOT NULL, "
+                 "valore_mq REAL NOT NULL)")
+    conn.execute("INSERT INTO proprieta (nome, indirizzo, mq_effettivi, mq_commerciali, valore_mq) "
+                 "VALUES ('Vecchio', 'Via Verdi 1', 50, 55, 2000)")
+    conn.commit()
+    conn.close()
+
+    db = DatabaseManager(path)
+    assert _nomi(db.search_proprieta('verdi')) == ['Vecchio']
+    db.backend.close()
+
+
+def test_api_q(temp_db, api_adb):
+    resp = TestClient(api.app).get("/proprieta", params={"q": "como"})
+    assert resp.status_code == 200
+    assert _nomi(resp.json()) == ['Attico']
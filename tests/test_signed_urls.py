@@ -0,0 +1,88 @@
+# tests/test_signed_urls.py
+import pytest
+
+from src.db import PIANTINE_BUCKET, CONTRACT_BUCKET
+from conftest import _prop
+
+
+class CountingStorage:
+    """Storage finto che conta le chiamate di firma"""
+
+    def __init__(self):
+        self.calls = []
+
+    def signed_url(self, bucket, path, expires_seconds):
+        self.calls.append(('one', bucket, path))
+        return f"https://storage/{bucket}/{path}?token={len(self.calls)}"
+
+    def signed_urls(self, bucket, paths, expires_seconds):
+        self.calls.append(('many', bucket, tuple(paths)))
+        return {p: f"https://storage/{bucket}/{p}?token={len(self.calls)}" for p in paths}
+
+    def remove(self, bucket, paths):
+        pass
+
+
+@pytest.fixture
+def temp_db(temp_db):
+    temp_db.storage = CountingStorage()
+    for i in range(4):
+        prop_id = temp_db.create_proprieta(_prop(f'P{i}'))
+        temp_db.update_proprieta(prop_id, {'immagine_path': f'{prop_id}/foto.webp',
+                                           'contratto_path': f'{prop_id}/contratto.pdf'})
+    return temp_db
+
+
+def test_signed_url_reused_until_near_expiry(temp_db):
+    prop = temp_db.get_all_proprieta()[0]
+    first = temp_db.get_signed_piantina_url(prop['id'], path=prop['immagine_path'])
+    assert temp_db.get_signed_piantina_url(prop['id']) == first
+    assert len(temp_db.storage.calls) == 1
+
+    # URL che scade entro il margine di rinnovo: viene rifirmato
+    temp_db.signed_urls.put(PIANTINE_BUCKET, prop['immagine_path'], first, expires_seconds=10)
+    assert temp_db.get_signed_piantina_url(prop['id']) != first
+    assert len(temp_db.storage.calls) == 2
+
+    # Bucket diversi non si confondono
+    temp_db.get_signed_contratto_url(prop['id'])
+    assert temp_db.storage.calls[-1][1] == CONTRACT_BUCKET
+
+
+def test_batch_signing_one_call(temp_db):
+    props = temp_db.get_all_proprieta()
+    temp_db.get_signed_piantina_url(props[0]['id'], path=props[0]['immagine_path'])
+
+    urls = temp_db.get_signed_piantine_urls(props)
+
+    assert set(urls) == {p['id'] for p in props}
+    # Il primo path era già in cache: una sola chiamata batch per gli altri tre
+    assert temp_db.storage.calls[-1] == ('many', PIANTINE_BUCKET, tuple(p['immagine_path'] for p in props[1:]))
+    assert len(temp_db.storage.calls) == 2
+
+    temp_db.get_signed_piantine_urls(props)
+    assert len(temp_db.storage.calls) == 2
+
+
+def test_remove_discards_url(temp_db):
+    prop = temp_db.get_all_proprieta()[0]
+    temp_db.get_signed_piantina_url(prop['id'])
+    temp_db.remove_piantina(prop['id'])
+    assert temp_db.signed_urls.get(PIANTINE_BUCKET, prop['immagine_path']) is None
+    assert temp_db.get_signed_piantina_url(prop['id']) is None
+
+
+def test_longer_lifetime_is_signed_again(temp_db):
+    prop = temp_db.get_all_proprieta()[0]
+    breve = temp_db.get_signed_url(PIANTINE_BUCKET, prop['immagine_path'])
+
+    # Un link di una settimana non riusa l'URL firmato per un'ora
+    lungo = temp_db.get_signed_url(PIANTINE_BUCKET, prop['immagine_path'], expires_seconds=7 * 86400)
+    assert lungo != breve and len(temp_db.storage.calls) == 2
+    assert temp_db.get_signed_url(PIANTINE_BUCKET, prop['immagine_path'], expires_seconds=7 * 86400) == lungo
+    # Chi chiede meno si accontenta dell'URL più lungo già in cache
+    assert temp_db.get_signed_url(PIANTINE_BUCKET, prop['immagine_path']) == lungo
+    assert len(temp_db.storage.calls) == 2
+
+    temp_db.get_signed_urls(PIANTINE_BUCKET, [prop['immagine_path']], expires_seconds=30 * 86400)
+    assert temp_db.storage.calls[-1] == ('many', PIANTINE_BUCKET, (prop['immagine_path'],))
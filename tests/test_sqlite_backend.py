@@ -0,0 +1,100 @@
+# tests/test_sqlite_backend.py
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.db import DatabaseManager
+from conftest import _prop
+
+
+def test_wal_mode(temp_db):
+    """Il database viene aperto in modalità WAL"""
+    with temp_db.backend.connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_order_by_sidebar(temp_db):
+    """Ordinamenti della sidebar, con NULL in fondo come su PostgREST"""
+    temp_db.create_proprieta(_prop('B', valore_mq=1000, contratto_fine='2030-01-01'))
+    temp_db.create_proprieta(_prop('A', valore_mq=3000))
+    temp_db.create_proprieta(_prop('C', valore_mq=2000, contratto_fine='2026-01-01'))
+
+    assert [p['nome'] for p in temp_db.get_all_proprieta({'order_by': 'nome'})] == ['A', 'B', 'C']
+    assert [p['nome'] for p in temp_db.get_all_proprieta({'order_by': 'valore_mq DESC'})] == ['A', 'C', 'B']
+    assert [p['nome'] for p in temp_db.get_all_proprieta({'order_by': 'contratto_fine ASC'})] == ['C', 'B', 'A']
+
+    with pytest.raises(ValueError):
+        temp_db.get_all_proprieta({'order_by': 'nome; DROP TABLE proprieta'})
+
+
+def test_solo_affitti_and_bool(temp_db):
+    """Filtro affitti attivi e booleani restituiti come bool"""
+    temp_db.create_proprieta(_prop('Libero'))
+    temp_db.create_proprieta(_prop('Affittato', affittato_a='Tizio', mensilita_pagata=1))
+
+    affitti = temp_db.get_all_proprieta({'solo_affitti': True})
+    assert [p['nome'] for p in affitti] == ['Affittato']
+    assert affitti[0]['mensilita_pagata'] is True
+
+
+def test_unknown_column_rejected(temp_db):
+    with pytest.raises(ValueError):
+        temp_db.create_proprieta(_prop('X', colonna_inesistente=1))
+
+
+def test_writes_return_row(temp_db):
+    """INSERT/UPDATE ... RETURNING: la riga scritta senza rileggerla"""
+    row = temp_db.create_proprieta(_prop('R', mensilita_pagata=1), returning=True)
+    assert row['nome'] == 'R' and row['affitto_mensile'] == 0 and row['mensilita_pagata'] is True
+
+    with temp_db.backend.connection() as conn:
+        conn.execute("UPDATE proprieta SET updated_at = '2000-01-01 00:00:00' WHERE id = ?", (row['id'],))
+    updated = temp_db.update_proprieta(row['id'], {'valore_mq': 2500})
+    assert updated['valore_mq'] == 2500 and updated['updated_at'] > '2000-01-01 00:00:00'
+    assert temp_db.update_proprieta(row['id'] + 1, {'valore_mq': 2500}) is None
+
+
+def test_concurrent_access(temp_db):
+    """Il pool regge scritture e letture da più thread"""
+    def work(i):
+        prop_id = temp_db.create_proprieta(_prop(f'P{i}'))
+        return temp_db.get_proprieta_by_id(prop_id)['nome']
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        nomi = list(pool.map(work, range(40)))
+
+    assert sorted(nomi) == sorted(f'P{i}' for i in range(40))
+    assert len(temp_db.get_all_proprieta()) == 40
+
+
+def test_migrates_legacy_database(tmp_path):
+    """Un DB creato con lo schema originale riceve le colonne mancanti senza perdere dati"""
+    legacy = tmp_path / "legacy.db"
+    conn = sqlite3.connect(legacy)
+    conn.execute("""CREATE TABLE proprieta (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, nome TEXT NOT NULL UNIQUE,
+        indirizzo TEXT NOT NULL, mq_effettivi REAL NOT NULL, mq_commerciali REAL NOT NULL,
+        valore_mq REAL NOT NULL, affittato_a TEXT, affitto_mensile REAL DEFAULT 0,
+        contratto_inizio DATE, contratto_fine DATE, mensilita_pagata BOOLEAN DEFAULT 0,
+        immagine_path TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""")
+    conn.execute("INSERT INTO proprieta (nome, indirizzo, mq_effettivi, mq_commerciali, valore_mq) "
+                 "VALUES ('Vecchia', 'Via Test', 50, 55, 2000)")
+    conn.commit()
+    conn.close()
+
+    db = DatabaseManager(legacy)
+    try:
+        assert 'categoria' in db.backend.columns
+        prop = db.get_all_proprieta()[0]
+        assert prop['nome'] == 'Vecchia'
+        assert db.update_proprieta(prop['id'], {'categoria': 'A/2'})
+        assert db.get_proprieta_by_id(prop['id'])['categoria'] == 'A/2'
+    finally:
+        db.backend.close()
+
+
+def test_seed_demo_data(temp_db):
+    assert temp_db.seed_demo_data() == 3
+    assert temp_db.seed_demo_data() == 0
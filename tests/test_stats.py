@@ -0,0 +1,48 @@
+# tests/test_stats.py
+from datetime import date, timedelta
+
+
+def _expected(rows, giorni):
+    """Gli stessi totali calcolati in Python a partire dalla lista completa"""
+    limite = (date.today() + timedelta(days=giorni)).isoformat()
+    affitti = [p for p in rows if p['affittato_a'] is not None]
+    return {
+        'totale_immobili': len(rows),
+        'affitti_attivi': len(affitti),
+        'non_pagati': len([p for p in affitti if not p['mensilita_pagata']]),
+        'in_scadenza': len([p for p in rows if p['contratto_fine'] and p['contratto_fine'] < limite]),
+        'entrate_mensili': round(sum(p['affitto_mensile'] for p in affitti), 2),
+        'valore_patrimonio': round(sum(p['mq_commerciali'] * p['valore_mq'] for p in rows), 2),
+    }
+
+
+def test_rollup_follows_writes(temp_db):
+    """I totali restano coerenti dopo insert, update e delete"""
+    oggi = date.today()
+    ids = []
+    for i in range(6):
+        ids.append(temp_db.create_proprieta({
+            'nome': f'P{i}',
+            'indirizzo': 'Via Test',
+            'mq_effettivi': 50 + i,
+            'mq_commerciali': 60 + i,
+            'valore_mq': 1500 + 100 * i,
+            'affittato_a': f'Inquilino {i}' if i % 2 else None,
+            'affitto_mensile': 700 + 10 * i if i % 2 else 0,
+            'contratto_fine': (oggi + timedelta(days=20 * i)).isoformat() if i % 2 else None,
+            'mensilita_pagata': i == 3,
+        }))
+    assert temp_db.get_stats(60) == _expected(temp_db.get_all_proprieta(), 60)
+
+    temp_db.update_proprieta(ids[0], {'affittato_a': 'Nuovo', 'affitto_mensile': 900})
+    temp_db.update_proprieta(ids[3], {'mensilita_pagata': False, 'valore_mq': 4000})
+    temp_db.update_proprieta(ids[1], {'nome': 'Rinominato'})
+    temp_db.delete_proprieta(ids[5])
+    assert temp_db.get_stats(60) == _expected(temp_db.get_all_proprieta(), 60)
+    assert temp_db.get_stats(365) == _expected(temp_db.get_all_proprieta(), 365)
+
+
+def test_empty_portfolio(temp_db):
+    stats = temp_db.get_stats()
+    assert stats['totale_immobili'] == 0
+    assert stats['valore_patrimonio'] == 0
@@ -0,0 +1,71 @@
+# tests/test_sync_api.py
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import api
+from conftest import _prop
+
+pytestmark = pytest.mark.usefixtures("api_adb")
+
+
+def _backdate(db, ts='2020-01-01 00:00:00'):
+    """Sposta nel passato tutti i timestamp, come se le righe fossero state scritte tempo fa"""
+    with db.backend.connection() as conn:
+        conn.execute("UPDATE proprieta SET updated_at = ?", (ts,))
+        conn.execute("UPDATE proprieta_eliminate SET deleted_at = ?", (ts,))
+
+
+def test_changes_since_with_tombstones(temp_db):
+    ids = [temp_db.create_proprieta(_prop(f'P{i}')) for i in range(4)]
+    temp_db.delete_proprieta(ids[3])
+    _backdate(temp_db)
+    since = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    assert temp_db.get_changes(since) == {'changed': [], 'deleted': [], 'sync_token': '2024-01-01T00:00:00Z'}
+
+    temp_db.update_proprieta(ids[0], {'valore_mq': 2500})
+    temp_db.delete_proprieta(ids[1])
+    nuovo = temp_db.create_proprieta(_prop('Nuovo'))
+
+    changes = temp_db.get_changes(since)
+    assert [p['id'] for p in changes['changed']] == [ids[0], nuovo]
+    assert changes['deleted'] == [ids[1]]
+    token = datetime.fromisoformat(changes['sync_token'])
+    assert since < token <= datetime.now(timezone.utc)
+
+
+def test_api_delta_and_etag(temp_db):
+    for i in range(30):
+        temp_db.create_proprieta(_prop(f'Immobile {i:02d}'))
+    _backdate(temp_db)
+    client = TestClient(api.app)
+
+    first = client.get("/proprieta", params={"updated_since": "2024-01-01T00:00:00Z"})
+    assert first.json() == {'changed': [], 'deleted': [], 'sync_token': '2024-01-01T00:00:00Z'}
+    etag = first.headers['etag']
+
+    # Nulla è cambiato: 304 senza corpo
+    again = client.get("/proprieta", params={"updated_since": "2024-01-01T00:00:00Z"},
+                       headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b''
+
+    temp_db.update_proprieta(temp_db.get_all_proprieta()[0]['id'], {'valore_mq': 3000})
+    changed = client.get("/proprieta", params={"updated_since": "2024-01-01T00:00:00Z"},
+                         headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and len(changed.json()['changed']) == 1
+
+
+def test_list_and_detail_etag_with_gzip(temp_db):
+    ids = [temp_db.create_proprieta(_prop(f'Immobile {i:02d}')) for i in range(30)]
+    client = TestClient(api.app)
+
+    full = client.get("/proprieta", headers={"Accept-Encoding": "gzip"})
+    assert full.headers['content-encoding'] == 'gzip' and len(full.json()) == 30
+    assert client.get("/proprieta", headers={"If-None-Match": full.headers['etag']}).status_code == 304
+
+    detail = client.get(f"/proprieta/{ids[0]}")
+    assert client.get(f"/proprieta/{ids[0]}", headers={"If-None-Match": detail.headers['etag']}).status_code == 304
+    client.put(f"/proprieta/{ids[0]}", json={'valore_mq': 2100})
+    assert client.get(f"/proprieta/{ids[0]}", headers={"If-None-Match": detail.headers['etag']}).status_code == 200